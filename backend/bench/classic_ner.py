@@ -0,0 +1,53 @@
+"""
+spaCy start-up time and NER throughput: full pipeline with one nlp() call per page
+vs. the NER-only pipeline fed through nlp.pipe.
+
+    python -m bench.classic_ner --pages 200
+"""
+import argparse
+import random
+import time
+
+import spacy
+
+from core.identifier_classic import SPACY_MODEL, NER_UNUSED_COMPONENTS, find_ner_pii
+
+NER_TYPES = ["PERSON", "GPE", "DATE", "ORG"]
+
+
+def synthetic_pages(n_pages: int, words_per_page: int = 400, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    vocabulary = ["John Smith", "paid", "Acme Corp", "on", "March 3, 2024", "in", "London", "the", "invoice",
+                  "total", "of", "$120.00", "account", "Mary Jones", "Berlin", "for", "services", "rendered"]
+    return [" ".join(rng.choice(vocabulary) for _ in range(words_per_page)) for _ in range(n_pages)]
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--n-process", type=int, default=1)
+    args = parser.parse_args()
+    pages = synthetic_pages(args.pages)
+
+    full_load, full_nlp = timed(spacy.load, SPACY_MODEL)
+    trimmed_load, trimmed_nlp = timed(spacy.load, SPACY_MODEL, exclude=NER_UNUSED_COMPONENTS)
+    print(f"load: full={full_load:.2f}s {full_nlp.pipe_names}")
+    print(f"load: ner-only={trimmed_load:.2f}s {trimmed_nlp.pipe_names}")
+
+    per_page, _ = timed(lambda: [full_nlp(text) for text in pages])
+    # Warm the lazily loaded pipeline so only NER time is measured.
+    find_ner_pii(pages[:1], NER_TYPES)
+    piped, _ = timed(find_ner_pii, pages, NER_TYPES, args.batch_size, args.n_process)
+    print(f"per-page nlp(), full pipeline: {args.pages / per_page:.1f} pages/s")
+    print(f"nlp.pipe, ner-only (batch={args.batch_size}, n_process={args.n_process}): {args.pages / piped:.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
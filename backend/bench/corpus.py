@@ -0,0 +1,212 @@
+"""
+Synthetic document corpus with planted PII, for benchmarks. Everything is derived
+from the seed, so the same arguments always produce the same documents.
+
+    python -m bench.corpus OUT_DIR --profile small
+    python -m bench.corpus OUT_DIR --pdf-pages 50 --density 0.3 --scans 2 --scan-pages 4
+
+Writes the documents plus corpus.json, the ground truth: every planted value with its
+type, page and bounding box (PDF points for PDFs, pixels for scans).
+"""
+import argparse
+import json
+import os
+import random
+import string
+from typing import Any, Dict, List, Tuple
+
+import fitz
+from PIL import Image, ImageDraw, ImageFont
+
+FILLER = ["statement", "balance", "transfer", "account", "period", "fee", "credit", "debit", "total",
+          "reference", "payment", "due", "amount", "service", "charge", "summary", "notice", "dear"]
+FIRST_NAMES = ["John", "Maria", "Ahmed", "Li", "Sofia", "Lucas", "Aisha", "Noah", "Elena", "Ravi"]
+LAST_NAMES = ["Doe", "Garcia", "Khan", "Wang", "Rossi", "Muller", "Okafor", "Smith", "Petrov", "Patel"]
+PAGE_SIZES = {"letter": (612, 792), "a4": (595, 842), "legal": (612, 1008)}
+FONT_PATHS = ["/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", "/System/Library/Fonts/SFNSDisplay.ttf",
+              "C:/Windows/Fonts/Arial.ttf"]
+
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "tiny": {"pdfs": 1, "pdf_pages": 2, "scans": 1, "scan_pages": 1, "density": 0.2},
+    "small": {"pdfs": 2, "pdf_pages": 10, "scans": 1, "scan_pages": 2, "density": 0.2},
+    "medium": {"pdfs": 4, "pdf_pages": 50, "scans": 2, "scan_pages": 4, "density": 0.2},
+    "large": {"pdfs": 4, "pdf_pages": 300, "scans": 2, "scan_pages": 16, "density": 0.2},
+}
+
+
+def luhn_complete(digits: str) -> str:
+    """Appends the check digit that makes `digits` pass the Luhn check."""
+    total = 0
+    for i, digit in enumerate(reversed(digits)):
+        value = int(digit)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return digits + str((10 - total % 10) % 10)
+
+
+def iban_complete(country: str, bban: str) -> str:
+    numeric = "".join(str(int(ch, 36)) for ch in bban + country + "00")
+    return f"{country}{98 - int(numeric) % 97:02d}{bban}"
+
+
+class PiiFactory:
+    """Seeded generator of values that the classic validators accept."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def _digits(self, n: int) -> str:
+        return "".join(self.rng.choice(string.digits) for _ in range(n))
+
+    def make(self, pii_type: str) -> str:
+        rng = self.rng
+        if pii_type == "EMAIL":
+            return f"{rng.choice(FIRST_NAMES).lower()}.{rng.choice(LAST_NAMES).lower()}{rng.randrange(100)}@example.com"
+        if pii_type == "PHONE":
+            return f"555-{rng.randrange(100, 999)}-{rng.randrange(1000, 9999)}"
+        if pii_type == "SSN":
+            return f"{rng.randrange(1, 665):03d}-{rng.randrange(1, 99):02d}-{rng.randrange(1, 9999):04d}"
+        if pii_type == "CREDIT_CARD":
+            number = luhn_complete("4" + self._digits(14))
+            return " ".join(number[i:i + 4] for i in range(0, 16, 4))
+        if pii_type == "IBAN":
+            return iban_complete("DE", self._digits(18))
+        if pii_type == "PERSON":
+            return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        raise ValueError(f"Unknown PII type: {pii_type}")
+
+
+PII_TYPES = ["EMAIL", "PHONE", "SSN", "CREDIT_CARD", "IBAN", "PERSON"]
+
+
+def page_lines(rng: random.Random, factory: PiiFactory, n_lines: int, density: float,
+               words_per_line: int = 10) -> List[Tuple[str, List[Tuple[str, str, int]]]]:
+    """
+    Lines of filler text; a `density` share of them carry one planted value.
+    Returns (line, [(type, value, char offset)]) per line.
+    """
+    lines = []
+    for _ in range(n_lines):
+        words = [rng.choice(FILLER) for _ in range(words_per_line)]
+        planted = []
+        if rng.random() < density:
+            pii_type = rng.choice(PII_TYPES)
+            value = factory.make(pii_type)
+            position = rng.randrange(1, words_per_line)
+            prefix = " ".join(words[:position]) + " "
+            planted.append((pii_type, value, len(prefix)))
+            words.insert(position, value)
+        lines.append((" ".join(words), planted))
+    return lines
+
+
+def build_pdf(path: str, pages: int, density: float = 0.2, page_size: str = "letter",
+              font_size: float = 9, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    factory = PiiFactory(rng)
+    width, height = PAGE_SIZES[page_size]
+    line_height = font_size * 1.4
+    n_lines = int((height - 72) / line_height)
+    planted = []
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=width, height=height)
+        for n, (line, line_pii) in enumerate(page_lines(rng, factory, n_lines, density)):
+            y = 36 + (n + 1) * line_height
+            page.insert_text((36, y), line, fontsize=font_size, fontname="helv")
+            for pii_type, value, offset in line_pii:
+                x0 = 36 + fitz.get_text_length(line[:offset], fontname="helv", fontsize=font_size)
+                x1 = x0 + fitz.get_text_length(value, fontname="helv", fontsize=font_size)
+                planted.append({"page": page_num, "type": pii_type, "text": value,
+                                "bbox": [x0, y - font_size, x1, y + font_size * 0.25]})
+    doc.save(path, garbage=1)
+    doc.close()
+    return planted
+
+
+def _scan_font(size: int):
+    for font_path in FONT_PATHS:
+        if os.path.exists(font_path):
+            return ImageFont.truetype(font_path, size)
+    return ImageFont.load_default(size)
+
+
+def build_scan(path: str, pages: int, density: float = 0.2, dpi: int = 200, page_size: str = "letter",
+               seed: int = 0) -> List[Dict[str, Any]]:
+    """A PNG/JPEG (one page) or multi-frame TIFF of rendered text, as a scanner would produce."""
+    rng = random.Random(seed)
+    factory = PiiFactory(rng)
+    width, height = (int(side / 72 * dpi) for side in PAGE_SIZES[page_size])
+    font_size = max(8, dpi // 8)
+    font = _scan_font(font_size)
+    line_height = int(font_size * 1.5)
+    margin = dpi // 2
+    n_lines = (height - 2 * margin) // line_height
+    planted, frames = [], []
+    for page_num in range(pages):
+        image = Image.new("L", (width, height), "white")
+        draw = ImageDraw.Draw(image)
+        for n, (line, line_pii) in enumerate(page_lines(rng, factory, n_lines, density, words_per_line=8)):
+            y = margin + n * line_height
+            draw.text((margin, y), line, fill="black", font=font)
+            for pii_type, value, offset in line_pii:
+                x0 = margin + draw.textlength(line[:offset], font=font)
+                x1 = x0 + draw.textlength(value, font=font)
+                planted.append({"page": page_num, "type": pii_type, "text": value,
+                                "bbox": [x0, y, x1, y + font_size]})
+        frames.append(image)
+    options = {"dpi": (dpi, dpi)}
+    if path.lower().endswith((".tif", ".tiff")):
+        options["compression"] = "tiff_deflate"
+    if len(frames) > 1:
+        frames[0].save(path, save_all=True, append_images=frames[1:], **options)
+    else:
+        frames[0].save(path, **options)
+    return planted
+
+
+def build_corpus(out_dir: str, pdfs: int, pdf_pages: int, scans: int, scan_pages: int,
+                 density: float, page_size: str = "letter", seed: int = 0) -> Dict[str, Any]:
+    os.makedirs(out_dir, exist_ok=True)
+    documents = []
+    for i in range(pdfs):
+        name = f"doc_{i:03d}.pdf"
+        planted = build_pdf(os.path.join(out_dir, name), pdf_pages, density, page_size, seed=seed + i)
+        documents.append({"file": name, "pages": pdf_pages, "pii": planted})
+    for i in range(scans):
+        name = f"scan_{i:03d}.{'tiff' if scan_pages > 1 else 'png'}"
+        planted = build_scan(os.path.join(out_dir, name), scan_pages, density, page_size=page_size, seed=seed + 1000 + i)
+        documents.append({"file": name, "pages": scan_pages, "pii": planted})
+    corpus = {"seed": seed, "density": density, "pageSize": page_size, "documents": documents}
+    with open(os.path.join(out_dir, "corpus.json"), "w", encoding="utf-8") as f:
+        json.dump(corpus, f, indent=1)
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--pdfs", type=int)
+    parser.add_argument("--pdf-pages", type=int)
+    parser.add_argument("--scans", type=int)
+    parser.add_argument("--scan-pages", type=int)
+    parser.add_argument("--density", type=float, help="share of text lines carrying a PII value")
+    parser.add_argument("--page-size", choices=sorted(PAGE_SIZES), default="letter")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    options = dict(PROFILES[args.profile])
+    for option in options:
+        if getattr(args, option) is not None:
+            options[option] = getattr(args, option)
+    corpus = build_corpus(args.out_dir, page_size=args.page_size, seed=args.seed, **options)
+    planted = sum(len(document["pii"]) for document in corpus["documents"])
+    print(f"{len(corpus['documents'])} documents, {planted} planted PII values in {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+CPU time of the PDF stages of one LLM-engine request (extraction, rendering every
+page, redaction and save): opening the file once per stage, as before, vs. one
+shared DocumentSession.
+
+    python -m bench.document_session --pages 200 --repeat 3
+    python -m bench.document_session --pages 200 --no-render --repair
+
+With --repair the trailing xref is cut off, as in many scanner and mail-client
+outputs, so every open rebuilds it by scanning the whole file.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import fitz
+
+from bench.corpus import build_pdf
+from core.document import DocumentSession
+from core.extractor import extract_from_pdf
+from core.rasterizer import PdfRasterizer, adaptive_dpi, encode_pixmap
+from core.redactor import redact_pdf
+
+
+def reopening(file_path: str, boxes: list, output_path: str, render: bool):
+    """The previous flow: extraction, the rasterizer and redact_pdf each open and parse the file."""
+    pages = extract_from_pdf(file_path)
+    if render:
+        with fitz.open(file_path) as doc:
+            for page_data in pages:
+                page = doc[page_data["page"]]
+                encode_pixmap(page.get_pixmap(dpi=adaptive_dpi(page.rect, page_data["words"])))
+    redact_pdf(file_path, boxes, output_path)
+
+
+def shared_session(file_path: str, boxes: list, output_path: str, render: bool):
+    with DocumentSession(file_path) as session:
+        extract_from_pdf(session)
+        if render:
+            for source in PdfRasterizer(session).sources():
+                source.render()
+        session.redact(boxes, output_path)
+
+
+def cpu_time(repeat: int, fn, *args) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        fn(*args)
+        best = min(best, time.process_time() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--density", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-render", dest="render", action="store_false", help="leave out page rendering")
+    parser.add_argument("--repair", action="store_true", help="drop the xref so each open has to rebuild it")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source, output = os.path.join(tmp, "source.pdf"), os.path.join(tmp, "out.pdf")
+        planted = build_pdf(source, args.pages, args.density)
+        boxes = [(pii["page"], fitz.Rect(pii["bbox"])) for pii in planted]
+        if args.repair:
+            with open(source, "rb") as f:
+                data = f.read()
+            with open(source, "wb") as f:
+                f.write(data[:data.rfind(b"startxref")])
+
+        def open_and_close():
+            with fitz.open(source) as doc:
+                doc.page_count
+
+        print(f"pages={args.pages} boxes={len(boxes)} size={os.path.getsize(source) / 1024:.0f}KiB "
+              f"open={cpu_time(args.repeat, open_and_close) * 1000:.2f}ms")
+        before = cpu_time(args.repeat, reopening, source, boxes, output, args.render)
+        after = cpu_time(args.repeat, shared_session, source, boxes, output, args.render)
+        print(f"per-stage opens: {before * 1000:.0f}ms cpu  session: {after * 1000:.0f}ms cpu  "
+              f"({(before - after) / before:.1%} less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import io
+import json
+import math
+import random
+import threading
+import time
+from typing import List, Dict
+
+from PIL import Image
+
+
+class FakeRateLimitError(Exception):
+    code = 429
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+def image_tokens(data: bytes) -> int:
+    with Image.open(io.BytesIO(data)) as image:
+        width, height = image.size
+    if width <= 384 and height <= 384:
+        return 258
+    return math.ceil(width / 768) * math.ceil(height / 768) * 258
+
+
+class FakeModel:
+    """
+    Offline stand-in for genai.GenerativeModel: sleeps for `latency` seconds per
+    call plus `latency_per_mb` per MB of images sent, fails a `rate_limit_ratio` share
+    of calls with a 429, and returns `pii`, each value left out with probability
+    1 - `recall`; in a call with several images, every item is returned once per image,
+    tagged with its number, as the batch prompt asks. Counts calls, images, uploaded bytes and image tokens, estimated as
+    Gemini bills them: 258 per image up to 384x384 px, else 258 per 768x768 px tile.
+    """
+
+    def __init__(self, latency: float = 0.5, rate_limit_ratio: float = 0.0,
+                 pii: List[Dict[str, str]] = None, seed: int = 0, recall: float = 1.0, latency_per_mb: float = 0.0):
+        self.model_name = "fake-model"
+        self.latency = latency
+        self.latency_per_mb = latency_per_mb
+        self.images = 0
+        self.uploaded_bytes = 0
+        self.image_tokens = 0
+        self.rate_limit_ratio = rate_limit_ratio
+        self.pii = pii if pii is not None else [{"text": "John Doe", "label": "PERSON"}]
+        self.recall = recall
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, contents, stream: bool = False) -> FakeResponse:
+        parts = [part for part in contents if isinstance(part, dict)]
+        sizes = [len(part["data"]) for part in parts]
+        tokens = sum(image_tokens(part["data"]) for part in parts)
+        with self._lock:
+            self.calls += 1
+            self.images += len(sizes)
+            self.uploaded_bytes += sum(sizes)
+            self.image_tokens += tokens
+            fail = self._random.random() < self.rate_limit_ratio
+            pii = [item for item in self.pii if self.recall >= 1 or self._random.random() < self.recall]
+        if len(parts) > 1:
+            pii = [dict(item, image=number) for number in range(1, len(parts) + 1) for item in pii]
+        time.sleep(self.latency + self.latency_per_mb * sum(sizes) / 1e6)
+        if fail:
+            raise FakeRateLimitError("429 Resource has been exhausted")
+        return FakeResponse(json.dumps(pii))
@@ -0,0 +1,111 @@
+"""
+classic vs llm vs hybrid on a mixed document: plain prose pages with regex-friendly PII,
+pages carrying reference numbers in a format no regex knows, and form pages.
+
+    python -m bench.hybrid --pages 30 --latency 0.5
+
+The LLM is bench.fake_llm.FakeModel, answering with every planted value (each kept
+with probability --recall). Recall is the share of planted values no longer readable
+in the output. Severity is 60 when the spaCy model is installed, else 40.
+"""
+import os
+
+os.environ["PII_CACHE_ENABLED"] = "0"
+
+import argparse
+import random
+import tempfile
+import time
+
+import fitz
+from spacy.util import is_package
+
+from core import engine, identifier_llm
+from core.identifier_classic import SPACY_MODEL
+from core.identifier_llm import TokenBucket
+from core.metrics import HYBRID_ESCALATIONS, REGISTRY
+from core.security import generate_key
+from bench.corpus import FILLER, PiiFactory
+from bench.fake_llm import FakeModel
+
+PAGE_KINDS = ("prose", "references", "prose", "form")
+
+
+def build_document(path: str, pages: int, with_names: bool, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    factory = PiiFactory(rng)
+    planted = []
+    doc = fitz.open()
+    for page_num in range(pages):
+        kind = PAGE_KINDS[page_num % len(PAGE_KINDS)]
+        page = doc.new_page(width=612, height=792)
+        lines = []
+        if kind == "form":
+            for label in ("Customer", "Account", "Email", "Reference"):
+                value = {"Customer": factory.make("PERSON") if with_names else None,
+                         "Account": factory.make("IBAN"), "Email": factory.make("EMAIL"),
+                         "Reference": f"{rng.randrange(10 ** 7, 10 ** 8)}"}[label]
+                if value:
+                    lines.extend([f"{label}:", value])
+                    planted.append(value)
+            lines.extend(rng.choice(FILLER) for _ in range(12))
+        else:
+            for _ in range(40):
+                words = [rng.choice(FILLER) for _ in range(10)]
+                roll = rng.random()
+                if roll < 0.1:
+                    value = factory.make(rng.choice(["EMAIL", "SSN", "CREDIT_CARD"]))
+                elif kind == "references" and roll < 0.25:
+                    value = f"ref {rng.randrange(10 ** 7, 10 ** 8)}"
+                else:
+                    value = None
+                if value:
+                    words.insert(5, value)
+                    planted.append(value.split()[-1] if value.startswith("ref ") else value)
+                lines.append(" ".join(words))
+        for n, line in enumerate(lines):
+            page.insert_text((36, 48 + n * 16), line, fontsize=9)
+    doc.save(path)
+    doc.close()
+    return planted
+
+
+def recall(output_path: str, planted: list) -> float:
+    with fitz.open(output_path) as doc:
+        text = " ".join(page.get_text() for page in doc)
+    return sum(value not in text for value in planted) / len(planted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per fake model call")
+    parser.add_argument("--recall", type=float, default=0.95, help="share of values the fake model reports per call")
+    args = parser.parse_args()
+    with_names = is_package(SPACY_MODEL)
+    severity = 60 if with_names else 40
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "mixed.pdf")
+        planted = build_document(source, args.pages, with_names)
+        key = generate_key()
+        print(f"pages={args.pages} planted={len(planted)} severity={severity} latency={args.latency}s")
+        os.chdir(tmp)
+        try:
+            for name, process in engine.PROCESSORS.items():
+                identifier_llm.model = FakeModel(latency=args.latency, pii=[{"text": value, "label": "PII"} for value in planted], recall=args.recall)
+                identifier_llm.rate_limiter = TokenBucket(requests_per_minute=1e9, burst=1000)
+                REGISTRY.drain()
+                start = time.perf_counter()
+                output, _ = process(source, severity, key, output_path=os.path.join(tmp, f"{name}.pdf"))
+                elapsed = time.perf_counter() - start
+                reasons = {labels[0]: int(count) for labels, count in HYBRID_ESCALATIONS.drain().items()}
+                print(f"{name:>8}: {elapsed:6.2f}s model calls={identifier_llm.model.calls:3d} "
+                      f"recall={recall(output, planted) if output != source else 0.0:.1%}" + (f" escalated={reasons}" if reasons else ""))
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
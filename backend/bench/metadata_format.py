@@ -0,0 +1,86 @@
+"""
+Encrypted metadata: per-item JSON (as stored before) vs. the compact binary envelope.
+Reports encrypt/decrypt time and the size of the serialized JSON the client stores.
+
+    python -m bench.metadata_format --pages 50 --items 200
+"""
+import argparse
+import json
+import random
+import time
+
+from core.metadata import encrypt_metadata, decrypt_metadata
+from core.security import generate_key, encrypt_text, decrypt_text
+
+
+def synthetic_items(pages: int, items_per_page: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    samples = ["John Doe", "555-123-4567", "john.doe@example.com", "DE89 3704 0044 0532 0130 00", "4111 1111 1111 1111"]
+    page_items = {}
+    for page_num in range(pages):
+        page_items[page_num] = []
+        for _ in range(items_per_page):
+            x, y = rng.uniform(0, 500), rng.uniform(0, 750)
+            page_items[page_num].append((rng.choice(samples), [x, y, x + rng.uniform(20, 120), y + 10.5]))
+    return page_items
+
+
+def encrypt_per_item(key: bytes, page_items: dict) -> dict:
+    """The original engine loop: a fresh AESGCM context and base64 string for every item."""
+    pages = {}
+    for page_num, items in page_items.items():
+        pages[str(page_num)] = [
+            {"encrypted_text": encrypt_text(key, text).decode('utf-8'), "bbox": bbox} for text, bbox in items
+        ]
+    return {"pages": pages}
+
+
+def decrypt_per_item(key: bytes, metadata: dict) -> dict:
+    return {
+        int(page_num): [(decrypt_text(key, item["encrypted_text"].encode('utf-8')), item["bbox"]) for item in items]
+        for page_num, items in metadata["pages"].items()
+    }
+
+
+def best_of(repeat: int, fn, *args):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--items", type=int, default=200, help="PII hits per page")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    key = generate_key()
+    page_items = synthetic_items(args.pages, args.items)
+    one_page = [args.pages // 2]
+
+    candidates = (
+        ("per-item", lambda: encrypt_per_item(key, page_items), lambda m: decrypt_per_item(key, m),
+         lambda m: decrypt_per_item(key, {"pages": {str(one_page[0]): m["pages"][str(one_page[0])]}})),
+        ("json", lambda: encrypt_metadata(key, page_items, 'json'), lambda m: decrypt_metadata(key, m),
+         lambda m: decrypt_metadata(key, m, one_page)),
+        ("compact", lambda: encrypt_metadata(key, page_items, 'compact'), lambda m: decrypt_metadata(key, m),
+         lambda m: decrypt_metadata(key, m, one_page)),
+    )
+
+    print(f"pages={args.pages} items/page={args.items} total={args.pages * args.items}")
+    for name, encrypt, decrypt, decrypt_page in candidates:
+        encrypt_time, metadata = best_of(args.repeat, encrypt)
+        decrypt_time, restored = best_of(args.repeat, decrypt, metadata)
+        page_time, _ = best_of(args.repeat, decrypt_page, metadata)
+        size = len(json.dumps(metadata))
+        assert [text for text, _ in restored[0]] == [text for text, _ in page_items[0]], f"{name} round trip failed"
+        print(f"{name:>8}: size={size / 1024:.0f}KiB encrypt={encrypt_time * 1000:.1f}ms "
+              f"decrypt={decrypt_time * 1000:.1f}ms decrypt_one_page={page_time * 1000:.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
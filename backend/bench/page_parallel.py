@@ -0,0 +1,72 @@
+"""
+process_document_classic on a long PDF: in-process vs. sharded across the page pool.
+
+    python -m bench.page_parallel --pages 300 --workers 1 2 4 8
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+# Measure the pipeline, not the detection cache; spawned workers read this too.
+os.environ["PII_CACHE_ENABLED"] = "0"
+
+import fitz
+
+from core import pool
+from core.engine import process_document_classic
+from core.security import generate_key
+
+
+def build_pdf(path: str, pages: int, lines_per_page: int = 60, seed: int = 0):
+    rng = random.Random(seed)
+    filler = ["statement", "balance", "transfer", "account", "period", "fee", "credit", "debit", "total"]
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page(width=612, height=792)
+        for line in range(lines_per_page):
+            words = [rng.choice(filler) for _ in range(8)]
+            if line % 5 == 0:
+                words.append(f"555-{rng.randrange(100, 999)}-{rng.randrange(1000, 9999)}")
+            if line % 7 == 0:
+                words.append(f"client{rng.randrange(1000)}@example.com")
+            page.insert_text((36, 30 + line * 12), " ".join(words), fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--severity", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "bundle.pdf")
+        build_pdf(source, args.pages)
+        os.chdir(tmp)
+        try:
+            baseline = None
+            for workers in args.workers:
+                pool.shutdown_page_pool()
+                pool.PAGE_WORKERS = workers
+                if workers > 1:
+                    # Start the pool outside the timed region, as a running server would have it.
+                    list(pool.get_page_pool().map(abs, range(workers)))
+                start = time.perf_counter()
+                _, metadata = process_document_classic(source, args.severity, generate_key())
+                elapsed = time.perf_counter() - start
+                baseline = baseline or elapsed
+                hits = sum(len(items) for items in metadata.get("pages", {}).values())
+                print(f"workers={workers:<3} {elapsed:7.2f}s {args.pages / elapsed:7.1f} pages/s "
+                      f"speedup={baseline / elapsed:4.2f}x hits={hits}")
+            pool.shutdown_page_pool()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Cross-page entity propagation on a repetitive statement: every page repeats the same
+customer header, and every --terms-every'th page is an identical terms page.
+
+    python -m bench.propagation --pages 60 --recall 0.7
+
+Reports, with propagation off and on:
+  classic: characters NER has to read, detection time, and redacted header values
+  llm:     model calls (bench.fake_llm.FakeModel missing a 1 - --recall share of
+           values per call) and redacted header values
+NER runs only if the spaCy model is installed; otherwise the classic stage is regex
+only and only the NER input size is reported.
+"""
+import os
+
+os.environ["PII_CACHE_ENABLED"] = "0"
+
+import argparse
+import random
+import tempfile
+import time
+
+import fitz
+from spacy.util import is_package
+
+from core import engine, identifier_llm
+from core.extractor import extract_from_pdf
+from core.identifier_classic import SPACY_MODEL
+from core.identifier_llm import TokenBucket
+from core.pipeline import detect_classic_pages
+from core.propagation import mask_repeated_lines
+from core.security import generate_key
+from core.spans import WordIndex
+from bench.corpus import FILLER, PiiFactory
+from bench.fake_llm import FakeModel
+
+TERMS = ["Terms and conditions apply to all accounts held with the bank.",
+         "Interest is calculated daily and credited at the end of each period.",
+         "Please report any unrecognised transaction within thirty days."]
+
+
+def build_statement(path: str, pages: int, terms_every: int, seed: int = 0):
+    rng = random.Random(seed)
+    factory = PiiFactory(rng)
+    name, iban, email = factory.make("PERSON"), factory.make("IBAN"), factory.make("EMAIL")
+    header = [f"Statement for {name}", f"Account {iban}", f"Contact {email}"]
+    body_pii = []
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=612, height=792)
+        if terms_every and page_num % terms_every == terms_every - 1:
+            lines = TERMS * 8
+        else:
+            lines = list(header)
+            for _ in range(40):
+                words = [rng.choice(FILLER) for _ in range(8)]
+                if rng.random() < 0.2:
+                    value = factory.make(rng.choice(["PHONE", "SSN", "CREDIT_CARD"]))
+                    body_pii.append(value)
+                    words.insert(4, value)
+                lines.append(" ".join(words))
+        for n, line in enumerate(lines):
+            page.insert_text((36, 48 + n * 14), line, fontsize=9)
+    doc.save(path)
+    doc.close()
+    return [name, iban, email], body_pii
+
+
+def header_coverage(output_path: str, header_values: list, pages: int) -> str:
+    """Share of header copies no longer readable in the output."""
+    remaining = 0
+    with fitz.open(output_path) as doc:
+        for page in doc:
+            text = page.get_text()
+            remaining += sum(value in text for value in header_values)
+    total = len(header_values) * pages
+    return f"{total - remaining}/{total}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--terms-every", type=int, default=4, help="every n-th page is the same terms page; 0 for none")
+    parser.add_argument("--recall", type=float, default=0.7, help="share of values the fake model reports per call")
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    has_ner = is_package(SPACY_MODEL)
+    severity = 60 if has_ner else 40
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "statement.pdf")
+        header_values, _ = build_statement(source, args.pages, args.terms_every)
+        statement_pages = args.pages - (args.pages // args.terms_every if args.terms_every else 0)
+        key = generate_key()
+        os.chdir(tmp)
+        try:
+            pages_data = extract_from_pdf(source)
+            word_indexes = [WordIndex(page_data["words"]) for page_data in pages_data]
+            full = sum(len(index.text.replace(" ", "")) for index in word_indexes)
+            masked = sum(len(text.replace(" ", "")) for text in mask_repeated_lines(word_indexes))
+            print(f"pages={args.pages} NER input: {full} chars without propagation, {masked} with ({1 - masked / full:.0%} less)")
+
+            for propagate in (False, True):
+                start = time.perf_counter()
+                detections = detect_classic_pages(pages_data, severity, propagate=propagate)
+                elapsed = time.perf_counter() - start
+                hits = sum(len(items) for _, items in detections)
+                print(f"  classic severity={severity} propagate={propagate!s:<5}: {elapsed * 1000:.0f}ms hits={hits}")
+
+            pii = [{"text": value, "label": "PII"} for value in header_values]
+            for propagate in (False, True):
+                engine.PROPAGATE_ENTITIES = propagate
+                identifier_llm.model = FakeModel(latency=args.latency, pii=pii, recall=args.recall)
+                identifier_llm.rate_limiter = TokenBucket(requests_per_minute=1e9, burst=1000)
+                output, _ = engine.process_document_llm(source, 60, key, output_path=os.path.join(tmp, f"llm_{propagate}.pdf"))
+                covered = header_coverage(output, header_values, statement_pages) if output != source else "0"
+                print(f"  llm propagate={propagate!s:<5}: model calls={identifier_llm.model.calls} header values redacted={covered}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Raster redaction and restore: the previous PIL path (convert every frame to RGB, one
+ImageDraw call per box, re-encode) against core.redactor's NumPy path, on a synthetic
+grayscale scan saved as an uncompressed TIFF (edited in place through a memory map),
+an LZW TIFF and a PNG (decoded one frame at a time, kept in their own mode).
+
+    python -m bench.raster_redaction --width 5100 --height 6600 --boxes 400 --pages 2
+
+Each run is a fresh spawned process, so the peak RSS it reports (ru_maxrss above what
+the process held before the call) belongs to that run alone.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import fitz
+import numpy as np
+from PIL import Image, ImageDraw
+
+from core.redactor import _image_font, _select_pages, redact_image, write_on_image
+
+FORMATS = {"tiff_raw": (".tif", {}), "tiff_lzw": (".tif", {"compression": "tiff_lzw"}), "png": (".png", {})}
+
+
+def legacy_open_frames(file_path, selected=None):
+    with Image.open(file_path) as image:
+        frames = []
+        for frame in range(getattr(image, "n_frames", 1)) if selected is None else selected:
+            image.seek(frame)
+            frames.append(image.convert("RGB"))
+        return frames
+
+
+def legacy_save_frames(frames, output_path):
+    if len(frames) > 1:
+        frames[0].save(output_path, save_all=True, append_images=frames[1:])
+    else:
+        frames[0].save(output_path)
+
+
+def legacy_redact_image(file_path, redaction_boxes, output_path):
+    frames = legacy_open_frames(file_path)
+    for frame, bbox in redaction_boxes:
+        ImageDraw.Draw(frames[frame]).rectangle((bbox.x0, bbox.y0, bbox.x1, bbox.y1), fill="black")
+    legacy_save_frames(frames, output_path)
+
+
+def legacy_write_on_image(file_path, restored_data, output_path, pages=None):
+    with Image.open(file_path) as image:
+        frame_count = getattr(image, "n_frames", 1)
+    restored_data, kept = _select_pages(restored_data, pages, frame_count)
+    frames = legacy_open_frames(file_path, kept)
+    for frame, (x0, y0, x1, y1), text in restored_data:
+        draw = ImageDraw.Draw(frames[frame])
+        draw.rectangle((x0, y0, x1, y1), fill="white")
+        font = _image_font(max(int((y1 - y0) * 0.6), 8))
+        left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+        draw.text((x0 + (x1 - x0 - (right - left)) / 2, y0 + (y1 - y0 - (bottom - top)) / 2), text, fill="black", font=font)
+    legacy_save_frames(frames, output_path)
+
+
+IMPLEMENTATIONS = {
+    "pil": (legacy_redact_image, legacy_write_on_image),
+    "numpy": (redact_image, write_on_image),
+}
+
+
+def build_scan(path: str, width: int, height: int, pages: int, options: dict, seed: int = 0):
+    """Light paper with darker text-like bars: compresses like a scan rather than like noise."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(pages):
+        pixels = np.full((height, width), 235, dtype=np.uint8)
+        for y in range(100, height - 100, 60):
+            x = 100
+            while x < width - 300:
+                length = int(rng.integers(40, 240))
+                pixels[y:y + 24, x:x + length] = rng.integers(10, 80)
+                x += length + 30
+        frames.append(Image.fromarray(pixels))
+    frames[0].save(path, save_all=len(frames) > 1, append_images=frames[1:], **options)
+
+
+def make_boxes(width: int, height: int, pages: int, count: int, seed: int = 0):
+    rng = random.Random(seed)
+    boxes = []
+    for _ in range(count):
+        x0, y0 = rng.uniform(0, width - 400), rng.uniform(0, height - 40)
+        boxes.append((rng.randrange(pages), fitz.Rect(x0, y0, x0 + rng.uniform(80, 400), y0 + rng.uniform(20, 40))))
+    return boxes
+
+
+def _run(queue, operation, implementation, source, boxes, output):
+    redact, restore = IMPLEMENTATIONS[implementation]
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if operation == "redact":
+        redact(source, boxes, output)
+    else:
+        restore(source, [(frame, tuple(bbox), "Jane Doe 555-0100") for frame, bbox in boxes], output)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux, bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    queue.put((elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * scale))
+
+
+def measure(operation: str, implementation: str, source: str, boxes: list, output: str):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run, args=(queue, operation, implementation, source, boxes, output))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--width", type=int, default=5100)
+    parser.add_argument("--height", type=int, default=6600)
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--boxes", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    args = parser.parse_args()
+
+    boxes = make_boxes(args.width, args.height, args.pages, args.boxes)
+    print(f"{args.width}x{args.height} L, {args.pages} frame(s), {args.boxes} boxes; median of {args.repeat}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.formats.split(","):
+            extension, options = FORMATS[name]
+            if extension == ".png" and args.pages > 1:
+                continue
+            source = os.path.join(tmp, f"scan_{name}{extension}")
+            build_scan(source, args.width, args.height, args.pages, options)
+            for operation in ("redact", "restore"):
+                for implementation in IMPLEMENTATIONS:
+                    output = os.path.join(tmp, f"{operation}_{implementation}{extension}")
+                    runs = [measure(operation, implementation, source, boxes, output) for _ in range(args.repeat)]
+                    elapsed = float(np.median([run[0] for run in runs]))
+                    peak = float(np.median([run[1] for run in runs]))
+                    with Image.open(output) as result:
+                        mode = result.mode
+                    print(f"{name:>9} {operation:>7} {implementation:>5}: {elapsed * 1000:8.0f}ms peak +{peak / 2 ** 20:6.1f}MiB "
+                          f"output {os.path.getsize(output) / 2 ** 20:6.1f}MiB {mode}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Scaling of redact_pdf with the number of redactions per page.
+
+    python -m bench.redact_pdf --pages 3 --densities 10 100 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import fitz
+
+from core.redactor import redact_pdf
+
+
+def build_pdf(path: str, pages: int, words_per_page: int) -> list:
+    """Writes a PDF with a grid of words and returns one redaction box per word."""
+    doc = fitz.open()
+    boxes = []
+    columns = 20
+    rows = max(1, -(-words_per_page // columns))
+    for page_num in range(pages):
+        page = doc.new_page(width=612, height=792)
+        cell_w, cell_h = 580 / columns, 760 / rows
+        fontsize = max(2, min(8, cell_h * 0.7))
+        for n in range(words_per_page):
+            x, y = 16 + (n % columns) * cell_w, 16 + (n // columns) * cell_h
+            page.insert_text((x, y + fontsize), f"W{n:04d}", fontsize=fontsize)
+            boxes.append((page_num, fitz.Rect(x, y, x + cell_w * 0.9, y + cell_h * 0.9)))
+    doc.save(path)
+    doc.close()
+    return boxes
+
+
+def redact_pdf_per_box(file_path: str, redaction_boxes: list, output_path: str):
+    """The previous implementation: apply_redactions after every single box."""
+    doc = fitz.open(file_path)
+    for page_num, bbox in redaction_boxes:
+        page = doc[page_num]
+        page.add_redact_annot(bbox, fill=(0, 0, 0))
+        page.apply_redactions()
+    doc.save(output_path, garbage=4, clean=True)
+    doc.close()
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--densities", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--skip-per-box-above", type=int, default=1000,
+                        help="the per-box baseline is quadratic; skip it for denser pages")
+    args = parser.parse_args()
+
+    print(f"{'per page':>9} {'per-box':>10} {'batched':>10} {'batched+fast save':>18} {'size compact/fast':>20}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for density in args.densities:
+            source = os.path.join(tmp, f"in_{density}.pdf")
+            boxes = build_pdf(source, args.pages, density)
+            out = os.path.join(tmp, "out.pdf")
+
+            per_box = "skipped"
+            if density <= args.skip_per_box_above:
+                per_box = f"{timed(redact_pdf_per_box, source, boxes, out):.3f}s"
+            batched = timed(redact_pdf, source, boxes, out, compact=True)
+            compact_size = os.path.getsize(out)
+            fast = timed(redact_pdf, source, boxes, out, compact=False)
+            fast_size = os.path.getsize(out)
+            print(f"{density:>9} {per_box:>10} {batched:>9.3f}s {fast:>17.3f}s "
+                  f"{compact_size // 1024:>9}K/{fast_size // 1024}K")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+LLM requests built from text regions vs whole pages, on letter-like pages: a logo, an
+address block, a short body and a footer, with wide margins and blank space between.
+Every --dense-every'th page is a full page of text, which is still sent whole.
+
+    python -m bench.region_requests --pages 24 --latency 0.4 --latency-per-mb 1.0
+
+Modes: "page" (whole pages, one call each: the previous behaviour), "regions" (each
+page's text regions stacked into one image, one page per call) and "regions+batch"
+(the same images, pages packed by plan_batches). The model is bench.fake_llm.FakeModel,
+answering with every planted value; its latency grows with the bytes uploaded.
+Reports calls, images, MB uploaded, estimated image tokens, wall time, pages per
+minute at GEMINI_REQUESTS_PER_MINUTE, and the share of planted values redacted.
+"""
+import os
+
+os.environ["PII_CACHE_ENABLED"] = "0"
+
+import argparse
+import random
+import tempfile
+import time
+
+import fitz
+
+from core import engine, identifier_llm, rasterizer
+from core.identifier_llm import GEMINI_REQUESTS_PER_MINUTE, TokenBucket
+from core.security import generate_key
+from bench.corpus import FILLER, PiiFactory
+from bench.fake_llm import FakeModel
+
+MODES = {
+    "page": dict(crop=False, batch_pages=1),
+    "regions": dict(crop=True, batch_pages=1),
+    "regions+batch": dict(crop=True, batch_pages=identifier_llm.LLM_BATCH_MAX_PAGES),
+}
+
+
+def build_letters(path: str, pages: int, dense_every: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    factory = PiiFactory(rng)
+    planted = []
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=612, height=792)
+        if dense_every and page_num % dense_every == dense_every - 1:
+            for n in range(48):
+                words = [rng.choice(FILLER) for _ in range(12)]
+                if rng.random() < 0.15:
+                    value = factory.make(rng.choice(["EMAIL", "SSN"]))
+                    words.insert(6, value)
+                    planted.append(value)
+                page.insert_text((48, 60 + n * 14), " ".join(words), fontsize=9)
+            continue
+        # Logo: a filled shape with a gradient-free colour, the kind of area a full page spends pixels on.
+        page.draw_rect(fitz.Rect(48, 40, 168, 100), color=(0.1, 0.3, 0.6), fill=(0.1, 0.3, 0.6))
+        name, email, phone = factory.make("PERSON"), factory.make("EMAIL"), factory.make("PHONE")
+        blocks = [
+            ((380, 60), ["Acme Services Ltd", "1 Market Street", "Springfield"]),
+            ((48, 160), [name, "42 Elm Road", f"Phone {phone}"]),
+            ((48, 260), [" ".join(rng.choice(FILLER) for _ in range(12)) for _ in range(5)] + [f"Reply to {email}"]),
+            ((48, 740), ["Acme Services Ltd is registered in England, company 01234567"]),
+        ]
+        for (x, y), lines in blocks:
+            for n, line in enumerate(lines):
+                page.insert_text((x, y + n * 13), line, fontsize=9)
+        planted.extend([email, phone])
+    doc.save(path)
+    doc.close()
+    return planted
+
+
+def redacted_share(output_path: str, planted: list) -> float:
+    with fitz.open(output_path) as doc:
+        text = " ".join(page.get_text() for page in doc)
+    return sum(value not in text for value in planted) / len(planted)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=24)
+    parser.add_argument("--dense-every", type=int, default=4, help="every n-th page is a full page of text; 0 for none")
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds per fake model call")
+    parser.add_argument("--latency-per-mb", type=float, default=1.0, help="extra seconds per MB uploaded")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "letters.pdf")
+        planted = build_letters(source, args.pages, args.dense_every)
+        key = generate_key()
+        print(f"pages={args.pages} planted={len(planted)} latency={args.latency}s+{args.latency_per_mb}s/MB")
+        os.chdir(tmp)
+        try:
+            for name, mode in MODES.items():
+                rasterizer.LLM_CROP_REGIONS = mode["crop"]
+                identifier_llm.LLM_BATCH_MAX_PAGES = mode["batch_pages"]
+                fake = identifier_llm.model = FakeModel(latency=args.latency, latency_per_mb=args.latency_per_mb,
+                                                        pii=[{"text": value, "label": "PII"} for value in planted])
+                identifier_llm.rate_limiter = TokenBucket(requests_per_minute=1e9, burst=1000)
+                start = time.perf_counter()
+                output, _ = engine.process_document_llm(source, 40, key, output_path=os.path.join(tmp, f"{name}.pdf"))
+                elapsed = time.perf_counter() - start
+                print(f"{name:>14}: calls={fake.calls:3d} images={fake.images:3d} uploaded={fake.uploaded_bytes / 1e6:5.2f}MB "
+                      f"tokens={fake.image_tokens:6d} "
+                      f"{elapsed:5.2f}s ({elapsed / args.pages * 1000:4.0f}ms/page) "
+                      f"{args.pages / fake.calls * GEMINI_REQUESTS_PER_MINUTE:5.1f} pages/min at {GEMINI_REQUESTS_PER_MINUTE:.0f} rpm "
+                      f"redacted={redacted_share(output, planted):.0%}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
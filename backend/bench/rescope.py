@@ -0,0 +1,77 @@
+"""
+Changing the severity of an already processed document: a full process_document_classic
+run at the new severity (the previous way) against rescope_document over the document's
+stored detection index.
+
+    python -m bench.rescope --pages 50 --density 0.3 --from 20 --to 40,0
+    python -m bench.rescope --pages 50 --density 0.3 --from 40 --to 20
+
+The index is built by one indexed run at --from. Each severity change then goes through
+IndexStore, as the /rescope/{rescope_id} endpoint does: decrypt the record, filter and
+redact the affected pages, encrypt the new version. Reports wall time, median of
+--repeat, and the pages redacted again (each rescope starts from the --from version).
+Severities that need NER require the spaCy model; without it, stick to 0, 20 and 40.
+"""
+import os
+
+os.environ["PII_CACHE_ENABLED"] = "0"
+
+import argparse
+import statistics
+import tempfile
+import time
+
+from core import engine
+from core.detection_index import DetectionIndex, IndexStore
+from core.metrics import RESCOPED_PAGES
+from core.security import generate_key
+from bench.corpus import build_pdf
+
+
+def _median_seconds(fn, repeat: int) -> float:
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return statistics.median(runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--density", type=float, default=0.3)
+    parser.add_argument("--from", dest="from_severity", type=int, default=20)
+    parser.add_argument("--to", default="40,0")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "document.pdf")
+        build_pdf(source, args.pages, args.density)
+        store = IndexStore(directory=os.path.join(tmp, "indexes"), enabled=True)
+        key = generate_key()
+        rescope_id = "0" * 32
+        index = DetectionIndex("classic", ".pdf", args.from_severity)
+        output, _ = engine.process_document_classic(source, args.from_severity, key, output_path=os.path.join(tmp, "first.pdf"), index=index)
+        store.save(rescope_id, key, index, output, source_path=source)
+        print(f"pages={args.pages} density={args.density} indexed at severity {args.from_severity}")
+
+        for severity in map(int, args.to.split(",")):
+            full = _median_seconds(lambda: engine.process_document_classic(
+                source, severity, generate_key(), output_path=os.path.join(tmp, "full.pdf")), args.repeat)
+
+            def rescope():
+                work_dir = tempfile.mkdtemp(dir=tmp)
+                version = store.open(rescope_id, key, work_dir)
+                engine.rescope_document(version, severity, key, os.path.join(tmp, "rescoped.pdf"))
+
+            RESCOPED_PAGES.drain()
+            rescoped = _median_seconds(rescope, args.repeat)
+            touched = sum(RESCOPED_PAGES.drain().values()) / args.repeat
+            print(f"{args.from_severity:>3} -> {severity:<3}: full run {full * 1000:7.0f}ms, "
+                  f"rescope {rescoped * 1000:6.0f}ms ({full / rescoped:4.1f}x), {touched:.0f} page(s) redacted again")
+
+
+if __name__ == "__main__":
+    main()
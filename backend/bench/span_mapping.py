@@ -0,0 +1,87 @@
+"""
+Span-to-word mapping: the per-span scan over every word vs. the WordIndex binary search.
+
+    python -m bench.span_mapping --words 5000 --spans 500
+"""
+import argparse
+import random
+import time
+
+import fitz
+
+from core.spans import WordIndex
+
+
+def synthetic_page(n_words: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    words = []
+    for n in range(n_words):
+        x, y = (n % 12) * 50.0, (n // 12) * 12.0
+        text = rng.choice(["Invoice", "Total", "555-123-4567", "ACME", "2024-01-01", str(rng.randrange(10 ** 9))])
+        words.append((x, y, x + 45.0, y + 10.0, text))
+    return words
+
+
+def random_spans(text: str, n_spans: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    spans = []
+    for _ in range(n_spans):
+        start = rng.randrange(len(text) - 30)
+        spans.append((start, start + rng.randrange(1, 30)))
+    return spans
+
+
+def resolve_by_scan(words: list, spans: list) -> list:
+    """The previous loop in process_document_classic."""
+    char_offset, word_indices = 0, {}
+    for i, word_info in enumerate(words):
+        start, end = char_offset, char_offset + len(word_info[4])
+        word_indices[i] = {'start': start, 'end': end, 'bbox': fitz.Rect(word_info[0:4]), 'text': word_info[4]}
+        char_offset = end + 1
+
+    results = []
+    for pii_start, pii_end in spans:
+        bboxes, parts = [], []
+        for word_info in word_indices.values():
+            if max(pii_start, word_info['start']) < min(pii_end, word_info['end']):
+                bboxes.append(word_info['bbox'])
+                parts.append(word_info['text'])
+        if bboxes:
+            final_bbox = fitz.Rect()
+            for bbox in bboxes: final_bbox.include_rect(bbox)
+            results.append((" ".join(parts), list(final_bbox)))
+    return results
+
+
+def resolve_by_index(words: list, spans: list) -> list:
+    index = WordIndex(words)
+    return [(index.text_of(first, last), bbox) for first, last, bbox in index.resolve(spans)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--spans", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    words = synthetic_page(args.words)
+    spans = random_spans(" ".join(w[4] for w in words), args.spans)
+
+    timings = {}
+    for name, fn in (("scan", resolve_by_scan), ("index", resolve_by_index)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = fn(words, spans)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = (best, result)
+
+    assert timings["scan"][1] == timings["index"][1], "implementations disagree"
+    scan, index = timings["scan"][0], timings["index"][0]
+    print(f"words={args.words} spans={args.spans} scan={scan * 1000:.1f}ms "
+          f"index={index * 1000:.1f}ms speedup={scan / index:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Service cold start and memory per worker.
+
+    python -m bench.startup --workers 4
+
+Measures, from backend/:
+  import:  seconds to `import main` in a fresh interpreter (median of --repeat)
+  servers: for `uvicorn main:app --workers N` (every worker imports and warms up on
+           its own), `serve.py --no-preload` (fork, then each worker warms up) and
+           `serve.py` (warm up once, then fork), the seconds until /ready answers 200
+           and the proportional set size (PSS, which splits shared pages between the
+           processes sharing them) of the whole process tree once it has settled.
+The page pool is left out (PAGE_WORKERS=1 unless --page-workers is given), so the
+numbers are the web workers' own. Linux only: PSS comes from /proc/<pid>/smaps_rollup.
+"""
+import argparse
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_seconds(repeat: int) -> float:
+    code = "import time; start = time.perf_counter(); import main; print(time.perf_counter() - start)"
+    runs = [float(subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=BACKEND_DIR, env=_env(1),
+                                 capture_output=True, text=True, check=True).stdout.split()[-1]) for _ in range(repeat)]
+    return statistics.median(runs)
+
+
+def _env(page_workers: int) -> dict:
+    return dict(os.environ, PII_CACHE_ENABLED="0", PAGE_WORKERS=str(page_workers), REDACT_JOBS_ENABLED="0", PYTHONWARNINGS="ignore")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _tree(pid: int) -> list:
+    pids, frontier = [pid], [pid]
+    while frontier:
+        children = subprocess.run(["pgrep", "-P", str(frontier.pop())], capture_output=True, text=True).stdout.split()
+        pids.extend(map(int, children))
+        frontier.extend(map(int, children))
+    return pids
+
+
+def _pss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+def _ready(port: int) -> bool:
+    try:
+        return urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=5).status == 200
+    except (urllib.error.URLError, ConnectionError, OSError):
+        return False
+
+
+def measure_server(command: list, workers: int, page_workers: int, timeout: float = 120.0) -> dict:
+    port = _free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(command + ["--port", str(port)], cwd=BACKEND_DIR, env=_env(page_workers),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        # Each worker answers for itself, so a run of 200s is needed before all of them are likely warm.
+        streak = 0
+        while streak < 3 * workers:
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"{command} not ready after {timeout}s")
+            streak = streak + 1 if _ready(port) else 0
+            if not streak:
+                time.sleep(0.05)
+        ready = time.perf_counter() - start
+        # Settled: the tree's PSS stops growing.
+        previous = -1
+        while True:
+            pss = sum(_pss_bytes(pid) for pid in _tree(process.pid))
+            if abs(pss - previous) < 2 ** 20:
+                break
+            previous = pss
+            time.sleep(1.0)
+        return {"ready": ready, "pss": pss, "processes": len(_tree(process.pid))}
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--page-workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"import main: {import_seconds(args.repeat):.2f}s (median of {args.repeat})")
+    servers = {
+        "uvicorn --workers": [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(args.workers), "--log-level", "warning"],
+        "serve.py --no-preload": [sys.executable, "serve.py", "--workers", str(args.workers), "--log-level", "warning", "--no-preload"],
+        "serve.py": [sys.executable, "serve.py", "--workers", str(args.workers), "--log-level", "warning"],
+    }
+    for name, command in servers.items():
+        result = measure_server(command, args.workers, args.page_workers)
+        print(f"{name:>22}: ready in {result['ready']:5.2f}s, PSS {result['pss'] / 2 ** 20:6.0f}MiB total, "
+              f"{result['pss'] / 2 ** 20 / args.workers:5.0f}MiB per worker ({result['processes']} processes)")
+
+
+if __name__ == "__main__":
+    main()
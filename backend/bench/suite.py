@@ -0,0 +1,348 @@
+"""
+End-to-end and per-stage benchmarks over a generated corpus, with JSON results and
+comparison against a saved baseline.
+
+    python -m bench.suite --profile small --save baseline.json
+    python -m bench.suite --profile small --baseline baseline.json --threshold 0.15
+
+Each case runs --repeat times after --warmup untimed runs and reports the median,
+min and max wall time, throughput in pages/sec, and the median time of every pipeline
+stage recorded in core.metrics during the run. The LLM engine runs against
+bench.fake_llm.FakeModel, so no API key or network is needed. Cases whose
+dependencies are missing (e.g. tesseract for scans) are reported as skipped.
+The classic engine defaults to severity 40, which is regex only; use --severity 60
+or higher to include spaCy NER.
+"""
+import os
+
+# Measure the pipeline, not the detection cache; spawned workers read this too.
+os.environ["PII_CACHE_ENABLED"] = "0"
+
+import argparse
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import fitz
+
+from core import identifier_llm
+from core.engine import process_document_classic, process_document_llm, unredact_document
+from core.identifier_llm import TokenBucket
+from core.metadata import encrypt_metadata
+from core.metrics import REGISTRY, STAGE_SECONDS
+from core.pool import shutdown_page_pool
+from core.redactor import redact_pdf
+from core.security import generate_key
+from bench.corpus import PROFILES, build_corpus
+from bench.fake_llm import FakeModel
+
+
+class SkipCase(Exception):
+    """Raised by a case's setup when it cannot run in this environment."""
+
+
+class Context:
+    def __init__(self, work_dir: str, corpus: Dict[str, Any], corpus_dir: str, args: argparse.Namespace):
+        self.work_dir = work_dir
+        self.corpus_dir = corpus_dir
+        self.args = args
+        self.key = generate_key()
+        self.documents = corpus["documents"]
+
+    def document(self, suffixes: tuple) -> Dict[str, Any]:
+        for document in self.documents:
+            if document["file"].lower().endswith(suffixes):
+                return document
+        raise SkipCase(f"corpus has no {'/'.join(suffixes)} document")
+
+    def path(self, document: Dict[str, Any]) -> str:
+        return os.path.join(self.corpus_dir, document["file"])
+
+    def output(self, name: str) -> str:
+        return os.path.join(self.work_dir, name)
+
+
+def require_tesseract():
+    if shutil.which("tesseract") is None:
+        raise SkipCase("tesseract is not installed")
+
+
+def install_fake_llm(ctx: Context, document: Dict[str, Any]):
+    """Answers every page with the document's planted values, after --llm-latency seconds."""
+    identifier_llm.model = FakeModel(latency=ctx.args.llm_latency,
+                                     pii=[{"text": pii["text"], "label": pii["type"]} for pii in document["pii"]])
+    identifier_llm.rate_limiter = TokenBucket(requests_per_minute=1e9, burst=1000)
+
+
+def planted_items(document: Dict[str, Any]) -> Dict[int, list]:
+    page_items: Dict[int, list] = {}
+    for pii in document["pii"]:
+        page_items.setdefault(pii["page"], []).append((pii["text"], pii["bbox"]))
+    return page_items
+
+
+# Each case does its setup and returns the callable to time; the callable returns the
+# number of pages it processed.
+
+def case_classic_pdf(ctx: Context) -> Callable[[], int]:
+    document = ctx.document((".pdf",))
+    return lambda: (process_document_classic(ctx.path(document), ctx.args.severity, ctx.key,
+                                             output_path=ctx.output("classic.pdf")), document["pages"])[1]
+
+
+def case_classic_scan(ctx: Context) -> Callable[[], int]:
+    require_tesseract()
+    document = ctx.document((".tif", ".tiff", ".png"))
+    output = ctx.output("classic" + os.path.splitext(document["file"])[1])
+    return lambda: (process_document_classic(ctx.path(document), ctx.args.severity, ctx.key,
+                                             output_path=output), document["pages"])[1]
+
+
+def case_llm_pdf(ctx: Context) -> Callable[[], int]:
+    document = ctx.document((".pdf",))
+    install_fake_llm(ctx, document)
+    return lambda: (process_document_llm(ctx.path(document), ctx.args.llm_severity, ctx.key,
+                                         output_path=ctx.output("llm.pdf")), document["pages"])[1]
+
+
+def case_llm_scan(ctx: Context) -> Callable[[], int]:
+    require_tesseract()
+    document = ctx.document((".tif", ".tiff", ".png"))
+    install_fake_llm(ctx, document)
+    output = ctx.output("llm" + os.path.splitext(document["file"])[1])
+    return lambda: (process_document_llm(ctx.path(document), ctx.args.llm_severity, ctx.key,
+                                         output_path=output), document["pages"])[1]
+
+
+def case_redact_pdf(ctx: Context) -> Callable[[], int]:
+    document = ctx.document((".pdf",))
+    boxes = [(pii["page"], fitz.Rect(pii["bbox"])) for pii in document["pii"]]
+    return lambda: (redact_pdf(ctx.path(document), boxes, ctx.output("redacted.pdf")), document["pages"])[1]
+
+
+def _redacted_pdf(ctx: Context, document: Dict[str, Any]) -> tuple:
+    redacted = ctx.output("redacted_unredact.pdf")
+    if not os.path.exists(redacted):
+        redact_pdf(ctx.path(document), [(pii["page"], fitz.Rect(pii["bbox"])) for pii in document["pii"]], redacted)
+    return redacted, encrypt_metadata(ctx.key, planted_items(document), ctx.args.metadata_format)
+
+
+def case_unredact_pdf(ctx: Context) -> Callable[[], int]:
+    document = ctx.document((".pdf",))
+    redacted, metadata = _redacted_pdf(ctx, document)
+    return lambda: (unredact_document(redacted, ctx.key, metadata), document["pages"])[1]
+
+
+def case_unredact_page(ctx: Context) -> Callable[[], int]:
+    document = ctx.document((".pdf",))
+    redacted, metadata = _redacted_pdf(ctx, document)
+    return lambda: (unredact_document(redacted, ctx.key, metadata, pages=[document["pages"] // 2]), 1)[1]
+
+
+def _client():
+    try:
+        from fastapi.testclient import TestClient
+    except ImportError as e:
+        raise SkipCase(f"HTTP client unavailable: {e}")
+    import main
+    return TestClient(main.app)
+
+
+def _post_process(client, ctx: Context, document: Dict[str, Any], response_format: str) -> int:
+    with open(ctx.path(document), "rb") as f:
+        response = client.post("/process/", files={"file": (document["file"], f, "application/pdf")},
+                               data={"severity": str(ctx.args.severity), "engine": "classic",
+                                     "response_format": response_format})
+    response.raise_for_status()
+    return document["pages"]
+
+
+def case_http_process_json(ctx: Context) -> Callable[[], int]:
+    document, client = ctx.document((".pdf",)), _client()
+    return lambda: _post_process(client, ctx, document, "json")
+
+
+def case_http_process_multipart(ctx: Context) -> Callable[[], int]:
+    document, client = ctx.document((".pdf",)), _client()
+    return lambda: _post_process(client, ctx, document, "multipart")
+
+
+def case_http_unredact(ctx: Context) -> Callable[[], int]:
+    from base64 import urlsafe_b64encode
+    document, client = ctx.document((".pdf",)), _client()
+    redacted, metadata = _redacted_pdf(ctx, document)
+    form = {"decryption_key": urlsafe_b64encode(ctx.key).decode("utf-8"), "encrypted_metadata_json": json.dumps(metadata)}
+
+    def run() -> int:
+        with open(redacted, "rb") as f:
+            response = client.post("/unredact/", files={"file": ("redacted_doc.pdf", f, "application/pdf")}, data=form)
+        response.raise_for_status()
+        return document["pages"]
+    return run
+
+
+CASES = {
+    "classic_pdf": case_classic_pdf,
+    "classic_scan": case_classic_scan,
+    "llm_pdf": case_llm_pdf,
+    "llm_scan": case_llm_scan,
+    "redact_pdf": case_redact_pdf,
+    "unredact_pdf": case_unredact_pdf,
+    "unredact_page": case_unredact_page,
+    "http_process_json": case_http_process_json,
+    "http_process_multipart": case_http_process_multipart,
+    "http_unredact": case_http_unredact,
+}
+
+
+def stage_totals() -> Dict[str, float]:
+    """Drains the stage histogram, summing seconds per stage across all label sets."""
+    totals: Dict[str, float] = {}
+    for labels, (_, seconds, _) in STAGE_SECONDS.drain().items():
+        totals[labels[0]] = totals.get(labels[0], 0.0) + seconds
+    return totals
+
+
+def run_case(name: str, ctx: Context) -> Dict[str, Any]:
+    try:
+        fn = CASES[name](ctx)
+        for _ in range(ctx.args.warmup):
+            fn()
+    except SkipCase as e:
+        return {"skipped": str(e)}
+
+    runs, stage_runs, pages = [], [], 0
+    for _ in range(ctx.args.repeat):
+        REGISTRY.drain()
+        start = time.perf_counter()
+        pages = fn()
+        runs.append(time.perf_counter() - start)
+        stage_runs.append(stage_totals())
+
+    median = statistics.median(runs)
+    stages = sorted({stage for totals in stage_runs for stage in totals})
+    return {
+        "seconds": median,
+        "min": min(runs),
+        "max": max(runs),
+        "runs": runs,
+        "pages": pages,
+        "pagesPerSecond": pages / median if median > 0 else None,
+        "stages": {stage: statistics.median(totals.get(stage, 0.0) for totals in stage_runs) for stage in stages},
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    comparison = {}
+    for name, result in results["cases"].items():
+        before = baseline.get("cases", {}).get(name)
+        if "seconds" not in result or not before or "seconds" not in before:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] > 0 else float("inf")
+        status = "regression" if ratio > 1 + threshold else "improvement" if ratio < 1 - threshold else "unchanged"
+        comparison[name] = {"baseline": before["seconds"], "current": result["seconds"], "ratio": ratio, "status": status}
+    return comparison
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        revision = None
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pymupdf": fitz.VersionBind,
+        "revision": revision or None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def print_report(results: Dict[str, Any]):
+    comparison = results.get("comparison", {})
+    for name, result in results["cases"].items():
+        if "skipped" in result:
+            print(f"{name:<24} skipped: {result['skipped']}")
+            continue
+        line = f"{name:<24} {result['seconds'] * 1000:9.1f}ms  {result['pagesPerSecond']:8.1f} pages/s"
+        if name in comparison:
+            line += f"  x{comparison[name]['ratio']:.2f} {comparison[name]['status']}"
+        print(line)
+        top = sorted(result["stages"].items(), key=lambda item: -item[1])[:4]
+        if top:
+            print(" " * 26 + "  ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in top))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--corpus", help="existing corpus directory (from bench.corpus) instead of generating one")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--severity", type=int, default=40)
+    parser.add_argument("--llm-severity", type=int, default=60)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--metadata-format", choices=["json", "compact"], default="json")
+    parser.add_argument("--save", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    cwd = os.getcwd()
+    save_path = os.path.abspath(args.save) if args.save else None
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = os.path.abspath(args.corpus) if args.corpus else os.path.join(tmp, "corpus")
+        if args.corpus:
+            with open(os.path.join(corpus_dir, "corpus.json"), "r", encoding="utf-8") as f:
+                corpus = json.load(f)
+        else:
+            corpus = build_corpus(corpus_dir, seed=args.seed, **PROFILES[args.profile])
+        work_dir = os.path.join(tmp, "work")
+        os.makedirs(work_dir)
+        # The engines and the HTTP app write their scratch directories relative to the cwd.
+        os.chdir(work_dir)
+        try:
+            ctx = Context(work_dir, corpus, corpus_dir, args)
+            results: Dict[str, Any] = {
+                "environment": environment(),
+                "settings": {"profile": None if args.corpus else args.profile, "seed": args.seed,
+                             "repeat": args.repeat, "severity": args.severity, "llmSeverity": args.llm_severity,
+                             "llmLatency": args.llm_latency, "metadataFormat": args.metadata_format},
+                "cases": {},
+            }
+            for name in args.cases:
+                results["cases"][name] = run_case(name, ctx)
+        finally:
+            os.chdir(cwd)
+            shutdown_page_pool()
+
+    if baseline is not None:
+        results["comparison"] = compare(results, baseline, args.threshold)
+    print_report(results)
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = [name for name, entry in results.get("comparison", {}).items() if entry["status"] == "regression"]
+    if regressions:
+        print(f"regressions: {', '.join(regressions)}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
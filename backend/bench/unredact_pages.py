@@ -0,0 +1,88 @@
+"""
+Unredaction of a long PDF: the whole document with the per-box writer it used to have,
+the whole document with the batched writer, and a single page.
+
+    python -m bench.unredact_pages --pages 200 --hits 40
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import fitz
+
+from core.engine import unredact_document
+from core.metadata import encrypt_metadata, decrypt_metadata
+from core.redactor import redact_pdf
+from core.security import generate_key
+
+
+def build_redacted_pdf(tmp: str, pages: int, hits: int, seed: int = 0):
+    rng = random.Random(seed)
+    source, redacted = os.path.join(tmp, "source.pdf"), os.path.join(tmp, "redacted_source.pdf")
+    doc = fitz.open()
+    page_items = {}
+    for page_num in range(pages):
+        page = doc.new_page(width=612, height=792)
+        page_items[page_num] = []
+        for hit in range(hits):
+            y = 30 + hit * 18
+            text = f"555-{rng.randrange(100, 999)}-{rng.randrange(1000, 9999)}"
+            page.insert_text((72, y), text, fontsize=10)
+            page_items[page_num].append((text, [70.0, y - 10.0, 140.0, y + 3.0]))
+    doc.save(source)
+    doc.close()
+    redact_pdf(source, [(page_num, fitz.Rect(bbox)) for page_num, items in page_items.items() for _, bbox in items], redacted)
+    return redacted, page_items
+
+
+def write_per_box(file_path: str, restored_data: list, output_path: str):
+    """The writer as it was: a draw_rect and an insert_text call for every box."""
+    doc = fitz.open(file_path)
+    for page_num, bbox_coords, text in restored_data:
+        page = doc[page_num]
+        bbox = fitz.Rect(bbox_coords)
+        page.draw_rect(bbox, color=(1, 1, 1), fill=(1, 1, 1))
+        page.insert_text(bbox.bl + (2, -2), text, fontsize=max(int(bbox.height * 0.6), 6), fontname="helv", color=(0, 0, 0))
+    doc.save(output_path)
+    doc.close()
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--hits", type=int, default=40, help="redacted boxes per page")
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        redacted, page_items = build_redacted_pdf(tmp, args.pages, args.hits)
+        key = generate_key()
+        os.chdir(tmp)
+        try:
+            for metadata_format in ("json", "compact"):
+                metadata = encrypt_metadata(key, page_items, metadata_format)
+
+                def per_box():
+                    restored = [(page_num, bbox, text) for page_num, items in decrypt_metadata(key, metadata).items()
+                                for text, bbox in items]
+                    write_per_box(redacted, restored, "per_box.pdf")
+
+                before = timed(per_box)
+                full = timed(unredact_document, redacted, key, metadata)
+                one_page = timed(unredact_document, redacted, key, metadata, pages=[args.pages // 2])
+                print(f"{metadata_format:>7}: pages={args.pages} hits/page={args.hits} per-box={before * 1000:.0f}ms "
+                      f"batched={full * 1000:.0f}ms one-page={one_page * 1000:.1f}ms")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, List, Sequence, Tuple
+
+# Minimum per-token similarity for the fuzzy fallback; 0 disables it.
+LLM_ALIGN_FUZZY_RATIO = float(os.environ.get("LLM_ALIGN_FUZZY_RATIO", "0"))
+
+
+# \w is exactly str.isalnum() plus "_", so this keeps the alphanumeric characters.
+_NON_ALNUM = re.compile(r"[\W_]+")
+
+
+def normalize_token(text: str) -> str:
+    """Case-folds and drops punctuation, so "Doe," and "doe" compare equal."""
+    return _NON_ALNUM.sub("", text.casefold())
+
+
+Pattern = Tuple[str, ...]
+
+
+class PatternSet:
+    """Query strings tokenized and indexed by first token once, for matching against many pages."""
+
+    def __init__(self, texts: Sequence[str]):
+        self.patterns: List[Pattern] = [
+            tuple(token for token in map(normalize_token, (text or "").split()) if token) for text in texts
+        ]
+        self.by_first_token: Dict[str, set] = defaultdict(set)
+        for pattern in self.patterns:
+            if pattern:
+                self.by_first_token[pattern[0]].add(pattern)
+
+
+class PageAligner:
+    """
+    Locates strings returned by the LLM among a page's OCR/text-layer words.
+    The page is tokenized and normalized once; all query strings are then matched
+    in a single pass over the page tokens, using a hash table keyed on each query's
+    first token. Every occurrence is reported, not just the first.
+    """
+
+    def __init__(self, words: Sequence[Sequence], fuzzy_ratio: float = LLM_ALIGN_FUZZY_RATIO):
+        self.fuzzy_ratio = fuzzy_ratio
+        self.tokens: List[str] = []
+        self.word_ids: List[int] = []
+        for i, word in enumerate(words):
+            token = normalize_token(word[4])
+            if token:
+                self.tokens.append(token)
+                self.word_ids.append(i)
+
+    def _word_range(self, pos: int, length: int) -> Tuple[int, int]:
+        return self.word_ids[pos], self.word_ids[pos + length - 1] + 1
+
+    def find_all(self, texts: Sequence[str]) -> List[List[Tuple[int, int]]]:
+        """
+        Returns, for each input string, the [first, last) word ranges where it occurs.
+        """
+        pattern_set = PatternSet(texts)
+        found = self.find_patterns(pattern_set)
+        patterns = pattern_set.patterns
+
+        if self.fuzzy_ratio > 0:
+            for pattern in set(patterns):
+                if pattern and pattern not in found:
+                    found[pattern] = self._find_fuzzy(pattern)
+
+        return [list(found.get(pattern, [])) for pattern in patterns]
+
+    def find_patterns(self, pattern_set: PatternSet) -> Dict[Pattern, List[Tuple[int, int]]]:
+        """Exact occurrences of every pattern in the set, as [first, last) word ranges."""
+        found: Dict[Pattern, List[Tuple[int, int]]] = defaultdict(list)
+        by_first_token = pattern_set.by_first_token
+        tokens = self.tokens
+        for pos, token in enumerate(tokens):
+            for pattern in by_first_token.get(token, ()):
+                length = len(pattern)
+                if tuple(tokens[pos:pos + length]) == pattern:
+                    found[pattern].append(self._word_range(pos, length))
+        return found
+
+    def _similar(self, a: str, b: str) -> bool:
+        return a == b or SequenceMatcher(None, a, b).ratio() >= self.fuzzy_ratio
+
+    def _find_fuzzy(self, pattern: Tuple[str, ...]) -> List[Tuple[int, int]]:
+        length = len(pattern)
+        return [
+            self._word_range(pos, length)
+            for pos in range(len(self.tokens) - length + 1)
+            if all(self._similar(self.tokens[pos + j], pattern[j]) for j in range(length))
+        ]
@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import zipfile
+import threading
+from base64 import urlsafe_b64encode
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .security import generate_key
+from .engine import PROCESSORS, IMAGE_EXTENSIONS
+from .metadata import MetadataFormat, METADATA_FORMAT
+from . import pool
+
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "4"))
+# Documents staged or running at once; bounds memory and scratch disk for huge archives.
+BATCH_MAX_IN_FLIGHT = int(os.environ.get("BATCH_MAX_IN_FLIGHT", str(2 * max(BATCH_WORKERS, os.cpu_count() or 1))))
+SUPPORTED_EXTENSIONS = [".pdf"] + IMAGE_EXTENSIONS
+# Declared size of all documents in an archive; zipfile never inflates a member past its
+# declared size, so this bounds the scratch disk a zip bomb can take.
+BATCH_MAX_UNCOMPRESSED_BYTES = int(os.environ.get("BATCH_MAX_UNCOMPRESSED_BYTES", str(4 * 1024 ** 3)))
+# Batch directories hold decryption keys and staged originals: left behind by a crash, they
+# are purged once untouched for this long (see purge_expired_batches).
+BATCH_TTL_SECONDS = int(os.environ.get("BATCH_TTL_SECONDS", str(24 * 3600)))
+
+MANIFEST_NAME = "manifest.jsonl"
+SUMMARY_NAME = "summary.json"
+DOCUMENTS_DIR = "documents"
+STAGING_DIR = "staging"
+
+STATUS_REDACTED = "redacted"
+STATUS_CLEAN = "clean"
+STATUS_FAILED = "failed"
+
+# (name, stage): name is the document's relative path inside the batch, stage() returns
+# a local path to read it from and whether that path is a scratch copy to delete afterwards.
+BatchItem = Tuple[str, Callable[[], Tuple[str, bool]]]
+
+_active_dirs = set()
+_active_lock = threading.Lock()
+
+
+class BatchInProgressError(Exception):
+    """Raised when a second run is started on an output directory that is already in use."""
+
+
+class ArchiveTooLargeError(ValueError):
+    """Raised for an archive whose documents add up to more than BATCH_MAX_UNCOMPRESSED_BYTES."""
+
+
+def is_supported(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+
+
+def safe_relpath(name: str) -> str:
+    """Normalizes an archive member name to a relative path that cannot escape the output directory."""
+    parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".", "..")]
+    if not parts:
+        raise ValueError(f"Invalid document name: {name!r}")
+    return os.path.join(*parts)
+
+
+def file_digest(path: str, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_directory(root: str) -> Iterator[BatchItem]:
+    for directory, subdirs, files in os.walk(root):
+        subdirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(directory, filename)
+            if is_supported(filename):
+                yield os.path.relpath(path, root), (lambda path=path: (path, False))
+
+
+def check_archive_size(archive: zipfile.ZipFile, max_bytes: int = BATCH_MAX_UNCOMPRESSED_BYTES):
+    total = sum(info.file_size for info in archive.infolist() if not info.is_dir() and is_supported(info.filename))
+    if total > max_bytes:
+        raise ArchiveTooLargeError(f"Archive expands to {total} bytes (limit {max_bytes}).")
+
+
+def iter_zip(archive: zipfile.ZipFile, staging_dir: str) -> Iterator[BatchItem]:
+    """
+    Yields archive members lazily; each is only extracted to `staging_dir` when staged.
+    Raises ArchiveTooLargeError before yielding anything for an oversized archive.
+    """
+    check_archive_size(archive)
+    for n, info in enumerate(archive.infolist()):
+        if info.is_dir() or not is_supported(info.filename):
+            continue
+
+        def stage(info=info, n=n):
+            os.makedirs(staging_dir, exist_ok=True)
+            path = os.path.join(staging_dir, f"{n}{os.path.splitext(info.filename)[1].lower()}")
+            with archive.open(info) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            return path, True
+
+        yield info.filename, stage
+
+
+def redact_one(input_path: str, output_path: str, severity: int, engine: str,
+               metadata_format: MetadataFormat = METADATA_FORMAT) -> Dict[str, Any]:
+    """
+    Worker entry point: redacts one document to output_path with a fresh key.
+    Documents without PII are copied through unchanged.
+    """
+    key = generate_key()
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    process = PROCESSORS[engine]
+    redacted_path, encrypted_metadata = process(input_path, severity, key, output_path=output_path, metadata_format=metadata_format)
+    if redacted_path != output_path:
+        shutil.copyfile(input_path, output_path)
+        return {"status": STATUS_CLEAN}
+    return {
+        "status": STATUS_REDACTED,
+        "decryptionKey": urlsafe_b64encode(key).decode('utf-8'),
+        "encryptedMetadata": encrypted_metadata,
+    }
+
+
+def load_manifest(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Latest manifest entry per document. A line torn by a crash mid-write is ignored,
+    so that document is simply processed again.
+    """
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["document"]] = entry
+    return entries
+
+
+class BatchRunner:
+    """
+    Redacts a stream of documents into `output_dir`:
+
+        documents/<relative path>   redacted (or unchanged, if clean) copy of each input
+        manifest.jsonl              one JSON line per finished document, with its key and metadata
+        summary.json                counts and throughput of the last run
+
+    Documents are fed through a worker pool with at most `max_in_flight` staged at
+    once. Each manifest line is flushed and fsynced after its output is written, so
+    a rerun on the same output directory skips everything already recorded and
+    retries only failures and documents that never finished.
+    Classic runs go to the page process pool; LLM runs use threads, so the rate
+    limiter stays shared.
+    The manifest holds the decryption keys: treat the output directory as secret.
+    """
+
+    def __init__(self, output_dir: str, severity: int, engine: str, metadata_format: MetadataFormat = METADATA_FORMAT,
+                 max_workers: int = BATCH_WORKERS, max_in_flight: int = BATCH_MAX_IN_FLIGHT,
+                 progress_callback: Optional[Callable[[int, int], None]] = None):
+        self.output_dir = output_dir
+        self.severity = severity
+        self.engine = engine
+        self.metadata_format = metadata_format
+        self.max_workers = max_workers
+        self.max_in_flight = max(1, max_in_flight)
+        self.progress_callback = progress_callback
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self.documents_dir = os.path.join(output_dir, DOCUMENTS_DIR)
+        self.staging_dir = os.path.join(output_dir, STAGING_DIR)
+
+    def _executor(self) -> Optional[Executor]:
+        """Thread pool for runs that call the LLM; None means documents go to the page process pool."""
+        if self.engine == 'classic' and pool.pool_available():
+            return None
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="redact-batch")
+
+    def run(self, items: List[BatchItem]) -> Dict[str, Any]:
+        output_key = os.path.abspath(self.output_dir)
+        with _active_lock:
+            if output_key in _active_dirs:
+                raise BatchInProgressError(f"A batch is already writing to {self.output_dir}.")
+            _active_dirs.add(output_key)
+        try:
+            return self._run(items)
+        finally:
+            with _active_lock:
+                _active_dirs.discard(output_key)
+
+    def _run(self, items: List[BatchItem]) -> Dict[str, Any]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        finished = {name for name, entry in load_manifest(self.manifest_path).items()
+                    if entry["status"] != STATUS_FAILED}
+        pending = [(name, stage) for name, stage in items if name not in finished]
+        total = len(items)
+        counts = {STATUS_REDACTED: 0, STATUS_CLEAN: 0, STATUS_FAILED: 0}
+        done = total - len(pending)
+        if self.progress_callback: self.progress_callback(done, total)
+
+        started = time.monotonic()
+        executor = self._executor()
+        in_flight: Dict[Future, Tuple[str, str, bool]] = {}
+        queue = iter(pending)
+        try:
+            with open(self.manifest_path, "a", encoding="utf-8") as manifest:
+                while True:
+                    while len(in_flight) < self.max_in_flight:
+                        item = next(queue, None)
+                        if item is None:
+                            break
+                        self._submit(executor, in_flight, *item, manifest=manifest, counts=counts)
+                    if not in_flight:
+                        break
+                    completed, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        name, input_path, is_scratch = in_flight.pop(future)
+                        try:
+                            entry = pool.result(future)
+                        except Exception as e:
+                            entry = {"status": STATUS_FAILED, "error": str(e)}
+                        finally:
+                            if is_scratch and os.path.exists(input_path):
+                                os.remove(input_path)
+                        self._record(manifest, name, entry, counts)
+                        done += 1
+                        if self.progress_callback: self.progress_callback(done, total)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+        elapsed = time.monotonic() - started
+        processed = sum(counts.values())
+        summary = {
+            "documents": total,
+            "skipped": total - len(pending),
+            "processed": processed,
+            "redacted": counts[STATUS_REDACTED],
+            "clean": counts[STATUS_CLEAN],
+            "failed": counts[STATUS_FAILED],
+            "seconds": round(elapsed, 3),
+            "docsPerSecond": round(processed / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+        with open(os.path.join(self.output_dir, SUMMARY_NAME), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        return summary
+
+    def _submit(self, executor: Optional[Executor], in_flight: Dict[Future, Tuple[str, str, bool]], name: str,
+                stage: Callable[[], Tuple[str, bool]], manifest, counts: Dict[str, int]):
+        try:
+            output_path = os.path.join(self.documents_dir, safe_relpath(name))
+            input_path, is_scratch = stage()
+        except Exception as e:
+            self._record(manifest, name, {"status": STATUS_FAILED, "error": str(e)}, counts)
+            return
+        submit = executor.submit if executor is not None else pool.submit
+        future = submit(redact_one, input_path, output_path, self.severity, self.engine, self.metadata_format)
+        in_flight[future] = (name, input_path, is_scratch)
+
+    def _record(self, manifest, name: str, entry: Dict[str, Any], counts: Dict[str, int]):
+        if entry["status"] != STATUS_FAILED:
+            entry["output"] = os.path.join(DOCUMENTS_DIR, safe_relpath(name))
+        manifest.write(json.dumps({"document": name, **entry}) + "\n")
+        manifest.flush()
+        os.fsync(manifest.fileno())
+        counts[entry["status"]] += 1
+
+
+def run_directory_batch(input_dir: str, output_dir: str, severity: int, engine: str, **kwargs) -> Dict[str, Any]:
+    return BatchRunner(output_dir, severity, engine, **kwargs).run(list(iter_directory(input_dir)))
+
+
+def run_zip_batch(zip_path: str, output_dir: str, severity: int, engine: str, **kwargs) -> Dict[str, Any]:
+    runner = BatchRunner(output_dir, severity, engine, **kwargs)
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            return runner.run(list(iter_zip(archive, runner.staging_dir)))
+    finally:
+        shutil.rmtree(runner.staging_dir, ignore_errors=True)
+
+
+def purge_expired_batches(root: str, ttl_seconds: int = BATCH_TTL_SECONDS):
+    """Removes batch directories and packed archives under `root` untouched for `ttl_seconds`, except running ones."""
+    if not os.path.isdir(root):
+        return
+    cutoff = time.time() - ttl_seconds
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        with _active_lock:
+            if os.path.abspath(path) in _active_dirs:
+                continue
+        try:
+            # A directory's own mtime does not change as its manifest grows.
+            touched = max([os.path.getmtime(path)] + [os.path.getmtime(os.path.join(path, entry))
+                                                      for entry in (os.listdir(path) if os.path.isdir(path) else [])])
+            if touched >= cutoff:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def pack_outputs(output_dir: str, archive_path: str):
+    """Zips the redacted documents, manifest and summary of a finished batch."""
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        for name in (MANIFEST_NAME, SUMMARY_NAME):
+            archive.write(os.path.join(output_dir, name), name, compress_type=zipfile.ZIP_DEFLATED)
+        documents_dir = os.path.join(output_dir, DOCUMENTS_DIR)
+        for directory, _, files in os.walk(documents_dir):
+            for filename in sorted(files):
+                path = os.path.join(directory, filename)
+                # PDFs and images are already compressed; storing them avoids a second pass.
+                archive.write(path, os.path.relpath(path, output_dir), compress_type=zipfile.ZIP_STORED)
@@ -0,0 +1,180 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from base64 import urlsafe_b64decode
+from typing import Any, Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+from .security import encrypt_text, decrypt_text
+
+PII_CACHE_ENABLED = os.environ.get("PII_CACHE_ENABLED", "1") == "1"
+PII_CACHE_PATH = os.environ.get("PII_CACHE_PATH", os.path.join("cache", "pii_cache.sqlite3"))
+PII_CACHE_MAX_BYTES = int(os.environ.get("PII_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+PII_CACHE_TTL_SECONDS = int(os.environ.get("PII_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Expired and over-size entries are evicted once every this many writes, not on each one.
+PII_CACHE_EVICT_EVERY = int(os.environ.get("PII_CACHE_EVICT_EVERY", "100"))
+
+
+def _load_cache_key() -> Optional[bytes]:
+    """
+    PII_CACHE_KEY is a url-safe base64 32-byte key. There is no fallback: a random key
+    would leave every stored entry unreadable after a restart, yet still taking space.
+    """
+    configured = os.environ.get("PII_CACHE_KEY")
+    return urlsafe_b64decode(configured) if configured else None
+
+
+def _derive_subkeys(key: bytes) -> Tuple[bytes, bytes]:
+    """Separate lookup (HMAC) and value (AES-GCM) keys, so neither use of the key weakens the other."""
+    derived = HKDF(algorithm=hashes.SHA256(), length=64, salt=None, info=b"redact pii cache").derive(key)
+    return derived[:32], derived[32:]
+
+
+class PiiCache:
+    """
+    Disk-backed cache of detection results, keyed on page content + engine + severity + model version.
+    Lookup keys are an HMAC of the content so the store never holds a plain digest of PII,
+    and values are AES-GCM encrypted. Entries expire after `ttl_seconds`, and the least
+    recently used ones are evicted once the store grows past `max_bytes`, checked every
+    `evict_every` writes. Without a key (PII_CACHE_KEY) the cache is disabled.
+    """
+
+    def __init__(self, path: str = PII_CACHE_PATH, max_bytes: int = PII_CACHE_MAX_BYTES,
+                 ttl_seconds: int = PII_CACHE_TTL_SECONDS, key: bytes = None, enabled: bool = True,
+                 evict_every: int = PII_CACHE_EVICT_EVERY):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = max(1, evict_every)
+        self._key = None
+        key = key or _load_cache_key()
+        if key:
+            self._set_key(key)
+        elif enabled:
+            print("PII_CACHE_KEY is not set; the PII detection cache is disabled.")
+            enabled = False
+        self.enabled = enabled
+        self._conn = None
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def key(self) -> Optional[bytes]:
+        return self._key
+
+    def _set_key(self, key: bytes):
+        self._key = key
+        self._lookup_key, self._value_key = _derive_subkeys(key)
+
+    def adopt_key(self, key: Optional[bytes]):
+        """Switches to another process's key, so worker processes share one set of entries."""
+        if key:
+            self._set_key(key)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        return self._conn
+
+    def make_key(self, engine: str, severity: int, model_version: str, content: bytes) -> str:
+        digest = hmac.new(self._lookup_key, content, hashlib.sha256)
+        digest.update(f"|{engine}|{severity}|{model_version}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, engine: str, severity: int, model_version: str, content: bytes) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        key = self.make_key(engine, severity, model_version, content)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            try:
+                value = json.loads(decrypt_text(self._value_key, row[0]))
+            except ValueError:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def put(self, engine: str, severity: int, model_version: str, content: bytes, value: Any):
+        if not self.enabled:
+            return
+        key = self.make_key(engine, severity, model_version, content)
+        payload = encrypt_text(self._value_key, json.dumps(value))
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now),
+            )
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= self.evict_every:
+                self._puts_since_evict = 0
+                self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        expired = conn.execute("DELETE FROM entries WHERE created < ?", (now - self.ttl_seconds,)).rowcount
+        self.evictions += max(expired, 0)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, Any]:
+        entries, size = 0, 0
+        if self.enabled:
+            with self._lock:
+                entries, size = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "maxBytes": self.max_bytes,
+        }
+
+
+pii_cache = PiiCache(enabled=PII_CACHE_ENABLED)
@@ -0,0 +1,269 @@
+import os
+import re
+import json
+import time
+import zlib
+import fcntl
+import threading
+from base64 import b64encode, b64decode
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set
+
+import numpy as np
+
+from .security import encrypt_bytes, decrypt_bytes, encrypt_file, decrypt_file
+from .identifier_classic import SEVERITY_MAPPING as CLASSIC_SEVERITY_MAPPING, uses_ner
+from .identifier_llm import SEVERITY_MAPPING as LLM_SEVERITY_MAPPING
+from .pipeline import Candidate
+from .propagation import WordRange
+
+# Allows requests to retain a document, so its severity can be changed later (see IndexStore).
+# Off by default: a retained record holds the original upload, and each request must also
+# ask for it (retain_for_rescope).
+DETECTION_INDEX_ENABLED = os.environ.get("DETECTION_INDEX_ENABLED", "0") == "1"
+DETECTION_INDEX_DIR = os.environ.get("DETECTION_INDEX_DIR", "indexes")
+DETECTION_INDEX_TTL_SECONDS = int(os.environ.get("DETECTION_INDEX_TTL_SECONDS", str(24 * 3600)))
+DETECTION_INDEX_PURGE_INTERVAL_SECONDS = int(os.environ.get("DETECTION_INDEX_PURGE_INTERVAL_SECONDS", "600"))
+
+CLASSIC, LLM = "classic", "llm"
+ALL_TYPES = "ALL_POSSIBLE_PII"
+RESCOPE_ID = re.compile(r"[0-9a-f]{32}")
+INDEX_FORMAT_VERSION = 1
+# Word positions (block, line, word) follow the box and text in text-layer words; OCR words have none.
+POSITION_FIELDS = 3
+
+
+class NotIndexedError(Exception):
+    """Raised when a severity needs LLM detections the index does not hold: the model was not asked for those types."""
+
+
+class UnknownDocumentError(Exception):
+    """Raised for a rescope id the store holds no (unexpired) record of."""
+
+
+def covering_severity(severity: int) -> int:
+    """
+    The classic severity to detect at so that the index also answers every severity that
+    costs the same to detect: all of them when NER runs anyway, the regex-only ones otherwise.
+    """
+    ner = uses_ner(severity)
+    return max(level for level in CLASSIC_SEVERITY_MAPPING if uses_ner(level) == ner)
+
+
+def _pack_words(words: Sequence[Sequence]) -> Dict[str, Any]:
+    """A page's words as columns, boxes and positions as binary arrays: far cheaper to decode than JSON numbers."""
+    positioned = bool(words) and len(words[0]) >= 4 + 1 + POSITION_FIELDS
+    return {
+        "texts": [word[4] for word in words],
+        "boxes": b64encode(np.asarray([word[:4] for word in words], dtype="<f8").tobytes()).decode("ascii"),
+        "positions": b64encode(np.asarray([word[5:8] for word in words], dtype="<i4").tobytes()).decode("ascii") if positioned else None,
+    }
+
+
+def _unpack_words(packed: Dict[str, Any]) -> List[tuple]:
+    texts = packed["texts"]
+    boxes = np.frombuffer(b64decode(packed["boxes"]), dtype="<f8").reshape(len(texts), 4).tolist()
+    if packed["positions"] is None:
+        return [(*box, text) for box, text in zip(boxes, texts)]
+    positions = np.frombuffer(b64decode(packed["positions"]), dtype="<i4").reshape(len(texts), POSITION_FIELDS).tolist()
+    return [(*box, text, *position) for box, text, position in zip(boxes, texts, positions)]
+
+
+def severity_types(detector: str, severity: int) -> List[str]:
+    return (CLASSIC_SEVERITY_MAPPING if detector == CLASSIC else LLM_SEVERITY_MAPPING).get(severity, [])
+
+
+class DetectionIndex:
+    """
+    Every candidate entity of a document, labelled with its type and the detector that
+    found it ("classic" or "llm"), as [first, last) ranges of its page's words, which are
+    kept too. `covered` lists the types each detector was run for: any severity asking
+    only for covered types is answered by filtering the candidates, without detection.
+    `severity` is the one the document's current output was redacted at.
+    """
+
+    def __init__(self, engine: str, extension: str, severity: int, pages_words: Optional[List[list]] = None,
+                 candidates: Optional[List[List[list]]] = None, covered: Optional[Dict[str, List[str]]] = None,
+                 llm_pages: Optional[List[int]] = None):
+        self.engine = engine
+        self.extension = extension
+        self.severity = severity
+        self.pages_words = pages_words or []
+        # Per page, [detector, label, first, last] lists.
+        self.candidates = candidates or [[] for _ in self.pages_words]
+        self.covered = covered or {}
+        # Pages the engine sent to the LLM.
+        self.llm_pages = llm_pages or []
+
+    def set_pages(self, pages_words: Sequence[Sequence[Sequence]]):
+        self.pages_words = [list(words) for words in pages_words]
+        self.candidates = [[] for _ in self.pages_words]
+
+    def add(self, detector: str, types: Sequence[str], page_candidates: Sequence[Sequence[Candidate]]):
+        """Replaces the detector's candidates with `page_candidates`, found looking for `types`."""
+        for page, found in zip(self.candidates, page_candidates):
+            page[:] = [candidate for candidate in page if candidate[0] != detector]
+            page.extend([detector, label, first, last] for label, first, last in found)
+        self.covered[detector] = list(types)
+
+    def missing_types(self, detector: str, severity: int) -> List[str]:
+        """The types `severity` asks the detector for that the index was not built with."""
+        covered = self.covered.get(detector, [])
+        if ALL_TYPES in covered:
+            return []
+        return [ptype for ptype in severity_types(detector, severity) if ptype not in covered]
+
+    def page_ranges(self, detector: str, severity: int) -> List[Set[WordRange]]:
+        """
+        Word ranges of the detector's candidates whose type `severity` asks for. LLM labels
+        are free text, so all of the model's answers are kept when `severity` asks for
+        everything it was asked for; only a narrower severity filters them by label.
+        """
+        types = set(severity_types(detector, severity))
+        keep_all = detector == LLM and bool(types) and (ALL_TYPES in types or set(self.covered.get(LLM, [])) <= types)
+        return [
+            {(first, last) for source, label, first, last in page if source == detector and (keep_all or label in types)}
+            for page in self.candidates
+        ]
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(json.dumps({
+            "version": INDEX_FORMAT_VERSION, "engine": self.engine, "extension": self.extension, "severity": self.severity,
+            "pages_words": [_pack_words(words) for words in self.pages_words], "candidates": self.candidates, "covered": self.covered, "llm_pages": self.llm_pages,
+        }).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DetectionIndex":
+        fields = json.loads(zlib.decompress(data))
+        if fields.pop("version") != INDEX_FORMAT_VERSION:
+            raise ValueError("Unsupported detection index version.")
+        fields["pages_words"] = [_unpack_words(packed) for packed in fields["pages_words"]]
+        return cls(**fields)
+
+
+class RetainedVersion:
+    """
+    The current redacted version of a retained document, opened with its key: the index,
+    and decrypted working copies of the original and of the current output.
+    """
+
+    def __init__(self, rescope_id: str, index: DetectionIndex, source_path: str, output_path: str):
+        self.rescope_id = rescope_id
+        self.index = index
+        self.source_path = source_path
+        self.output_path = output_path
+
+
+class IndexStore:
+    """
+    Keeps, per rescope id, the detection index, the original file and the current redacted
+    output, each AES-GCM encrypted with the document's decryption key, which the service
+    itself never stores: only whoever holds the key can change the severity. Files are
+    encrypted in segments (encrypt_file), so saving does not hold them in memory.
+    A record expires `ttl_seconds` after it was last saved; expired records are purged at
+    startup and at most every `purge_interval` seconds on save.
+
+    This is not the app's DocumentVersion (prisma/schema.prisma): that record holds the
+    redacted file in S3 and its metadata, never the original or the detections, and this
+    service cannot reach the app's database. The app keeps the rescope id with the version
+    it stores, and stores a rescoped result as its next version.
+    """
+
+    def __init__(self, directory: str = DETECTION_INDEX_DIR, ttl_seconds: int = DETECTION_INDEX_TTL_SECONDS,
+                 enabled: bool = DETECTION_INDEX_ENABLED, purge_interval: int = DETECTION_INDEX_PURGE_INTERVAL_SECONDS):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+
+    def _path(self, rescope_id: str, part: str) -> str:
+        if not RESCOPE_ID.fullmatch(rescope_id):
+            raise UnknownDocumentError(rescope_id)
+        return os.path.join(self.directory, f"{rescope_id}.{part}")
+
+    @staticmethod
+    def _associated_data(rescope_id: str, part: str) -> bytes:
+        # Parts are bound to their id and role, so they cannot be swapped between records.
+        return f"{rescope_id}:{part}".encode("utf-8")
+
+    def _write(self, rescope_id: str, part: str, key: bytes, data: bytes):
+        path = self._path(rescope_id, part)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(encrypt_bytes(key, data, self._associated_data(rescope_id, part)))
+        os.replace(f"{path}.tmp", path)
+
+    def _write_file(self, rescope_id: str, part: str, key: bytes, file_path: str):
+        path = self._path(rescope_id, part)
+        encrypt_file(key, file_path, f"{path}.tmp", self._associated_data(rescope_id, part))
+        os.replace(f"{path}.tmp", path)
+
+    @contextmanager
+    def locked(self, rescope_id: str) -> Iterator[None]:
+        """
+        Holds the record's lock file, across threads and worker processes alike: open,
+        change and save a record inside it, so concurrent changes apply one after another.
+        """
+        if not os.path.exists(self._path(rescope_id, "index")):
+            raise UnknownDocumentError(rescope_id)
+        with open(self._path(rescope_id, "lock"), "ab") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def save(self, rescope_id: str, key: bytes, index: DetectionIndex, output_path: str, source_path: Optional[str] = None):
+        """
+        Stores a new version; `source_path`, the original, is only needed the first time.
+        A record that already exists must only be saved while holding locked().
+        """
+        if time.time() - self._last_purge >= self.purge_interval:
+            self.purge_expired()
+        os.makedirs(self.directory, exist_ok=True)
+        if source_path:
+            self._write_file(rescope_id, "source", key, source_path)
+        else:
+            # The original expires with the record, not with the first version.
+            os.utime(self._path(rescope_id, "source"))
+        self._write_file(rescope_id, "output", key, output_path)
+        # Written last: a record is complete once its index exists.
+        self._write(rescope_id, "index", key, index.to_bytes())
+
+    def open(self, rescope_id: str, key: bytes, work_dir: str) -> RetainedVersion:
+        """
+        Decrypts a record into `work_dir`. Raises UnknownDocumentError for unknown or
+        expired ids and ValueError for a wrong key.
+        """
+        index_path = self._path(rescope_id, "index")
+        if not os.path.exists(index_path) or time.time() - os.path.getmtime(index_path) > self.ttl_seconds:
+            raise UnknownDocumentError(rescope_id)
+        with open(index_path, "rb") as f:
+            index = DetectionIndex.from_bytes(decrypt_bytes(key, f.read(), self._associated_data(rescope_id, "index")))
+        paths = {}
+        for part in ("source", "output"):
+            paths[part] = os.path.join(work_dir, f"{part}_{rescope_id}{index.extension}")
+            decrypt_file(key, self._path(rescope_id, part), paths[part], self._associated_data(rescope_id, part))
+        return RetainedVersion(rescope_id, index, paths["source"], paths["output"])
+
+    def purge_expired(self):
+        self._last_purge = time.time()
+        if not os.path.isdir(self.directory):
+            return
+        cutoff = self._last_purge - self.ttl_seconds
+        with self._lock:
+            # Lock files go last, and only with their record: one still in use may be old.
+            names = sorted(os.listdir(self.directory), key=lambda name: name.endswith(".lock"))
+            for name in names:
+                path = os.path.join(self.directory, name)
+                try:
+                    if name.endswith(".lock") and os.path.exists(path[:-len("lock")] + "index"):
+                        continue
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+
+index_store = IndexStore()
@@ -0,0 +1,81 @@
+import mmap
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import fitz
+
+from .redactor import COMPACT_PDF_OUTPUT, redact_pdf_document
+
+
+class DocumentSession:
+    """
+    One open PDF shared by every stage of a request: extraction, rendering and
+    redaction all use the same fitz.Document, so the xref and page tree are parsed
+    once and there is a single save at the end. The file is memory-mapped rather
+    than read, so pages a request never touches are never paged in.
+    Word lists are cached per page. PyMuPDF is not thread-safe; code that uses `doc`
+    from other threads (the rasterizer) must hold `lock`.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.doc: Optional[fitz.Document] = None
+        self.lock = threading.RLock()
+        self._words: Dict[int, List[Sequence]] = {}
+        # Pages without a text layer whose words came from OCR.
+        self.ocr_pages: Set[int] = set()
+        self._view = self._map = None
+        self._file = open(file_path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._map)
+            self.doc = fitz.open(stream=self._view, filetype="pdf")
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def page_count(self) -> int:
+        return self.doc.page_count
+
+    def words(self, page_num: int) -> List[Sequence]:
+        """The page's text-layer words, as page.get_text("words"); extracted once per session."""
+        with self.lock:
+            words = self._words.get(page_num)
+            if words is None:
+                words = self._words[page_num] = self.doc[page_num].get_text("words")
+            return words
+
+    def set_ocr_words(self, page_num: int, words: List[Sequence]):
+        """Replaces the (empty) words of a page without a text layer with its OCR results."""
+        with self.lock:
+            self._words[page_num] = words
+            self.ocr_pages.add(page_num)
+
+    def has_content(self, page_num: int) -> bool:
+        with self.lock:
+            return bool(self.doc[page_num].get_contents())
+
+    def redact(self, redaction_boxes: List[Tuple[int, fitz.Rect]], output_path: str, compact: bool = COMPACT_PDF_OUTPUT):
+        """Applies the redactions to this document and saves it to output_path; see redactor.redact_pdf."""
+        with self.lock:
+            redact_pdf_document(self.doc, redaction_boxes, output_path, compact)
+
+    def close(self):
+        # The document reads straight from the mapping, so it has to go first.
+        if self.doc is not None:
+            self.doc.close()
+            self.doc = None
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
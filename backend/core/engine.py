@@ -1,158 +1,319 @@
 import os
-import shutil
 import fitz  
-import time
-from typing import Dict, Any, Tuple
+from contextlib import nullcontext
+from functools import wraps
+from typing import Dict, Any, List, Set, Tuple, Callable, Optional
 
-from .security import decrypt_text, encrypt_text
-from .redactor import redact_pdf, redact_image, write_on_image, write_on_pdf
+from .metadata import MetadataFormat, METADATA_FORMAT, encrypt_metadata, decrypt_metadata, make_selection
+from .redactor import redact_image, redact_pdf_document, write_on_image, write_on_pdf
 from .extractor import extract_from_pdf, extract_from_image
+from .ocr import image_frame_count
+from .document import DocumentSession
+from .spans import WordIndex
+from .alignment import PageAligner
+from .propagation import PROPAGATE_ENTITIES, WordRange, duplicate_pages, propagate_entities
 
-from .identifier_llm import find_pii as find_pii_llm
-from .identifier_classic import find_pii_classic
+from .identifier_llm import LLMDispatcher
+from .rasterizer import PdfRasterizer, ImageFileSource
+from .identifier_classic import uses_ner
+from .pipeline import (Candidate, use_parallel, run_sharded, detect_classic_pages, classic_candidates, classic_page_ranges,
+                       classic_pdf_shard, classic_index_shard, propagate_across_shards)
+from .hybrid import escalation_reason, merge_ranges
+from .detection_index import CLASSIC, LLM, DetectionIndex, NotIndexedError, RetainedVersion, covering_severity, severity_types
+from .metrics import request_labels, timed, PAGES, PII_HITS, DUPLICATE_PAGES, HYBRID_ESCALATIONS, RESCOPED_PAGES
 
-API_CALL_DELAY_SECONDS = 5
+ProgressCallback = Callable[[int, int], None]
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg", ".tif", ".tiff"]
 
-def process_document_llm(file_path: str, severity: int, encryption_key: bytes) -> Tuple[str, Dict[str, Any]]:
-    file_extension = os.path.splitext(file_path)[1].lower()
-    
-    if file_extension == ".pdf":
-        ocr_pages_data = extract_from_pdf(file_path)
-    elif file_extension in [".png", ".jpg", ".jpeg", "tiff"]:
-        ocr_pages_data = extract_from_image(file_path)
+def default_output_path(file_path: str, engine: str) -> str:
+    output_dir, base_filename = "redacted_files", os.path.basename(file_path)
+    os.makedirs(output_dir, exist_ok=True)
+    return os.path.join(output_dir, f"redacted_{engine}_{base_filename}")
+
+def instrumented(engine: str):
+    """Labels every metric recorded while processing a document and times the whole run as stage "total"."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(file_path: str, severity: int, *args, **kwargs):
+            with request_labels(engine, severity, os.path.splitext(file_path)[1]), timed("total"):
+                return fn(file_path, severity, *args, **kwargs)
+        return wrapper
+    return decorate
+
+def open_document(file_path: str):
+    """A DocumentSession for a PDF, shared by all stages of the request; None (as a context) for images."""
+    if os.path.splitext(file_path)[1].lower() == ".pdf":
+        return DocumentSession(file_path)
+    return nullcontext()
+
+def redact_output(session: Optional[DocumentSession], file_path: str, redaction_visuals: List[Tuple[int, fitz.Rect]], output_path: str):
+    if session: session.redact(redaction_visuals, output_path)
+    else: redact_image(file_path, redaction_visuals, output_path)
+
+def load_pages(session: Optional[DocumentSession], file_path: str) -> Tuple[List[list], List[Any], set]:
+    """Words and LLM page sources of every page, and the pages whose words came from OCR."""
+    if session:
+        pages_data = extract_from_pdf(session)
+        return [page_data["words"] for page_data in pages_data], PdfRasterizer(session).sources(), set(session.ocr_pages)
+    pages_data = extract_from_image(file_path)
+    frame_count = image_frame_count(file_path)
+    pages_words = [pages_data[page_num]["words"] if page_num < len(pages_data) else [] for page_num in range(frame_count)]
+    page_sources = [ImageFileSource(file_path, frame, pages_words[frame]) for frame in range(frame_count)]
+    return pages_words, page_sources, set(range(frame_count))
+
+def dispatch_pages(page_sources: List[Any], pages_words: List[list], page_nums: List[int], severity: int,
+                   progress_callback: Optional[ProgressCallback] = None) -> List[List[Dict[str, str]]]:
+    """
+    Sends the given pages to the LLM and returns the PII list of every page ([] for pages
+    not sent). A page whose text repeats an earlier one's (boilerplate, terms) reuses that page's answer.
+    """
+    duplicates = duplicate_pages(pages_words) if PROPAGATE_ENTITIES else {}
+    selected = set(page_nums)
+    duplicates = {page_num: original for page_num, original in duplicates.items() if page_num in selected and original in selected}
+    unique_pages = [page_num for page_num in page_nums if page_num not in duplicates]
+    DUPLICATE_PAGES.inc(len(duplicates))
+
+    if progress_callback: progress_callback(0, len(unique_pages))
+    unique_results = LLMDispatcher().dispatch_sync([page_sources[page_num] for page_num in unique_pages], severity, progress_callback) if unique_pages else []
+    pii_results = [[] for _ in page_sources]
+    for page_num, pii_text_list in zip(unique_pages, unique_results):
+        pii_results[page_num] = pii_text_list
+    for page_num, original in duplicates.items():
+        pii_results[page_num] = pii_results[original]
+    return pii_results
+
+def align_llm_results(aligners: List[PageAligner], page_ranges: List[set], pii_results: List[List[Dict[str, str]]]) -> List[List[Candidate]]:
+    """
+    Adds the word ranges where each page's LLM-reported strings occur to that page's
+    ranges, and returns them per page, labelled as the model labelled them.
+    """
+    page_candidates = []
+    for aligner, ranges, pii_text_list in zip(aligners, page_ranges, pii_results):
+        candidates = []
+        if pii_text_list:
+            occurrences = aligner.find_all([pii.get("text") for pii in pii_text_list])
+            candidates = [(str(pii.get("label", "")).upper(), first, last) for pii, found in zip(pii_text_list, occurrences) for first, last in found]
+            ranges.update((first, last) for _, first, last in candidates)
+        page_candidates.append(candidates)
+    return page_candidates
+
+def index_classic(index: DetectionIndex, word_indexes: List[WordIndex], severity: int):
+    """Classic candidates of every page, detected at covering_severity(severity) so that a later severity change is a filter."""
+    detect_at = covering_severity(severity)
+    mask_repeated = PROPAGATE_ENTITIES and uses_ner(detect_at)
+    index.add(CLASSIC, severity_types(CLASSIC, detect_at), classic_candidates(word_indexes, detect_at, mask_repeated=mask_repeated))
+
+def index_page_ranges(index: DetectionIndex, severity: int, word_indexes: List[WordIndex],
+                      aligners: Optional[List[PageAligner]] = None) -> List[Set[WordRange]]:
+    """
+    The word ranges the index's engine redacts at `severity`, from the index alone: the
+    candidates filtered by type, then propagated and merged as process_document_* does.
+    The hybrid engine's triage is not redone; pages it sent to the LLM keep their answers.
+    """
+    if index.engine == "llm":
+        page_ranges = [set() for _ in word_indexes]
     else:
+        page_ranges = index.page_ranges(CLASSIC, severity)
+        if PROPAGATE_ENTITIES and uses_ner(severity):
+            propagate_entities(word_indexes, page_ranges, aligners)
+        if index.engine == "classic":
+            return page_ranges
+    for ranges, llm_ranges in zip(page_ranges, index.page_ranges(LLM, severity)):
+        ranges.update(llm_ranges)
+    if PROPAGATE_ENTITIES and (index.engine == "llm" or index.llm_pages):
+        propagate_entities(word_indexes, page_ranges, aligners)
+    if index.engine == "hybrid":
+        page_ranges = [merge_ranges(ranges) for ranges in page_ranges]
+    return page_ranges
+
+def resolve_page_items(word_indexes: List[WordIndex], page_ranges: List[set]) -> Tuple[Dict[int, list], List[Tuple[int, fitz.Rect]]]:
+    page_items, redaction_visuals = {}, []
+    for page_num, (word_index, word_ranges) in enumerate(zip(word_indexes, page_ranges)):
+        if not word_ranges: continue
+        page_items[page_num] = []
+        for first, last, bbox in word_index.resolve_ranges(sorted(word_ranges)):
+            page_items[page_num].append((word_index.text_of(first, last), bbox))
+            redaction_visuals.append((page_num, fitz.Rect(bbox)))
+    return page_items, redaction_visuals
+
+@instrumented("llm")
+def process_document_llm(file_path: str, severity: int, encryption_key: bytes, progress_callback: Optional[ProgressCallback] = None,
+                         output_path: Optional[str] = None, metadata_format: MetadataFormat = METADATA_FORMAT,
+                         index: Optional[DetectionIndex] = None) -> Tuple[str, Dict[str, Any]]:
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension != ".pdf" and file_extension not in IMAGE_EXTENSIONS:
         raise ValueError(f"Unsupported file type: {file_extension}")
 
-    page_images = []
-    temp_image_dir = "temp_page_images"
-    os.makedirs(temp_image_dir, exist_ok=True)
-    if file_extension == ".pdf":
-        doc = fitz.open(file_path)
-        for i, page in enumerate(doc):
-            pix = page.get_pixmap(dpi=200)
-            image_path = os.path.join(temp_image_dir, f"page_{i}.png")
-            pix.save(image_path)
-            page_images.append((i, image_path))
-        doc.close()
-    else:
-        page_images.append((0, file_path))
+    with open_document(file_path) as session:
+        pages_words, page_sources, _ = load_pages(session, file_path)
+        pii_results = dispatch_pages(page_sources, pages_words, list(range(len(page_sources))), severity, progress_callback)
 
-    redaction_visuals = []
-    encrypted_metadata = {"pages": {}}
+        PAGES.inc(len(page_sources))
+        with timed("bbox_resolution"):
+            word_indexes = [WordIndex(words) for words in pages_words]
+            aligners = [PageAligner(words) for words in pages_words]
+            page_ranges = [set() for _ in pages_words]
+            llm_candidates = align_llm_results(aligners, page_ranges, pii_results)
+            if index is not None:
+                index.set_pages(pages_words)
+                index.add(LLM, severity_types(LLM, severity), llm_candidates)
+                index.llm_pages = list(range(len(page_sources)))
+            if PROPAGATE_ENTITIES:
+                propagate_entities(word_indexes, page_ranges, aligners)
+            page_items, redaction_visuals = resolve_page_items(word_indexes, page_ranges)
+        PII_HITS.inc(len(redaction_visuals))
 
-    for i, (page_num, image_path) in enumerate(page_images):
-        print(f"Processing page {page_num+1}/{len(page_images)} with LLM...")
-        ocr_words_on_page = ocr_pages_data[page_num]["words"]
-        pii_text_list = find_pii_llm(image_path, severity)
-        
-        if not pii_text_list: continue
-        encrypted_metadata["pages"][str(page_num)] = []
-
-        for pii in pii_text_list:
-            pii_plaintext = pii.get("text")
-            if not pii_plaintext: continue
-            pii_words = pii_plaintext.split()
-            found_bboxes = []
-            for i in range(len(ocr_words_on_page) - len(pii_words) + 1):
-                is_match = all(ocr_words_on_page[i+j][4] == pii_words[j] for j in range(len(pii_words)))
-                if is_match:
-                    found_bboxes = [fitz.Rect(ocr_words_on_page[i+j][:4]) for j in range(len(pii_words))]
-                    break
-            if found_bboxes:
-                final_bbox = fitz.Rect()
-                for bbox in found_bboxes: final_bbox.include_rect(bbox)
-                encrypted_text = encrypt_text(encryption_key, pii_plaintext)
-                encrypted_metadata["pages"][str(page_num)].append({
-                    "encrypted_text": encrypted_text.decode('utf-8'),
-                    "bbox": [final_bbox.x0, final_bbox.y0, final_bbox.x1, final_bbox.y1]
-                })
-                redaction_visuals.append((page_num, final_bbox) if file_extension == ".pdf" else final_bbox)
-        
-        if i < len(page_images) - 1:
-            print(f"Waiting for {API_CALL_DELAY_SECONDS} seconds...")
-            time.sleep(API_CALL_DELAY_SECONDS)
+        if not redaction_visuals: return file_path, {}
+        output_path = output_path or default_output_path(file_path, "llm")
+        with timed("encryption"):
+            encrypted_metadata = encrypt_metadata(encryption_key, page_items, metadata_format)
+        redact_output(session, file_path, redaction_visuals, output_path)
+    return output_path, encrypted_metadata
 
-    if os.path.exists(temp_image_dir): shutil.rmtree(temp_image_dir)
-    
-    if not redaction_visuals: return file_path, {}
-    output_dir, base_filename = "redacted_files", os.path.basename(file_path)
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, f"redacted_llm_{base_filename}")
-    if file_extension == ".pdf": redact_pdf(file_path, redaction_visuals, output_path)
-    else: redact_image(file_path, redaction_visuals, output_path)
+@instrumented("hybrid")
+def process_document_hybrid(file_path: str, severity: int, encryption_key: bytes, progress_callback: Optional[ProgressCallback] = None,
+                            output_path: Optional[str] = None, metadata_format: MetadataFormat = METADATA_FORMAT,
+                            index: Optional[DetectionIndex] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Classic detection on every page; only pages the heuristics in hybrid.escalation_reason
+    flag (no text layer, form layout, uncovered long numbers or names) also go to the LLM.
+    Both results are merged per page, overlapping hits collapsed into one.
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension != ".pdf" and file_extension not in IMAGE_EXTENSIONS:
+        raise ValueError(f"Unsupported file type: {file_extension}")
+
+    with open_document(file_path) as session:
+        pages_words, page_sources, ocr_pages = load_pages(session, file_path)
+        word_indexes = [WordIndex(words) for words in pages_words]
+        propagate = PROPAGATE_ENTITIES and uses_ner(severity)
+        if index is not None:
+            index.set_pages(pages_words)
+            index_classic(index, word_indexes, severity)
+            page_ranges = index.page_ranges(CLASSIC, severity)
+        else:
+            page_ranges = classic_page_ranges(word_indexes, severity, mask_repeated=propagate)
+
+        with timed("bbox_resolution"):
+            aligners = [PageAligner(words) for words in pages_words]
+            # Before triage, so a name in a repeated header does not count as missed on every page.
+            if propagate:
+                propagate_entities(word_indexes, page_ranges, aligners)
+        escalated = []
+        for page_num, (words, ranges) in enumerate(zip(pages_words, page_ranges)):
+            reason = escalation_reason(words, ranges, severity, ocr=page_num in ocr_pages)
+            if reason:
+                HYBRID_ESCALATIONS.inc(reason=reason)
+                escalated.append(page_num)
+
+        pii_results = dispatch_pages(page_sources, pages_words, escalated, severity, progress_callback)
+
+        PAGES.inc(len(page_sources))
+        with timed("bbox_resolution"):
+            llm_candidates = align_llm_results(aligners, page_ranges, pii_results)
+            if index is not None:
+                index.add(LLM, severity_types(LLM, severity), llm_candidates)
+                index.llm_pages = escalated
+            if PROPAGATE_ENTITIES and escalated:
+                propagate_entities(word_indexes, page_ranges, aligners)
+            page_ranges = [merge_ranges(ranges) for ranges in page_ranges]
+            page_items, redaction_visuals = resolve_page_items(word_indexes, page_ranges)
+        if progress_callback: progress_callback(len(page_sources), len(page_sources))
+        PII_HITS.inc(len(redaction_visuals))
+
+        if not redaction_visuals: return file_path, {}
+        output_path = output_path or default_output_path(file_path, "hybrid")
+        with timed("encryption"):
+            encrypted_metadata = encrypt_metadata(encryption_key, page_items, metadata_format)
+        redact_output(session, file_path, redaction_visuals, output_path)
     return output_path, encrypted_metadata
 
-def process_document_classic(file_path: str, severity: int, encryption_key: bytes) -> Tuple[str, Dict[str, Any]]:
+@instrumented("classic")
+def process_document_classic(file_path: str, severity: int, encryption_key: bytes, progress_callback: Optional[ProgressCallback] = None,
+                             output_path: Optional[str] = None, metadata_format: MetadataFormat = METADATA_FORMAT,
+                             index: Optional[DetectionIndex] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    With `index`, the pages' words and candidates are recorded in it and the output is
+    taken from it (index_page_ranges), as a later severity change will be.
+    """
     file_extension = os.path.splitext(file_path)[1].lower()
-    
-    if file_extension == ".pdf":
-        pages_data = extract_from_pdf(file_path)
-    elif file_extension in [".png", ".jpg", ".jpeg", "tiff"]:
-        pages_data = extract_from_image(file_path)
-    else:
+    if file_extension != ".pdf" and file_extension not in IMAGE_EXTENSIONS:
         raise ValueError(f"Unsupported file type: {file_extension}")
 
-    redaction_visuals = []
-    encrypted_metadata = {"pages": {}}
+    with open_document(file_path) as session:
+        if index is not None:
+            page_detections = index_classic_document(index, session, file_path, severity, progress_callback)
+            page_count = len(index.pages_words)
+        elif session:
+            page_count = session.page_count
+            if use_parallel(page_count):
+                page_detections = run_sharded(classic_pdf_shard, file_path, page_count, severity, progress_callback=progress_callback)
+                page_detections = propagate_across_shards(session, page_detections, severity)
+            else:
+                page_detections = detect_classic_pages(extract_from_pdf(session), severity)
+        else:
+            pages_data = extract_from_image(file_path)
+            page_count = len(pages_data)
+            page_detections = detect_classic_pages(pages_data, severity)
 
-    for page_data in pages_data:
-        page_num = page_data["page"]
-        words = page_data["words"]
-        full_text = " ".join([word[4] for word in words])
-        
-        pii_locations = find_pii_classic(full_text, severity)
-        if not pii_locations: continue
-        encrypted_metadata["pages"][str(page_num)] = []
-
-        char_offset, word_indices = 0, {}
-        for i, word_info in enumerate(words):
-            start, end = char_offset, char_offset + len(word_info[4])
-            word_indices[i] = {'start': start, 'end': end, 'bbox': fitz.Rect(word_info[0:4]), 'text': word_info[4]}
-            char_offset = end + 1
-
-        for pii in pii_locations:
-            pii_start, pii_end = pii['start'], pii['end']
-            pii_words_bboxes, pii_plaintext_parts = [], []
-            for i, word_info in word_indices.items():
-                if max(pii_start, word_info['start']) < min(pii_end, word_info['end']):
-                    pii_words_bboxes.append(word_info['bbox'])
-                    pii_plaintext_parts.append(word_info['text'])
-            if pii_words_bboxes:
-                final_bbox = fitz.Rect()
-                for bbox in pii_words_bboxes: final_bbox.include_rect(bbox)
-                pii_plaintext = " ".join(pii_plaintext_parts)
-                encrypted_text = encrypt_text(encryption_key, pii_plaintext)
-                encrypted_metadata["pages"][str(page_num)].append({
-                    "encrypted_text": encrypted_text.decode('utf-8'),
-                    "bbox": [final_bbox.x0, final_bbox.y0, final_bbox.x1, final_bbox.y1]
-                })
-                redaction_visuals.append((page_num, final_bbox) if file_extension == ".pdf" else final_bbox)
-
-    if not redaction_visuals: return file_path, {}
-    output_dir, base_filename = "redacted_files", os.path.basename(file_path)
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, f"redacted_classic_{base_filename}")
-    if file_extension == ".pdf": redact_pdf(file_path, redaction_visuals, output_path)
-    else: redact_image(file_path, redaction_visuals, output_path)
+        redaction_visuals = []
+        page_items = {}
+
+        for page_num, detections in page_detections:
+            page_items[page_num] = detections
+            for pii_plaintext, bbox in detections:
+                final_bbox = fitz.Rect(bbox)
+                redaction_visuals.append((page_num, final_bbox))
+        if progress_callback: progress_callback(page_count, page_count)
+        PAGES.inc(page_count)
+        PII_HITS.inc(len(redaction_visuals))
+
+        if not redaction_visuals: return file_path, {}
+        output_path = output_path or default_output_path(file_path, "classic")
+        with timed("encryption"):
+            encrypted_metadata = encrypt_metadata(encryption_key, page_items, metadata_format)
+        redact_output(session, file_path, redaction_visuals, output_path)
     return output_path, encrypted_metadata
 
-def unredact_document(redacted_file_path: str, encryption_key: bytes, encrypted_metadata: Dict[str, Any], password: str = None) -> str:
+def index_classic_document(index: DetectionIndex, session: Optional[DocumentSession], file_path: str, severity: int,
+                           progress_callback: Optional[ProgressCallback] = None) -> List[Tuple[int, list]]:
+    """Indexes every page for the classic engine, on the page pool for long PDFs, and returns the detections at `severity`."""
+    if session and use_parallel(session.page_count):
+        shards = run_sharded(classic_index_shard, file_path, session.page_count, covering_severity(severity), progress_callback=progress_callback)
+        index.set_pages([words for _, words, _ in shards])
+        index.add(CLASSIC, severity_types(CLASSIC, covering_severity(severity)), [candidates for _, _, candidates in shards])
+    else:
+        pages_words = load_pages(session, file_path)[0]
+        index.set_pages(pages_words)
+        index_classic(index, [WordIndex(words) for words in pages_words], severity)
+    with timed("bbox_resolution"):
+        word_indexes = [WordIndex(words) for words in index.pages_words]
+        page_items, _ = resolve_page_items(word_indexes, index_page_ranges(index, severity, word_indexes))
+    return sorted(page_items.items())
+
+PROCESSORS: Dict[str, Callable[..., Tuple[str, Dict[str, Any]]]] = {
+    "classic": process_document_classic,
+    "llm": process_document_llm,
+    "hybrid": process_document_hybrid,
+}
+
+def unredact_document(redacted_file_path: str, encryption_key: bytes, encrypted_metadata: Dict[str, Any], password: str = None,
+                      pages: Optional[List[int]] = None, items: Optional[List[Tuple[int, int]]] = None) -> str:
+    """
+    Restores the redacted text; both metadata formats are accepted. With `pages` and/or
+    `items` ((page, index) ids) only those are decrypted, and the output holds only the
+    pages they are on, so restoring one page of a long document costs about one page.
+    """
     file_extension = os.path.splitext(redacted_file_path)[1].lower()
     
-    restored_data_for_writer = []
-    
-    for page_num, pii_items in encrypted_metadata.get("pages", {}).items():
-        for item in pii_items:
-            try:
-                decrypted_text = decrypt_text(encryption_key, item["encrypted_text"].encode('utf-8'))
-                bbox = item["bbox"]
-                if file_extension == ".pdf":
-                    restored_data_for_writer.append((int(page_num), bbox, decrypted_text))
-                else:
-                    restored_data_for_writer.append((bbox, decrypted_text))
-            except ValueError:
-                print(f"Warning: Could not decrypt an item on page {page_num}.")
-                continue
+    selected = decrypt_metadata(encryption_key, encrypted_metadata, pages, items)
+    restored_data_for_writer = [
+        (page_num, bbox, decrypted_text)
+        for page_num, page_items in selected.items()
+        for decrypted_text, bbox in page_items
+    ]
+    selection = make_selection(pages, items)
+    output_pages = None if selection is None else sorted(selection)
     
     if not restored_data_for_writer:
         raise ValueError("No data could be decrypted or restored.")
@@ -162,11 +323,81 @@ def unredact_document(redacted_file_path: str, encryption_key: bytes, encrypted_
     base_filename = os.path.basename(redacted_file_path).replace("redacted_", "")
     output_path = os.path.join(output_dir, f"restored_{base_filename}")
     
-    if file_extension == ".pdf":
-        write_on_pdf(redacted_file_path, restored_data_for_writer, output_path, password)
-    elif file_extension in [".png", ".jpg", ".jpeg", ".tiff"]:
-        write_on_image(redacted_file_path, restored_data_for_writer, output_path)
-    else:
-        raise ValueError(f"Unsupported file type for un-redaction: {file_extension}")
+    with request_labels("unredact", file_type=file_extension):
+        if file_extension == ".pdf":
+            write_on_pdf(redacted_file_path, restored_data_for_writer, output_path, password, output_pages)
+        elif file_extension in IMAGE_EXTENSIONS:
+            write_on_image(redacted_file_path, restored_data_for_writer, output_path, output_pages)
+        else:
+            raise ValueError(f"Unsupported file type for un-redaction: {file_extension}")
         
-    return output_path
\ No newline at end of file
+    return output_path
+
+def _boxes_by_page(redaction_visuals: List[Tuple[int, fitz.Rect]]) -> Dict[int, Set[tuple]]:
+    boxes_by_page: Dict[int, Set[tuple]] = {}
+    for page_num, bbox in redaction_visuals:
+        boxes_by_page.setdefault(page_num, set()).add(tuple(bbox))
+    return boxes_by_page
+
+def rescope_document(version: RetainedVersion, severity: int, encryption_key: bytes, output_path: Optional[str] = None,
+                     metadata_format: MetadataFormat = METADATA_FORMAT) -> Tuple[str, Dict[str, Any]]:
+    """
+    Redacts a retained document again at another severity without extracting or detecting:
+    the redactions are a filter over version.index. Only pages whose boxes change are
+    touched: new boxes are added to the current output, and a page that loses any is
+    taken again from the original and redacted with its new boxes. Classic types the
+    index lacks (NER after a regex-only run) are detected on its stored words; LLM types
+    the model was never asked for raise NotIndexedError. version.index is updated.
+    """
+    index = version.index
+    missing = index.missing_types(LLM, severity) if index.engine != "classic" else []
+    if missing:
+        raise NotIndexedError(f"The LLM was not asked for {', '.join(missing)} at severity {index.severity}; process the document again.")
+
+    with request_labels("rescope", severity, index.extension), timed("total"):
+        word_indexes = [WordIndex(words) for words in index.pages_words]
+        # Only propagation needs them; regex-only classic severities never propagate.
+        propagates = PROPAGATE_ENTITIES and (index.engine != "classic" or uses_ner(index.severity) or uses_ner(severity))
+        aligners = [PageAligner(words) for words in index.pages_words] if propagates else None
+        with timed("bbox_resolution"):
+            _, previous_visuals = resolve_page_items(word_indexes, index_page_ranges(index, index.severity, word_indexes, aligners))
+        if index.engine != "llm" and index.missing_types(CLASSIC, severity):
+            index_classic(index, word_indexes, severity)
+        with timed("bbox_resolution"):
+            page_items, redaction_visuals = resolve_page_items(word_indexes, index_page_ranges(index, severity, word_indexes, aligners))
+        index.severity = severity
+        PII_HITS.inc(len(redaction_visuals))
+
+        if not redaction_visuals: return version.source_path, {}
+        previous_boxes, boxes = _boxes_by_page(previous_visuals), _boxes_by_page(redaction_visuals)
+        redone = sorted(page_num for page_num, page_boxes in previous_boxes.items() if page_boxes - boxes.get(page_num, set()))
+        added = [(page_num, fitz.Rect(bbox)) for page_num, page_boxes in sorted(boxes.items()) if page_num not in redone
+                 for bbox in sorted(page_boxes - previous_boxes.get(page_num, set()))]
+        RESCOPED_PAGES.inc(len(redone), kind="redone")
+        RESCOPED_PAGES.inc(len({page_num for page_num, _ in added}), kind="added")
+
+        with timed("encryption"):
+            encrypted_metadata = encrypt_metadata(encryption_key, page_items, metadata_format)
+        if not redone and not added: return version.output_path, encrypted_metadata
+
+        output_path = output_path or default_output_path(version.source_path, index.engine)
+        # When no redacted page of the current output survives, the original is redacted whole instead.
+        from_original = set(redone) >= set(previous_boxes)
+        if index.extension == ".pdf" and from_original:
+            with DocumentSession(version.source_path) as session:
+                session.redact(redaction_visuals, output_path)
+        elif index.extension == ".pdf":
+            with fitz.open(version.output_path) as doc:
+                if redone:
+                    with fitz.open(version.source_path) as source:
+                        for page_num in redone:
+                            doc.delete_page(page_num)
+                            doc.insert_pdf(source, from_page=page_num, to_page=page_num, start_at=page_num)
+                redone_boxes = [(page_num, fitz.Rect(bbox)) for page_num in redone for bbox in sorted(boxes.get(page_num, ()))]
+                redact_pdf_document(doc, added + redone_boxes, output_path)
+        elif redone:
+            # Frames are re-encoded whole either way, so every box is redrawn on the original.
+            redact_image(version.source_path, redaction_visuals, output_path)
+        else:
+            redact_image(version.output_path, added, output_path)
+    return output_path, encrypted_metadata
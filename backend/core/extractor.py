@@ -1,33 +1,35 @@
-import fitz  
-from PIL import Image
-import pytesseract
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Union
 
-def extract_from_pdf(file_path: str) -> List[Dict[str, Any]]:
-    """Extracts text and bounding boxes from a PDF."""
-    document_data = []
-    doc = fitz.open(file_path)
-    for page_num, page in enumerate(doc):
-        words = page.get_text("words")
-        document_data.append({"page": page_num, "words": words})
-    return document_data
+from .document import DocumentSession
+from .metrics import timed
+from .ocr import ocr_image_frame, ocr_pdf_page, image_frame_count, run_ocr
 
+@timed("extraction")
+def extract_from_pdf(source: Union[str, DocumentSession], page_numbers: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """
+    Extracts text and bounding boxes from a PDF, optionally from the given pages only.
+    Pages that have content but no text layer (scans) are rasterized and OCR'd.
+    `source` is a path or an open DocumentSession, whose word cache then holds the result.
+    """
+    if isinstance(source, DocumentSession):
+        return _extract_pages(source, page_numbers)
+    with DocumentSession(source) as session:
+        return _extract_pages(session, page_numbers)
 
+
+def _extract_pages(session: DocumentSession, page_numbers: Optional[List[int]]) -> List[Dict[str, Any]]:
+    page_numbers = range(session.page_count) if page_numbers is None else page_numbers
+    needs_ocr = [page_num for page_num in page_numbers if not session.words(page_num) and session.has_content(page_num)]
+    for page_data in run_ocr(ocr_pdf_page, session.file_path, needs_ocr):
+        session.set_ocr_words(page_data["page"], page_data["words"])
+    return [{"page": page_num, "words": session.words(page_num)} for page_num in page_numbers]
+
+
+@timed("extraction")
 def extract_from_image(file_path: str) -> List[Dict[str, Any]]:
-    """Extracts text and bounding boxes from an image using OCR."""
+    """Extracts text and bounding boxes from an image using OCR, one page per frame (multi-page TIFF)."""
     try:
-        data = pytesseract.image_to_data(Image.open(file_path), output_type=pytesseract.Output.DICT)
-        words = []
-        n_boxes = len(data['level'])
-        for i in range(n_boxes):
-            if int(data['conf'][i]) > 60: 
-                (x, y, w, h) = (data['left'][i], data['top'][i], data['width'][i], data['height'][i])
-                word = data['text'][i]
-                if word.strip():
-                    words.append([x, y, x + w, y + h, word])
-        
-        return [{"page": 0, "words": words}]
-
+        return run_ocr(ocr_image_frame, file_path, list(range(image_frame_count(file_path))))
     except Exception as e:
         print(f"Error during OCR: {e}")
-        return []
\ No newline at end of file
+        return []
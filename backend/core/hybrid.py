@@ -0,0 +1,74 @@
+import os
+import re
+from typing import Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+
+from .identifier_classic import uses_ner
+from .propagation import WordRange, text_lines
+
+# A page goes to the LLM when one of these shares of its words (or lines) is exceeded.
+# Title-case words no NER entity covers: names the model may have missed.
+HYBRID_NAME_RATIO = float(os.environ.get("HYBRID_NAME_RATIO", "0.05"))
+# Long digit runs no regex covers: account or reference numbers of formats it does not know.
+HYBRID_NUMBER_RATIO = float(os.environ.get("HYBRID_NUMBER_RATIO", "0.01"))
+# Lines of one or two words: forms and tables, where the joined page text loses its structure.
+HYBRID_SHORT_LINE_RATIO = float(os.environ.get("HYBRID_SHORT_LINE_RATIO", "0.6"))
+# Below this many lines / words the ratios are noise, and the page is left to the classic result.
+HYBRID_MIN_LINES = int(os.environ.get("HYBRID_MIN_LINES", "8"))
+HYBRID_MIN_WORDS = int(os.environ.get("HYBRID_MIN_WORDS", "20"))
+
+LONG_NUMBER = re.compile(r"\d{6,}")
+
+
+def covered_words(word_count: int, ranges: Iterable[WordRange]) -> np.ndarray:
+    covered = np.zeros(word_count, dtype=bool)
+    for first, last in ranges:
+        covered[first:last] = True
+    return covered
+
+
+def _line_starts(words: Sequence[Sequence]) -> Set[int]:
+    return {first for first, _ in text_lines(words)}
+
+
+def escalation_reason(words: Sequence[Sequence], ranges: Set[WordRange], severity: int, ocr: bool = False) -> Optional[str]:
+    """
+    Why a page the classic detectors have already seen should also go to the LLM, or
+    None. Checked in order: no text layer, form/table layout, uncovered long numbers,
+    uncovered title-case words (only when the severity asks for NER types).
+    """
+    if ocr:
+        return "no_text_layer"
+
+    lines = list(text_lines(words))
+    if len(lines) >= HYBRID_MIN_LINES and sum(last - first <= 2 for first, last in lines) / len(lines) > HYBRID_SHORT_LINE_RATIO:
+        return "layout"
+    if len(words) < HYBRID_MIN_WORDS:
+        return None
+
+    covered = covered_words(len(words), ranges)
+    numbers = sum(1 for i, word in enumerate(words) if not covered[i] and LONG_NUMBER.search(word[4]))
+    if numbers / len(words) > HYBRID_NUMBER_RATIO:
+        return "numbers"
+
+    if uses_ner(severity):
+        line_starts = _line_starts(words)
+        names = sum(
+            1 for i, word in enumerate(words)
+            if not covered[i] and i not in line_starts and len(word[4]) > 1 and word[4][0].isupper() and word[4][1:].islower()
+        )
+        if names / len(words) > HYBRID_NAME_RATIO:
+            return "names"
+    return None
+
+
+def merge_ranges(ranges: Iterable[WordRange]) -> Set[WordRange]:
+    """Collapses overlapping [first, last) word ranges, e.g. a classic and an LLM hit on the same value, into their union."""
+    merged: List[List[int]] = []
+    for first, last in sorted(ranges):
+        if merged and first < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return {(first, last) for first, last in merged}
@@ -1,56 +1,251 @@
+import os
 import re
-import spacy
-from typing import List, Dict
+import hashlib
+import threading
+from functools import lru_cache
+from importlib import metadata
+from importlib.util import find_spec
+from typing import List, Dict, Iterator, Optional, Tuple
 
-try:
-    nlp = spacy.load("en_core_web_sm")
-except OSError:
-    print("Downloading spaCy model 'en_core_web_sm'...")
-    from spacy.cli import download
-    download("en_core_web_sm")
-    nlp = spacy.load("en_core_web_sm")
+from .cache import pii_cache
+from .metrics import timed, DUPLICATE_PAGES
 
+SPACY_MODEL = "en_core_web_sm"
+# In the en_core_web_* pipelines "ner" has its own tok2vec layer, so everything else can be left out.
+NER_UNUSED_COMPONENTS = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer", "senter"]
+SPACY_BATCH_SIZE = int(os.environ.get("SPACY_BATCH_SIZE", "32"))
+SPACY_N_PROCESS = int(os.environ.get("SPACY_N_PROCESS", "1"))
+# Pages longer than this are split at whitespace before NER, well inside nlp.max_length.
+NER_CHUNK_CHARS = int(os.environ.get("NER_CHUNK_CHARS", "100000"))
+
+_nlp = None
+_nlp_lock = threading.Lock()
+
+def nlp_installed() -> bool:
+    """Whether the spaCy model package is installed, checked without importing spaCy."""
+    return find_spec(SPACY_MODEL) is not None
+
+
+def get_nlp():
+    """
+    Loads the NER-only spaCy pipeline on first use; afterwards every call in this process shares it.
+    spaCy itself is imported here too: it takes about a second, and regex-only requests never need it.
+    """
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                import spacy
+                try:
+                    _nlp = spacy.load(SPACY_MODEL, exclude=NER_UNUSED_COMPONENTS)
+                except OSError:
+                    print(f"Downloading spaCy model '{SPACY_MODEL}'...")
+                    from spacy.cli import download
+                    download(SPACY_MODEL)
+                    _nlp = spacy.load(SPACY_MODEL, exclude=NER_UNUSED_COMPONENTS)
+    return _nlp
+
+# A pattern may mark the part to redact with a "value" group; otherwise the whole match is used.
+# Narrower patterns come first. Cards must be grouped as printed (4-4-4-4, 4-6-5 or 4-6-4,
+# all spaces or all hyphens) or be one run of digits: any digits joined by single spaces,
+# such as a table row, would pass Luhn one time in ten. PHONE has no word boundaries, so it
+# stays after CREDIT_CARD, or it would claim the first ten digits of an ungrouped card.
 REGEX_PATTERNS = {
+    "SSN": re.compile(r"\b\d{3}-\d{2}-\d{4}\b"),
+    "IBAN": re.compile(r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){2,7}(?: ?[A-Z0-9]{1,3})?\b"),
+    "CREDIT_CARD": re.compile(r"\b(?:\d{4}(?: \d{4}){3}|\d{4}(?:-\d{4}){3}|\d{4} \d{6} \d{4,5}|\d{4}-\d{6}-\d{4,5}|\d{13,19})\b"),
     "EMAIL": re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+"),
-    "PHONE": re.compile(r"\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}"),
     "PNR": re.compile(r"\b\d{10}\b"),
-    "TRANSACTION_ID": re.compile(r"Transaction ID:\s*(\d+)"),
-    "INVOICE_NUMBER": re.compile(r"Invoice Number:\s*([A-Z0-9]+)"),
+    "PHONE": re.compile(r"\(?\d{3}\)?[-.\s]?\d{3}[-.\s]?\d{4}"),
+    "TRANSACTION_ID": re.compile(r"Transaction ID:\s*(?P<value>\d+)"),
+    "INVOICE_NUMBER": re.compile(r"Invoice Number:\s*(?P<value>[A-Z0-9]+)"),
+}
+
+def luhn_valid(candidate: str) -> bool:
+    digits = [int(ch) for ch in candidate if ch.isdigit()]
+    if not 13 <= len(digits) <= 19:
+        return False
+    checksum = 0
+    for i, digit in enumerate(reversed(digits)):
+        if i % 2:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        checksum += digit
+    return checksum % 10 == 0
+
+def ssn_valid(candidate: str) -> bool:
+    area, group, serial = candidate.split("-")
+    return area not in ("000", "666") and area[0] != "9" and group != "00" and serial != "0000"
+
+def iban_valid(candidate: str) -> bool:
+    iban = candidate.replace(" ", "")
+    if not 15 <= len(iban) <= 34:
+        return False
+    rearranged = iban[4:] + iban[:4]
+    return int("".join(str(int(ch, 36)) for ch in rearranged)) % 97 == 1
+
+# Run only on candidates the scanner has already matched.
+VALIDATORS = {
+    "CREDIT_CARD": luhn_valid,
+    "SSN": ssn_valid,
+    "IBAN": iban_valid,
 }
 
 SEVERITY_MAPPING = {
     0: [],
-    20: ["CREDIT_CARD", "SSN"],
-    40: ["CREDIT_CARD", "SSN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER"],
-    60: ["CREDIT_CARD", "SSN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER", "PERSON"],
-    80: ["CREDIT_CARD", "SSN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER", "PERSON", "GPE", "DATE"],
-    100: ["CREDIT_CARD", "SSN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER", "PERSON", "GPE", "DATE", "ORG"],
+    20: ["CREDIT_CARD", "SSN", "IBAN"],
+    40: ["CREDIT_CARD", "SSN", "IBAN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER"],
+    60: ["CREDIT_CARD", "SSN", "IBAN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER", "PERSON"],
+    80: ["CREDIT_CARD", "SSN", "IBAN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER", "PERSON", "GPE", "DATE"],
+    100: ["CREDIT_CARD", "SSN", "IBAN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER", "PERSON", "GPE", "DATE", "ORG"],
 }
 
-def find_pii_classic(text: str, severity: int) -> List[Dict[str, int]]:
+def _package_version(name: str) -> Optional[str]:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+# Any change to the model, the patterns or the validators must invalidate cached detections.
+CLASSIC_MODEL_VERSION = "{}-{}+re-{}".format(
+    SPACY_MODEL, _package_version(SPACY_MODEL),
+    hashlib.sha256("|".join(p.pattern for p in REGEX_PATTERNS.values()).encode("utf-8") + b"|validators-1").hexdigest()[:12],
+)
+
+class RegexScanner:
     """
-    Finds PII using Regex and spaCy NER.
+    All enabled REGEX_PATTERNS compiled into one alternation of named groups, so a page
+    is scanned in a single pass. Alternatives are tried in REGEX_PATTERNS order.
+    Candidates of a validated type that fail validation are rescanned with the other
+    enabled patterns, so a bad card number cannot hide a phone number inside it.
     """
-    pii_to_find = SEVERITY_MAPPING.get(severity, [])
-    if not pii_to_find:
-        return []
 
-    found_pii = []
+    def __init__(self, pii_types: Tuple[str, ...]):
+        self.pii_types = [ptype for ptype in REGEX_PATTERNS if ptype in pii_types]
+        alternatives = [
+            "(?P<{0}>{1})".format(ptype, REGEX_PATTERNS[ptype].pattern.replace("(?P<value>", f"(?P<{ptype}__value>"))
+            for ptype in self.pii_types
+        ]
+        self.pattern = re.compile("|".join(alternatives)) if alternatives else None
+        self._value_groups = {
+            ptype: f"{ptype}__value" if "value" in REGEX_PATTERNS[ptype].groupindex else ptype
+            for ptype in self.pii_types
+        }
 
-    for pii_type, pattern in REGEX_PATTERNS.items():
-        if pii_type in pii_to_find:
-            for match in pattern.finditer(text):
-                try:
-                    start, end = match.span(1)
-                except IndexError:
-                    start, end = match.span()
-                found_pii.append({"start": start, "end": end, "label": pii_type})
+    def scan(self, text: str) -> List[Dict[str, int]]:
+        if self.pattern is None:
+            return []
+        found_pii = []
+        value_groups = self._value_groups
+        for match in self.pattern.finditer(text):
+            pii_type = match.lastgroup
+            validator = VALIDATORS.get(pii_type)
+            if validator and not validator(match.group(pii_type)):
+                found_pii.extend(self._rescan(text, match.start(), match.end(), pii_type))
+                continue
+            start, end = match.span(value_groups[pii_type])
+            found_pii.append({"start": start, "end": end, "label": pii_type})
+        return found_pii
 
-    ner_types = [ptype for ptype in pii_to_find if ptype not in REGEX_PATTERNS]
-    if ner_types:
-        doc = nlp(text)
+    def _rescan(self, text: str, window_start: int, window_end: int, rejected_type: str) -> List[Dict[str, int]]:
+        found_pii = []
+        for pii_type in self.pii_types:
+            if pii_type == rejected_type:
+                continue
+            for match in REGEX_PATTERNS[pii_type].finditer(text, window_start, window_end):
+                validator = VALIDATORS.get(pii_type)
+                if validator is None or validator(match.group()):
+                    start, end = match.span("value") if "value" in match.re.groupindex else match.span()
+                    found_pii.append({"start": start, "end": end, "label": pii_type})
+        return found_pii
+
+@lru_cache(maxsize=None)
+def get_scanner(pii_types: Tuple[str, ...]) -> RegexScanner:
+    return RegexScanner(pii_types)
+
+@timed("regex")
+def find_regex_pii(text: str, pii_to_find: List[str]) -> List[Dict[str, int]]:
+    """Single-pass regex detection; the scanner is compiled once per set of enabled types."""
+    return get_scanner(tuple(pii_to_find)).scan(text)
+
+def chunk_text(text: str, max_chars: int = NER_CHUNK_CHARS) -> Iterator[Tuple[int, str]]:
+    """Yields (offset, chunk) pieces of at most max_chars, cut at whitespace where possible."""
+    start = 0
+    while len(text) - start > max_chars:
+        cut = text.rfind(" ", start, start + max_chars)
+        if cut <= start:
+            cut = start + max_chars
+        yield start, text[start:cut]
+        start = cut
+    yield start, text[start:]
+
+@timed("ner")
+def find_ner_pii(texts: List[str], ner_types: List[str], batch_size: int = SPACY_BATCH_SIZE,
+                 n_process: int = SPACY_N_PROCESS) -> List[List[Dict[str, int]]]:
+    """
+    Runs NER over all texts in one nlp.pipe stream and returns the matching entities per text.
+    """
+    results = [[] for _ in texts]
+    pieces = [(chunk, (i, offset)) for i, text in enumerate(texts) for offset, chunk in chunk_text(text)]
+    docs = get_nlp().pipe(pieces, as_tuples=True, batch_size=batch_size, n_process=n_process)
+    for doc, (i, offset) in docs:
         for ent in doc.ents:
             if ent.label_ in ner_types:
-                found_pii.append({"start": ent.start_char, "end": ent.end_char, "label": ent.label_})
+                results[i].append({"start": offset + ent.start_char, "end": offset + ent.end_char, "label": ent.label_})
+    return results
+
+def uses_ner(severity: int) -> bool:
+    return any(ptype not in REGEX_PATTERNS for ptype in SEVERITY_MAPPING.get(severity, []))
 
-    return found_pii
\ No newline at end of file
+def find_pii_classic_batch(texts: List[str], severity: int, batch_size: int = SPACY_BATCH_SIZE,
+                           n_process: int = SPACY_N_PROCESS, ner_texts: Optional[List[str]] = None) -> List[List[Dict[str, int]]]:
+    """
+    Finds PII in every page of a document. Cached pages are skipped, and pages identical
+    to another page in the batch are detected once; the rest go through spaCy together
+    in batches instead of one nlp() call per page.
+    `ner_texts`, if given, is what NER reads instead of each text: the same length, with
+    regions that need no NER (see propagation.mask_repeated_lines) blanked out.
+    """
+    pii_to_find = SEVERITY_MAPPING.get(severity, [])
+    if not pii_to_find:
+        return [[] for _ in texts]
+    ner_types = [ptype for ptype in pii_to_find if ptype not in REGEX_PATTERNS]
+    if not ner_types or ner_texts is None:
+        ner_texts = texts
+    # NER results depend on the masked text, so it is part of the cache key when it differs.
+    contents = [text.encode("utf-8") if ner_text == text else text.encode("utf-8") + b"\0" + ner_text.encode("utf-8")
+                for text, ner_text in zip(texts, ner_texts)]
+
+    results: List[Optional[List[Dict[str, int]]]] = [
+        pii_cache.get("classic", severity, CLASSIC_MODEL_VERSION, content) for content in contents
+    ]
+    first_of: Dict[bytes, int] = {}
+    duplicates: Dict[int, int] = {}
+    for i, cached in enumerate(results):
+        if cached is None:
+            if contents[i] in first_of:
+                duplicates[i] = first_of[contents[i]]
+            else:
+                first_of[contents[i]] = i
+    misses = list(first_of.values())
+    if duplicates:
+        DUPLICATE_PAGES.inc(len(duplicates))
+
+    ner_results = find_ner_pii([ner_texts[i] for i in misses], ner_types, batch_size, n_process) if ner_types and misses else None
+    for n, i in enumerate(misses):
+        found_pii = find_regex_pii(texts[i], pii_to_find)
+        if ner_results:
+            found_pii.extend(ner_results[n])
+        pii_cache.put("classic", severity, CLASSIC_MODEL_VERSION, contents[i], found_pii)
+        results[i] = found_pii
+    for i, original in duplicates.items():
+        results[i] = results[original]
+    return results
+
+def find_pii_classic(text: str, severity: int) -> List[Dict[str, int]]:
+    """
+    Finds PII using Regex and spaCy NER.
+    Results are served from the PII cache when this exact text was seen at this severity.
+    """
+    return find_pii_classic_batch([text], severity, n_process=1)[0]
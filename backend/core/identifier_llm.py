@@ -1,13 +1,16 @@
 import os
 import json
-import google.generativeai as genai
-from PIL import Image
-from typing import List, Dict, Any
+import time
+import random
+import asyncio
+import threading
+import multiprocessing
+from typing import List, Dict, Any, Optional, Callable
 
-try:
-    genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
-except Exception as e:
-    print(f"FATAL: Could not configure Google AI. Check GOOGLE_API_KEY: {e}")
+from .cache import PiiCache, pii_cache
+from .identifier_classic import SEVERITY_MAPPING as CLASSIC_SEVERITY_MAPPING
+from .metrics import timed, LLM_REQUESTS, LLM_RETRIES
+from .rasterizer import PageImage, PageSource, ImageFileSource
 
 safety_settings = [
     {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
@@ -15,38 +18,64 @@ safety_settings = [
     {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
     {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
 ]
-model = genai.GenerativeModel('gemini-1.5-flash-latest', safety_settings=safety_settings)
+GEMINI_MODEL = 'gemini-1.5-flash-latest'
+# Built by get_model() on first use; tests and benches may assign a stand-in directly.
+model = None
+_model_lock = threading.Lock()
+# Bump when the prompt changes so cached answers to the old prompt are not reused.
+PROMPT_VERSION = "2"
 
-SEVERITY_MAPPING = {
-    0: [],
-    20: ["CREDIT_CARD", "SSN"],
-    40: ["CREDIT_CARD", "SSN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER"],
-    60: ["CREDIT_CARD", "SSN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER", "PERSON"],
-    80: ["CREDIT_CARD", "SSN", "EMAIL", "PHONE", "PNR", "TRANSACTION_ID", "INVOICE_NUMBER", "PERSON", "GPE", "DATE"],
-    100: ["ALL_POSSIBLE_PII"],
-}
+# The classic table, so both engines redact the same types at each severity; at 100 the
+# model is asked for everything it recognises rather than for the classic list.
+SEVERITY_MAPPING = {**CLASSIC_SEVERITY_MAPPING, 100: ["ALL_POSSIBLE_PII"]}
 
 
-def identify_pii_text_with_vision(image_path: str, severity: int) -> List[Dict[str, str]]:
+GEMINI_REQUESTS_PER_MINUTE = float(os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "15"))
+GEMINI_BURST = int(os.environ.get("GEMINI_BURST", "3"))
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "4"))
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "4"))
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 30.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Pages whose images fit these budgets together share one model call.
+LLM_BATCH_MAX_PAGES = int(os.environ.get("LLM_BATCH_MAX_PAGES", "4"))
+# About one full page at the rasterizer's MAX_LONG_SIDE_PX.
+LLM_BATCH_MAX_PIXELS = int(os.environ.get("LLM_BATCH_MAX_PIXELS", str(2400 * 1900)))
+
+
+def get_model():
     """
-    Identifies PII text from an image using Gemini Vision.
-    This version DOES NOT ask for bounding boxes, only for the text and label.
+    Configures Google AI and builds the Gemini model on first use. google.generativeai
+    takes about a second to import, which classic-only requests and startup need not pay.
     """
+    global model
+    if model is None:
+        with _model_lock:
+            if model is None:
+                import google.generativeai as genai
+                try:
+                    genai.configure(api_key=os.environ.get("GOOGLE_API_KEY"))
+                except Exception as e:
+                    print(f"FATAL: Could not configure Google AI. Check GOOGLE_API_KEY: {e}")
+                model = genai.GenerativeModel(GEMINI_MODEL, safety_settings=safety_settings)
+    return model
+
+
+def build_prompt(severity: int, images: int = 1) -> Optional[str]:
     pii_to_find = SEVERITY_MAPPING.get(severity)
     if not pii_to_find:
-        return []
+        return None
+    if images > 1:
+        return build_prompt(severity) + f"""
+    You are given {images} images, numbered 1 to {images} in the order they appear; each is a different document page.
+    Add to each PII object an "image" key: the number of the image the text appears in.
+    """
 
     pii_list_str = ", ".join(pii_to_find)
     if "ALL_POSSIBLE_PII" in pii_list_str:
         pii_list_str = "all possible PII..."
 
-    try:
-        image = Image.open(image_path)
-    except Exception as e:
-        print(f"Could not open image file at {image_path}: {e}")
-        return []
-        
-    prompt = f"""
+    return f"""
     You are an expert data security analyst. Analyze the provided document image and identify all instances of the following PII types: [{pii_list_str}].
 
     You must respond ONLY with a valid JSON object. Do not include markdown or explanations.
@@ -61,17 +90,304 @@ def identify_pii_text_with_vision(image_path: str, severity: int) -> List[Dict[s
     ]
     """
 
+
+class MalformedResponseError(ValueError):
+    """The model's answer is not a JSON list of PII items."""
+
+
+def parse_response(response_text: str, strict: bool = False) -> List[Dict[str, str]]:
+    """
+    The items of a model answer that carry a non-empty "text". Anything else in the list
+    is dropped, or with `strict` makes the whole answer malformed.
+    """
+    if response_text.startswith("```json"):
+        response_text = response_text.strip("```json\n").strip("`\n")
     try:
-        response = model.generate_content([prompt, image], stream=False)
-        response_text = response.text
-        if response_text.startswith("```json"):
-            response_text = response_text.strip("```json\n").strip("`\n")
-            
         pii_list = json.loads(response_text)
-        return pii_list
+    except ValueError as e:
+        raise MalformedResponseError(f"Model answer is not JSON: {e}") from e
+    if not isinstance(pii_list, list):
+        raise MalformedResponseError(f"Model answer is a {type(pii_list).__name__}, not a list")
+    valid = [item for item in pii_list
+             if isinstance(item, dict) and isinstance(item.get("text"), str) and item["text"].strip()]
+    if strict and len(valid) < len(pii_list):
+        raise MalformedResponseError(f"{len(pii_list) - len(valid)} of the model's items carry no text")
+    return valid
+
+
+@timed("model")
+def request_pii(image: PageImage, severity: int, llm=None) -> List[Dict[str, str]]:
+    """
+    Sends one page image to the model and returns the parsed PII list.
+    Unlike identify_pii_text_with_vision, API errors are raised so callers can retry.
+    """
+    prompt = build_prompt(severity)
+    if not prompt:
+        return []
+    response = (llm or get_model()).generate_content([prompt, image.as_part()], stream=False)
+    return parse_response(response.text)
+
+
+def request_pii_batch(images: List[PageImage], severity: int, llm=None) -> List[Dict[str, Any]]:
+    """
+    request_pii for several images in one call, each introduced by its number; items
+    carry the "image" (1-based) they were found in, when the model gives it.
+    """
+    if len(images) == 1:
+        return request_pii(images[0], severity, llm)
+    prompt = build_prompt(severity, len(images))
+    if not prompt:
+        return []
+    contents: List[Any] = [prompt]
+    for number, image in enumerate(images, 1):
+        contents.extend((f"Image {number}:", image.as_part()))
+    with timed("model"):
+        response = (llm or get_model()).generate_content(contents, stream=False)
+    # An item without text cannot be told apart from one on another page, so such an
+    # answer is rejected whole rather than trimmed.
+    return parse_response(response.text, strict=True)
+
+
+def plan_batches(page_pixels: List[int], max_pages: Optional[int] = None, max_pixels: Optional[int] = None) -> List[List[int]]:
+    """
+    Groups pages, in order, into model calls from the pixel count of each page's image,
+    within the LLM_BATCH_* budgets unless given. A page that alone exceeds the pixel
+    budget gets a call to itself.
+    """
+    max_pages = max_pages or LLM_BATCH_MAX_PAGES
+    max_pixels = max_pixels or LLM_BATCH_MAX_PIXELS
+    batches: List[List[int]] = []
+    pixels = 0
+    for page, size in enumerate(page_pixels):
+        if not batches or len(batches[-1]) >= max_pages or pixels + size > max_pixels:
+            batches.append([])
+            pixels = 0
+        batches[-1].append(page)
+        pixels += size
+    return batches
+
+
+def model_version(llm=None) -> str:
+    return f"{getattr(llm or get_model(), 'model_name', 'unknown')}+prompt-{PROMPT_VERSION}"
+
+
+def identify_pii_text_with_vision(image_path: str, severity: int) -> List[Dict[str, str]]:
+    """
+    Identifies PII text from an image using Gemini Vision.
+    This version DOES NOT ask for bounding boxes, only for the text and label.
+    Identical page images at the same severity are answered from the PII cache.
+    """
+    if not build_prompt(severity):
+        return []
+    try:
+        image = ImageFileSource(image_path).render()
+    except Exception as e:
+        print(f"Could not open image file at {image_path}: {e}")
+        return []
+    cached = pii_cache.get("llm", severity, model_version(), image.data)
+    if cached is not None:
+        return cached
 
+    try:
+        pii_list = request_pii(image, severity)
     except Exception as e:
         print(f"An error occurred with the Google Gemini API call: {e}")
         return []
+    pii_cache.put("llm", severity, model_version(), image.data, pii_list)
+    return pii_list
+
+find_pii = identify_pii_text_with_vision
+
+
+def is_retryable(error: Exception) -> bool:
+    """429 and 5xx responses (google.api_core errors carry the HTTP status in `.code`) and transport failures."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return getattr(error, "code", None) in RETRYABLE_STATUS_CODES
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `requests_per_minute`.
+    Tokens are reserved up front, so a caller learns how long to wait without
+    holding the lock; the balance may go negative while reservations queue up.
+    Being loop-agnostic, one bucket can be shared by every request in the process;
+    after share_across_fork(), by every process forked from this one too.
+    """
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = max(1, burst)
+        # [tokens, updated]: a list in-process, shared memory once shared across fork.
+        self._state = [float(self.capacity), time.monotonic()]
+        self._lock = threading.Lock()
+
+    def share_across_fork(self):
+        """
+        Moves the balance into shared memory guarded by a process-shared lock, so workers
+        forked afterwards (serve.py) draw on one budget instead of each on its own.
+        CLOCK_MONOTONIC is system-wide, so refill times agree between processes.
+        """
+        with self._lock:
+            state = multiprocessing.get_context("fork").Array("d", self._state)
+        self._state, self._lock = state, state.get_lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            state = self._state
+            now = time.monotonic()
+            tokens = min(self.capacity, state[0] + (now - state[1]) * self.rate) - 1
+            state[0], state[1] = tokens, now
+            return 0.0 if tokens >= 0 else -tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+rate_limiter = TokenBucket(GEMINI_REQUESTS_PER_MINUTE, GEMINI_BURST)
+
+
+class LLMDispatcher:
+    """
+    Fans pages out to the model concurrently, bounded by a shared rate
+    limiter and a cap on in-flight calls, and returns results in page order.
+    Each page is sent as one image of its text-bearing regions (PageSource.render_regions),
+    and pages are packed by plan_batches, several to a call. Items come back tagged with
+    the image, i.e. the page, they were found on; if a call returns any item without its
+    image, each of its pages is asked again on its own, and only those answers are cached.
+    Retryable errors are retried with exponential backoff and jitter; pages whose call
+    still fails yield empty lists, as identify_pii_text_with_vision does.
+    Pages found in `cache` skip the limiter and the model entirely.
+    """
+
+    def __init__(self, llm=None, limiter: TokenBucket = None, max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+                 max_retries: int = GEMINI_MAX_RETRIES, base_delay: float = RETRY_BASE_DELAY_SECONDS,
+                 max_delay: float = RETRY_MAX_DELAY_SECONDS, cache: Optional[PiiCache] = pii_cache):
+        self.llm = llm or get_model()
+        self.limiter = limiter or rate_limiter
+        self.cache = cache
+        self.model_version = model_version(self.llm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = 0
+
+    async def _request(self, images: List[PageImage], severity: int, label: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        One model call with retries; None once it has failed for good. A malformed answer
+        to several images raises MalformedResponseError, so they can be asked for one by one.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire()
+            try:
+                pii_list = await asyncio.to_thread(request_pii_batch, images, severity, self.llm)
+            except MalformedResponseError as e:
+                LLM_REQUESTS.inc(outcome="error")
+                print(f"Unusable answer from the Google Gemini API for {label}: {e}")
+                if len(images) > 1:
+                    raise
+                return None
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    LLM_REQUESTS.inc(outcome="error")
+                    print(f"An error occurred with the Google Gemini API call for {label}: {e}")
+                    return None
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                self.retries += 1
+                LLM_RETRIES.inc()
+                print(f"Retrying {label} in {delay:.1f}s after: {e}")
+                await asyncio.sleep(delay)
+                continue
+            LLM_REQUESTS.inc(outcome="ok")
+            return pii_list
+        return None
+
+    def _render(self, sources: List[PageSource]) -> List[Optional[PageImage]]:
+        rendered = []
+        for source in sources:
+            try:
+                rendered.append(source.render_regions())
+            except Exception as e:
+                print(f"Could not render {source.label}: {e}")
+                rendered.append(None)
+        return rendered
+
+    async def _dispatch_batch(self, semaphore: asyncio.Semaphore, sources: List[PageSource], severity: int) -> List[List[Dict[str, str]]]:
+        # Pages are rendered only once their call holds an in-flight slot, so at most
+        # max_concurrency calls' worth of encoded images are alive at any time.
+        async with semaphore:
+            rendered = await asyncio.to_thread(self._render, sources)
+            results: List[Optional[List[Dict[str, str]]]] = [[] if image is None else None for image in rendered]
+            if self.cache:
+                for n, image in enumerate(rendered):
+                    cached = self.cache.get("llm", severity, self.model_version, image.data) if image else None
+                    if cached is not None:
+                        LLM_REQUESTS.inc(outcome="cached")
+                        results[n] = cached
+
+            pending = [n for n, result in enumerate(results) if result is None]
+            if not pending:
+                return results
+            untagged = False
+            try:
+                pii_list = await self._request([rendered[n] for n in pending], severity, ", ".join(sources[n].label for n in pending))
+            except MalformedResponseError:
+                pii_list, untagged = [], True
+            for n in pending:
+                results[n] = []
+            if pii_list is None:
+                return results
+            for item in pii_list:
+                number = item.pop("image", None)
+                if isinstance(number, str) and number.strip().isdigit():
+                    number = int(number)
+                if len(pending) == 1:
+                    results[pending[0]].append(item)
+                elif isinstance(number, int) and 1 <= number <= len(pending):
+                    results[pending[number - 1]].append(item)
+                else:
+                    untagged = True
+            complete = set(pending)
+            if untagged:
+                # An item without its page could be on any of them, and an unusable answer
+                # belongs to none: ask for each page on its own.
+                for n in pending:
+                    single = await self._request([rendered[n]], severity, sources[n].label)
+                    if single is None:
+                        complete.discard(n)
+                    else:
+                        results[n] = single
+            if self.cache:
+                for n in pending:
+                    if n in complete:
+                        self.cache.put("llm", severity, self.model_version, rendered[n].data, results[n])
+            return results
+
+    async def dispatch(self, sources: List[PageSource], severity: int,
+                       progress_callback: Optional[Callable[[int, int], None]] = None) -> List[List[Dict[str, str]]]:
+        if not build_prompt(severity):
+            return [[] for _ in sources]
+        batches = plan_batches(await asyncio.to_thread(lambda: [source.pixels() for source in sources]))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        done = 0
+
+        async def run_batch(batch: List[int]) -> List[List[Dict[str, str]]]:
+            nonlocal done
+            result = await self._dispatch_batch(semaphore, [sources[n] for n in batch], severity)
+            done += len(batch)
+            if progress_callback: progress_callback(done, len(sources))
+            return result
+
+        results = [[] for _ in sources]
+        for batch, batch_results in zip(batches, await asyncio.gather(*(run_batch(batch) for batch in batches))):
+            for n, pii_list in zip(batch, batch_results):
+                results[n] = pii_list
+        return results
 
-find_pii = identify_pii_text_with_vision
\ No newline at end of file
+    def dispatch_sync(self, sources: List[PageSource], severity: int,
+                      progress_callback: Optional[Callable[[int, int], None]] = None) -> List[List[Dict[str, str]]]:
+        """Runs dispatch on a private event loop; call it from worker threads, not from async code."""
+        return asyncio.run(self.dispatch(sources, severity, progress_callback))
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Any, Callable, List, Optional
+
+MAX_WORKERS = int(os.environ.get("REDACT_MAX_WORKERS", "2"))
+MAX_PENDING_JOBS = int(os.environ.get("REDACT_MAX_PENDING_JOBS", "8"))
+FINISHED_JOB_TTL_SECONDS = int(os.environ.get("REDACT_JOB_TTL_SECONDS", "900"))
+SWEEP_INTERVAL_SECONDS = 60
+# Jobs live in the process that accepted them, so polling only works against a single
+# worker (or sticky routing). serve.py refuses to start several workers unless this is 0,
+# which limits the service to sync responses.
+JOBS_ENABLED = os.environ.get("REDACT_JOBS_ENABLED", "1") == "1"
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the pending queue is at capacity."""
+
+
+class Job:
+    def __init__(self, job_id: str, cleanup_paths: List[str]):
+        self.id = job_id
+        self.status = STATUS_QUEUED
+        self.pages_done = 0
+        self.pages_total = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cleanup_paths = cleanup_paths
+        self.future: Optional[Future] = None
+
+    def report_progress(self, pages_done: int, pages_total: int):
+        self.pages_done, self.pages_total = pages_done, pages_total
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "jobId": self.id,
+            "status": self.status,
+            "pagesDone": self.pages_done,
+            "pagesTotal": self.pages_total,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs document processing on a bounded worker pool so the event loop stays free.
+    At most `max_pending` jobs may be queued or running at once; beyond that
+    `submit` raises QueueFullError so callers can shed load instead of buffering
+    every upload in memory. Finished jobs expire `finished_ttl` seconds after they end,
+    checked on every submit and get and by a sweeper thread, so an idle server does not
+    keep their results on disk.
+    """
+
+    def __init__(self, max_workers: int = MAX_WORKERS, max_pending: int = MAX_PENDING_JOBS,
+                 finished_ttl: int = FINISHED_JOB_TTL_SECONDS,
+                 on_expire: Optional[Callable[[Job], None]] = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="redact-job")
+        self.max_pending = max_pending
+        self.finished_ttl = finished_ttl
+        self.on_expire = on_expire
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sweeper = threading.Thread(target=self._sweep, name="redact-job-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._count_pending()
+
+    def submit(self, fn: Callable[..., Any], *args, cleanup_paths: List[str] = None, **kwargs) -> Job:
+        """
+        Schedules fn(*args, progress_callback=..., **kwargs) and returns its Job.
+        """
+        self._expire_finished()
+        with self._lock:
+            pending = self._count_pending()
+            if pending >= self.max_pending:
+                raise QueueFullError(f"{pending} jobs already pending (limit {self.max_pending}).")
+            job = Job(str(uuid.uuid4()), cleanup_paths or [])
+            self._jobs[job.id] = job
+        job.future = self.executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._expire_finished()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+    def shutdown(self):
+        self._stopped.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _count_pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status in (STATUS_QUEUED, STATUS_RUNNING))
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict):
+        job.status = STATUS_RUNNING
+        try:
+            job.result = fn(*args, progress_callback=job.report_progress, **kwargs)
+            job.status = STATUS_DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = STATUS_FAILED
+        finally:
+            job.finished_at = time.time()
+        return job.result
+
+    def _sweep(self):
+        interval = max(1, min(self.finished_ttl, SWEEP_INTERVAL_SECONDS))
+        while not self._stopped.wait(interval):
+            self._expire_finished()
+
+    def _expire_finished(self):
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.finished_at is not None and now - job.finished_at > self.finished_ttl]
+            for job in expired:
+                del self._jobs[job.id]
+        if self.on_expire:
+            for job in expired:
+                self.on_expire(job)
@@ -0,0 +1,157 @@
+import os
+import struct
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from typing import Any, Dict, Iterable, List, Literal, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+
+from .security import NONCE_SIZE
+
+MetadataFormat = Literal['json', 'compact']
+METADATA_FORMAT: MetadataFormat = os.environ.get("METADATA_FORMAT", "json")
+
+COMPACT_FORMAT_ID = "compact-v1"
+COMPACT_MAGIC = b"RDM1"
+NONCE_PREFIX_SIZE = NONCE_SIZE - 4
+GCM_TAG_SIZE = 16
+# magic, nonce prefix, page count
+_HEADER = struct.Struct(f"<4s{NONCE_PREFIX_SIZE}sI")
+# page number, item count, ciphertext length
+_PAGE_ENTRY = struct.Struct("<III")
+
+# page_num -> [(plaintext, [x0, y0, x1, y1]), ...]
+PageItems = Dict[int, List[Tuple[str, Sequence[float]]]]
+# page_num -> indices of the items to restore on it, or None for all of them
+Selection = Dict[int, Optional[Set[int]]]
+
+
+def encrypt_metadata(key: bytes, page_items: PageItems, metadata_format: MetadataFormat = METADATA_FORMAT) -> Dict[str, Any]:
+    if metadata_format == 'compact':
+        return {"format": COMPACT_FORMAT_ID, "blob": urlsafe_b64encode(pack_pages(key, page_items)).decode('utf-8')}
+    aesgcm = AESGCM(key)
+    pages = {}
+    for page_num, items in page_items.items():
+        pages[str(page_num)] = []
+        for plaintext, bbox in items:
+            nonce = os.urandom(NONCE_SIZE)
+            payload = nonce + aesgcm.encrypt(nonce, plaintext.encode('utf-8'), None)
+            pages[str(page_num)].append({"encrypted_text": urlsafe_b64encode(payload).decode('utf-8'), "bbox": list(bbox)})
+    return {"pages": pages}
+
+
+def make_selection(pages: Optional[Iterable[int]] = None, items: Optional[Iterable[Tuple[int, int]]] = None) -> Optional[Selection]:
+    """
+    Merges whole pages and (page, index) item ids into page -> item indices, where None
+    means every item on the page. Returns None, meaning everything, if neither is given.
+    """
+    if pages is None and items is None:
+        return None
+    selection: Selection = {page_num: None for page_num in pages or ()}
+    for page_num, index in items or ():
+        if page_num not in selection:
+            selection[page_num] = set()
+        if selection[page_num] is not None:
+            selection[page_num].add(index)
+    return selection
+
+
+def _select_items(items: list, indices: Optional[Set[int]]) -> list:
+    return items if indices is None else [item for i, item in enumerate(items) if i in indices]
+
+
+def decrypt_metadata(key: bytes, metadata: Dict[str, Any], pages: Optional[Iterable[int]] = None,
+                     items: Optional[Iterable[Tuple[int, int]]] = None) -> PageItems:
+    """
+    Decrypts either format, optionally only the given pages and (page, index) items;
+    an item's index is its position in the page's list. In the JSON format an item that
+    fails to decrypt is skipped with a warning; a compact page is authenticated as a
+    whole and raises ValueError.
+    """
+    selection = make_selection(pages, items)
+    if metadata.get("format") == COMPACT_FORMAT_ID:
+        restored = unpack_pages(key, urlsafe_b64decode(metadata["blob"]), None if selection is None else selection.keys())
+        if selection is not None:
+            restored = {page_num: _select_items(page, selection[page_num]) for page_num, page in restored.items()}
+        return restored
+
+    aesgcm = AESGCM(key)
+    restored = {}
+    for page_key, page in metadata.get("pages", {}).items():
+        page_num = int(page_key)
+        if selection is not None and page_num not in selection:
+            continue
+        restored[page_num] = []
+        for item in _select_items(page, None if selection is None else selection[page_num]):
+            try:
+                payload = urlsafe_b64decode(item["encrypted_text"])
+                plaintext = aesgcm.decrypt(payload[:NONCE_SIZE], payload[NONCE_SIZE:], None).decode('utf-8')
+            except (InvalidTag, ValueError):
+                print(f"Warning: Could not decrypt an item on page {page_num}.")
+                continue
+            restored[page_num].append((plaintext, item["bbox"]))
+    return restored
+
+
+def pack_pages(key: bytes, page_items: PageItems) -> bytes:
+    """
+    Compact envelope: one AES-GCM context and one random nonce prefix per document.
+
+        header   magic | nonce prefix | page count | (page, count, length) per page
+        segments one ciphertext per page, nonce = prefix + segment index, AAD = header
+
+    Each page segment holds float32 bboxes, uint32 UTF-8 text lengths and the texts.
+    Segments are sealed separately so single pages can be decrypted, and every one of
+    them authenticates the whole header, so the page table cannot be altered either.
+    """
+    page_nums = sorted(page_items)
+    segments = []
+    for page_num in page_nums:
+        items = page_items[page_num]
+        texts = [plaintext.encode('utf-8') for plaintext, _ in items]
+        boxes = np.asarray([bbox for _, bbox in items], dtype="<f4").reshape(-1, 4)
+        lengths = np.fromiter((len(text) for text in texts), dtype="<u4", count=len(texts))
+        segments.append(boxes.tobytes() + lengths.tobytes() + b"".join(texts))
+
+    aesgcm = AESGCM(key)
+    prefix = os.urandom(NONCE_PREFIX_SIZE)
+    header = _HEADER.pack(COMPACT_MAGIC, prefix, len(page_nums)) + b"".join(
+        _PAGE_ENTRY.pack(page_num, len(page_items[page_num]), len(segment) + GCM_TAG_SIZE)
+        for page_num, segment in zip(page_nums, segments)
+    )
+    sealed = [aesgcm.encrypt(prefix + struct.pack("<I", index), segment, header) for index, segment in enumerate(segments)]
+    return header + b"".join(sealed)
+
+
+def unpack_pages(key: bytes, blob: bytes, pages: Optional[Iterable[int]] = None) -> PageItems:
+    try:
+        magic, prefix, page_count = _HEADER.unpack_from(blob)
+        if magic != COMPACT_MAGIC:
+            raise ValueError("Not a compact metadata blob.")
+        table_end = _HEADER.size + page_count * _PAGE_ENTRY.size
+        header = blob[:table_end]
+        entries = [_PAGE_ENTRY.unpack_from(blob, _HEADER.size + i * _PAGE_ENTRY.size) for i in range(page_count)]
+    except struct.error:
+        raise ValueError("Decryption failed. Invalid key or corrupted data.")
+
+    wanted = None if pages is None else set(pages)
+    aesgcm = AESGCM(key)
+    restored = {}
+    offset = table_end
+    for index, (page_num, count, length) in enumerate(entries):
+        start, offset = offset, offset + length
+        if wanted is not None and page_num not in wanted:
+            continue
+        try:
+            segment = aesgcm.decrypt(prefix + struct.pack("<I", index), blob[start:offset], header)
+        except InvalidTag:
+            raise ValueError("Decryption failed. Invalid key or corrupted data.")
+        boxes = np.frombuffer(segment, dtype="<f4", count=count * 4).reshape(count, 4)
+        lengths = np.frombuffer(segment, dtype="<u4", count=count, offset=count * 16)
+        text_offsets = (np.cumsum(lengths, dtype=np.int64) - lengths + count * 20).tolist() + [len(segment)]
+        restored[page_num] = [
+            (segment[text_offsets[i]:text_offsets[i + 1]].decode('utf-8'), boxes[i].tolist())
+            for i in range(count)
+        ]
+    return restored
@@ -0,0 +1,207 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; spans a regex pass over one page up to a slow model call on a long document.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+REQUEST_LABELS = ("engine", "severity", "file_type")
+
+# engine / severity / file_type of the document being processed in this thread or task.
+_request_labels: ContextVar[Dict[str, str]] = ContextVar("request_labels", default={})
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """Explicit labels win; request labels fill the rest, so callers rarely pass any."""
+        current = _request_labels.get()
+        return tuple(str(labels.get(name, current.get(name, ""))) for name in self.labelnames)
+
+    def drain(self) -> Dict[Tuple[str, ...], Any]:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: Dict[Tuple[str, ...], Any]):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def merge(self, values: Dict[Tuple[str, ...], float]):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram, rendered in the Prometheus text format."""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def merge(self, values: Dict[Tuple[str, ...], list]):
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def drain(self) -> Dict[str, Dict[Tuple[str, ...], Any]]:
+        """Takes and resets everything recorded so far; used to ship a worker process's observations to the parent."""
+        return {name: values for name, metric in self._metrics.items() if (values := metric.drain())}
+
+    def merge(self, drained: Dict[str, Dict[Tuple[str, ...], Any]]):
+        for name, values in drained.items():
+            if name in self._metrics:
+                self._metrics[name].merge(values)
+
+    def render(self, extra_lines: Sequence[str] = ()) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "redact_stage_seconds", "Time spent in each pipeline stage.", ("stage",) + REQUEST_LABELS))
+PAGES = REGISTRY.register(Counter(
+    "redact_pages_total", "Pages processed.", REQUEST_LABELS))
+PII_HITS = REGISTRY.register(Counter(
+    "redact_pii_hits_total", "PII regions redacted.", REQUEST_LABELS))
+PROPAGATED_HITS = REGISTRY.register(Counter(
+    "redact_propagated_hits_total", "PII regions found by matching entities confirmed on other pages.", REQUEST_LABELS))
+DUPLICATE_PAGES = REGISTRY.register(Counter(
+    "redact_duplicate_pages_total", "Pages whose text repeats an earlier page and reuse its detections.", REQUEST_LABELS))
+HYBRID_ESCALATIONS = REGISTRY.register(Counter(
+    "redact_hybrid_escalations_total", "Pages the hybrid engine also sent to the LLM, by reason.", ("reason",) + REQUEST_LABELS))
+LLM_REQUESTS = REGISTRY.register(Counter(
+    "redact_llm_requests_total", "Model calls by outcome (ok, error, cached).", ("outcome",) + REQUEST_LABELS))
+LLM_RETRIES = REGISTRY.register(Counter(
+    "redact_llm_retries_total", "Model calls retried after a retryable error.", REQUEST_LABELS))
+RESCOPED_PAGES = REGISTRY.register(Counter(
+    "redact_rescoped_pages_total", "Pages a severity change re-redacted, by how (added boxes, or redone from the original).",
+    ("kind",) + REQUEST_LABELS))
+BYTES_IN = REGISTRY.register(Counter(
+    "redact_bytes_in_total", "Bytes of uploaded documents.", ("endpoint",)))
+BYTES_OUT = REGISTRY.register(Counter(
+    "redact_bytes_out_total", "Bytes of documents returned.", ("endpoint",)))
+
+
+def current_labels() -> Dict[str, str]:
+    return dict(_request_labels.get())
+
+
+@contextmanager
+def labels_from(labels: Dict[str, str]) -> Iterator[None]:
+    """Tags every metric recorded inside the block (in this thread or task) with `labels`."""
+    token = _request_labels.set(dict(labels))
+    try:
+        yield
+    finally:
+        _request_labels.reset(token)
+
+
+def request_labels(engine: str, severity: Optional[int] = None, file_type: str = ""):
+    return labels_from({"engine": engine, "severity": "" if severity is None else str(severity),
+                        "file_type": file_type.lstrip(".").lower()})
+
+
+def timed(stage: str):
+    """
+    Records the duration of a block or function call under redact_stage_seconds{stage=...}:
+
+        with timed("extraction"): ...
+
+        @timed("redaction")
+        def redact_pdf(...): ...
+    """
+    return STAGE_SECONDS.time(stage=stage)
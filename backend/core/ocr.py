@@ -0,0 +1,67 @@
+import os
+from typing import Any, Dict, List
+
+import fitz
+from PIL import Image
+
+from . import pool
+from .metrics import timed
+
+OCR_DPI = int(os.environ.get("OCR_DPI", "300"))
+OCR_MIN_CONFIDENCE = 60
+
+
+@timed("ocr")
+def ocr_words(image: Image.Image, scale: float = 1.0) -> List[List[Any]]:
+    """Runs Tesseract on one image; boxes are returned in pixels multiplied by `scale`."""
+    import pytesseract
+    data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+    words = []
+    for i in range(len(data['level'])):
+        if float(data['conf'][i]) > OCR_MIN_CONFIDENCE:
+            (x, y, w, h) = (data['left'][i], data['top'][i], data['width'][i], data['height'][i])
+            word = data['text'][i]
+            if word.strip():
+                words.append([x * scale, y * scale, (x + w) * scale, (y + h) * scale, word])
+    return words
+
+
+def ocr_image_frame(file_path: str, frame: int) -> Dict[str, Any]:
+    """Worker entry point: OCRs a single frame, opening the file itself so frames are never pickled."""
+    with Image.open(file_path) as image:
+        image.seek(frame)
+        return {"page": frame, "words": ocr_words(image.convert("RGB"))}
+
+
+def ocr_pdf_page(file_path: str, page_num: int, dpi: int = OCR_DPI) -> Dict[str, Any]:
+    """Worker entry point: rasterizes a PDF page without a text layer and OCRs it, in PDF points."""
+    with fitz.open(file_path) as doc:
+        pix = doc[page_num].get_pixmap(dpi=dpi)
+        image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    return {"page": page_num, "words": ocr_words(image, scale=72 / dpi)}
+
+
+def image_frame_count(file_path: str) -> int:
+    with Image.open(file_path) as image:
+        return getattr(image, "n_frames", 1)
+
+
+def _ocr_or_empty(call, item: int) -> Dict[str, Any]:
+    # A page that cannot be OCR'd (no tesseract binary, an unreadable image) is left without
+    # words, as extract_from_image does for the whole file, instead of failing the document.
+    try:
+        return call()
+    except Exception as e:
+        print(f"Error during OCR of page {item}: {e}")
+        return {"page": item, "words": []}
+
+
+def run_ocr(worker, file_path: str, items: List[int]) -> List[Dict[str, Any]]:
+    """
+    Runs worker(file_path, item) for each item, across the page pool when there is more
+    than one. An item whose OCR fails yields no words.
+    """
+    if len(items) > 1 and pool.pool_available():
+        futures = [pool.submit(worker, file_path, item) for item in items]
+        return [_ocr_or_empty(lambda: pool.result(future), item) for future, item in zip(futures, items)]
+    return [_ocr_or_empty(lambda: worker(file_path, item), item) for item in items]
@@ -0,0 +1,114 @@
+import os
+from concurrent.futures import as_completed
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from . import pool
+from .metrics import timed
+from .extractor import extract_from_pdf
+from .document import DocumentSession
+from .identifier_classic import find_pii_classic_batch, uses_ner
+from .propagation import PROPAGATE_ENTITIES, WordRange, mask_repeated_lines, propagate_entities, propagate_detections
+from .spans import WordIndex
+
+# Documents shorter than this are processed in-process; pool overhead would dominate.
+PARALLEL_MIN_PAGES = int(os.environ.get("PARALLEL_MIN_PAGES", "8"))
+PAGES_PER_SHARD = int(os.environ.get("PAGES_PER_SHARD", "8"))
+
+# (page_num, [(plaintext, [x0, y0, x1, y1]), ...]) for each page with hits.
+PageDetections = Tuple[int, List[Tuple[str, List[float]]]]
+# (label, first, last): a detected entity as a [first, last) range of its page's words.
+Candidate = Tuple[str, int, int]
+
+def use_parallel(page_count: int) -> bool:
+    return pool.pool_available() and page_count >= PARALLEL_MIN_PAGES
+
+
+def shard_pages(page_count: int, pages_per_shard: int = PAGES_PER_SHARD) -> List[List[int]]:
+    return [list(range(start, min(start + pages_per_shard, page_count)))
+            for start in range(0, page_count, pages_per_shard)]
+
+
+def classic_candidates(word_indexes: List[WordIndex], severity: int, mask_repeated: bool = False) -> List[List[Candidate]]:
+    """
+    Regex + NER detection over already indexed pages, as (label, first, last) word
+    ranges per page. With `mask_repeated`, NER skips lines seen on earlier pages;
+    propagate_entities has to run afterwards to cover them.
+    """
+    ner_texts = mask_repeated_lines(word_indexes) if mask_repeated else None
+    pii_results = find_pii_classic_batch([word_index.text for word_index in word_indexes], severity, ner_texts=ner_texts)
+    with timed("bbox_resolution"):
+        return [
+            [(pii['label'], first, last) for pii, (first, last)
+             in zip(pii_locations, word_index.word_ranges([(pii['start'], pii['end']) for pii in pii_locations]).tolist()) if first < last]
+            for word_index, pii_locations in zip(word_indexes, pii_results)
+        ]
+
+
+def classic_page_ranges(word_indexes: List[WordIndex], severity: int, mask_repeated: bool = False) -> List[Set[WordRange]]:
+    """classic_candidates as a set of [first, last) word ranges per page."""
+    return [{(first, last) for _, first, last in candidates} for candidates in classic_candidates(word_indexes, severity, mask_repeated)]
+
+
+def detect_classic_pages(pages_data: List[Dict[str, Any]], severity: int, propagate: bool = PROPAGATE_ENTITIES) -> List[PageDetections]:
+    """
+    Regex + NER detection and span-to-bbox resolution for already extracted pages.
+    With `propagate`, NER skips lines repeated from earlier pages and every entity found
+    is also redacted wherever else it occurs on these pages. Regex-only severities find
+    the same values on every page anyway and are left as they are.
+    """
+    propagate = propagate and uses_ner(severity)
+    word_indexes = [WordIndex(page_data["words"]) for page_data in pages_data]
+    page_ranges = classic_page_ranges(word_indexes, severity, mask_repeated=propagate)
+    detections = []
+    with timed("bbox_resolution"):
+        if propagate:
+            propagate_entities(word_indexes, page_ranges)
+        for page_data, word_index, ranges in zip(pages_data, word_indexes, page_ranges):
+            if not ranges:
+                continue
+            resolved = word_index.resolve_ranges(sorted(ranges))
+            detections.append((page_data["page"], [(word_index.text_of(first, last), bbox) for first, last, bbox in resolved]))
+    return detections
+
+
+def propagate_across_shards(session: DocumentSession, page_detections: List[PageDetections], severity: int) -> List[PageDetections]:
+    """
+    Shards only propagate entities among their own pages. When NER is enabled (regex
+    hits already turn up on every page alike), the entities are matched once more over
+    the whole document, with the parent session's word lists.
+    """
+    if not PROPAGATE_ENTITIES or not uses_ner(severity) or not page_detections or len(shard_pages(session.page_count)) < 2:
+        return page_detections
+    with timed("bbox_resolution"):
+        return propagate_detections({page_num: session.words(page_num) for page_num in range(session.page_count)}, page_detections)
+
+
+def classic_pdf_shard(file_path: str, page_numbers: List[int], severity: int) -> List[PageDetections]:
+    """Worker entry point: opens its own session on the PDF and runs the classic stages for a page range."""
+    return detect_classic_pages(extract_from_pdf(file_path, page_numbers), severity)
+
+
+def classic_index_shard(file_path: str, page_numbers: List[int], severity: int) -> List[Tuple[int, list, List[Candidate]]]:
+    """Worker entry point for indexing: the words of each page in the range and its classic_candidates."""
+    pages_data = extract_from_pdf(file_path, page_numbers)
+    word_indexes = [WordIndex(page_data["words"]) for page_data in pages_data]
+    candidates = classic_candidates(word_indexes, severity, mask_repeated=PROPAGATE_ENTITIES and uses_ner(severity))
+    return [(page_data["page"], page_data["words"], page_candidates) for page_data, page_candidates in zip(pages_data, candidates)]
+
+
+def run_sharded(worker: Callable[..., List[Any]], file_path: str, page_count: int, *args,
+                progress_callback: Optional[Callable[[int, int], None]] = None) -> List[Any]:
+    """
+    Runs worker(file_path, page_numbers, *args) over page shards on the process pool
+    and concatenates the shard results in page order.
+    """
+    shards = shard_pages(page_count)
+    futures = {pool.submit(worker, file_path, shard, *args): n for n, shard in enumerate(shards)}
+    results: List[Optional[List[Any]]] = [None] * len(shards)
+    pages_done = 0
+    for future in as_completed(futures):
+        n = futures[future]
+        results[n] = pool.result(future)
+        pages_done += len(shards[n])
+        if progress_callback: progress_callback(pages_done, page_count)
+    return [item for shard_result in results for item in shard_result]
@@ -0,0 +1,84 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict
+
+from .cache import pii_cache
+from .metrics import REGISTRY, current_labels, labels_from
+
+PAGE_WORKERS = int(os.environ.get("PAGE_WORKERS", str(os.cpu_count() or 1)))
+
+_pool = None
+_pool_lock = threading.Lock()
+_in_worker = False
+
+
+def _init_worker(cache_key: bytes):
+    global _in_worker
+    _in_worker = True
+    # Workers must share the parent's cache key, or none of them could read each other's entries.
+    pii_cache.adopt_key(cache_key)
+    # One page per worker process already saturates the cores; keep Tesseract single-threaded.
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def in_worker() -> bool:
+    """True inside a pool process, where work must not be fanned out to a nested pool."""
+    return _in_worker
+
+
+def pool_available() -> bool:
+    return PAGE_WORKERS > 1 and not _in_worker
+
+
+def get_page_pool() -> ProcessPoolExecutor:
+    """
+    Process pool shared by all requests. "spawn" is used because the parent runs
+    request threads, which fork() does not duplicate safely. Created under a lock, so
+    concurrent first requests cannot each start a pool.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=PAGE_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(pii_cache.key,),
+                )
+    return _pool
+
+
+def shutdown_page_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_task(labels: Dict[str, str], fn: Callable[..., Any], *args) -> tuple:
+    with labels_from(labels):
+        value = fn(*args)
+    return value, REGISTRY.drain()
+
+
+def submit(fn: Callable[..., Any], *args) -> Future:
+    """
+    Runs fn(*args) on the page pool under the caller's metric labels. Pass the future to
+    result() to get fn's value; that also merges the metrics the worker recorded.
+    """
+    future = get_page_pool().submit(_run_task, current_labels(), fn, *args)
+    future.carries_metrics = True
+    return future
+
+
+def result(future: Future) -> Any:
+    """future.result(), unwrapping and merging worker metrics for futures made by submit()."""
+    if not getattr(future, "carries_metrics", False):
+        return future.result()
+    value, drained = future.result()
+    REGISTRY.merge(drained)
+    return value
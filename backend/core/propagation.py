@@ -0,0 +1,157 @@
+import os
+import hashlib
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .alignment import PageAligner, PatternSet, normalize_token
+from .metrics import PROPAGATED_HITS
+from .spans import WordIndex
+
+PROPAGATE_ENTITIES = os.environ.get("PROPAGATE_ENTITIES", "1") == "1"
+# Shorter entities (alphanumeric characters, after normalization) are not propagated:
+# initials and short numbers would match unrelated words elsewhere in the document.
+MIN_PROPAGATED_CHARS = int(os.environ.get("MIN_PROPAGATED_CHARS", "4"))
+
+WordRange = Tuple[int, int]
+
+
+def page_fingerprint(words: Sequence[Sequence]) -> Optional[bytes]:
+    """Digest of a page's word texts; None for a page without words, which is never a duplicate."""
+    if not words:
+        return None
+    digest = hashlib.sha256()
+    for word in words:
+        digest.update(str(word[4]).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.digest()
+
+
+def duplicate_pages(pages_words: Sequence[Sequence[Sequence]]) -> Dict[int, int]:
+    """Maps every page whose text is identical to an earlier page's to that earlier page."""
+    first_seen: Dict[bytes, int] = {}
+    duplicates = {}
+    for page_num, words in enumerate(pages_words):
+        fingerprint = page_fingerprint(words)
+        if fingerprint is None:
+            continue
+        if fingerprint in first_seen:
+            duplicates[page_num] = first_seen[fingerprint]
+        else:
+            first_seen[fingerprint] = page_num
+    return duplicates
+
+
+def text_lines(words: Sequence[Sequence]) -> Iterator[WordRange]:
+    """[first, last) word ranges of each text line; OCR words carry no line numbers and yield none."""
+    if not words or len(words[0]) < 8:
+        return
+    start = 0
+    for i in range(1, len(words) + 1):
+        if i == len(words) or tuple(words[i][5:7]) != tuple(words[start][5:7]):
+            yield start, i
+            start = i
+
+
+def mask_repeated_lines(word_indexes: Sequence[WordIndex]) -> List[str]:
+    """
+    The text of each page with every line already seen earlier in the document replaced
+    by spaces, so character offsets stay valid. NER only has to read a repeated header
+    once; entities in its later copies are added by propagate_entities.
+    """
+    seen: Set[str] = set()
+    masked = []
+    for word_index in word_indexes:
+        text, blanks = word_index.text, []
+        for first, last in text_lines(word_index.words):
+            line = word_index.text_of(first, last)
+            if line in seen:
+                blanks.append((int(word_index.starts[first]), int(word_index.ends[last - 1])))
+            else:
+                seen.add(line)
+        if blanks:
+            pieces, position = [], 0
+            for start, end in blanks:
+                pieces.extend((text[position:start], " " * (end - start)))
+                position = end
+            pieces.append(text[position:])
+            text = "".join(pieces)
+        masked.append(text)
+    return masked
+
+
+class EntityDictionary:
+    """
+    Document-wide set of PII strings confirmed on some page, keyed on their normalized
+    tokens. The entries are compiled into one PatternSet, and each page is searched for
+    all of them in a single exact-match pass of PageAligner.
+    """
+
+    def __init__(self, min_chars: int = MIN_PROPAGATED_CHARS):
+        self.min_chars = min_chars
+        self._texts: Dict[Tuple[str, ...], str] = {}
+        self._compiled: Optional[PatternSet] = None
+
+    def add(self, text: str):
+        tokens = tuple(token for token in map(normalize_token, text.split()) if token)
+        if sum(map(len, tokens)) >= self.min_chars and tokens not in self._texts:
+            self._texts[tokens] = text
+            self._compiled = None
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def find(self, aligner: PageAligner) -> List[WordRange]:
+        if self._compiled is None:
+            self._compiled = PatternSet(list(self._texts.values()))
+        return [word_range for ranges in aligner.find_patterns(self._compiled).values() for word_range in ranges]
+
+
+def propagate_entities(word_indexes: Sequence[WordIndex], page_ranges: Sequence[Set[WordRange]],
+                       aligners: Optional[Sequence[PageAligner]] = None) -> int:
+    """
+    Adds to each page's word ranges every occurrence of an entity found on any page,
+    so a value detected once is redacted everywhere. Occurrences inside an existing
+    range are skipped. Returns the number of ranges added.
+    """
+    dictionary = EntityDictionary()
+    for word_index, ranges in zip(word_indexes, page_ranges):
+        for first, last in ranges:
+            dictionary.add(word_index.text_of(first, last))
+    if not dictionary:
+        return 0
+
+    added = 0
+    for n, (word_index, ranges) in enumerate(zip(word_indexes, page_ranges)):
+        aligner = aligners[n] if aligners else PageAligner(word_index.words)
+        for first, last in dictionary.find(aligner):
+            if not any(start <= first and last <= end for start, end in ranges):
+                ranges.add((first, last))
+                added += 1
+    PROPAGATED_HITS.inc(added)
+    return added
+
+
+def propagate_detections(pages_words: Dict[int, Sequence[Sequence]], page_detections: List[Tuple[int, list]]) -> List[Tuple[int, list]]:
+    """
+    propagate_entities for detections that arrive as (page, [(text, bbox)]) from separate
+    shards; found occurrences whose box lies inside an existing detection are skipped.
+    """
+    dictionary = EntityDictionary()
+    for _, detections in page_detections:
+        for text, _ in detections:
+            dictionary.add(text)
+    if not dictionary:
+        return page_detections
+
+    by_page = {page_num: list(detections) for page_num, detections in page_detections}
+    added = 0
+    for page_num, words in pages_words.items():
+        word_index = WordIndex(words)
+        existing = by_page.get(page_num, [])
+        for first, last, bbox in word_index.resolve_ranges(sorted(set(dictionary.find(PageAligner(words))))):
+            if not any(box[0] <= bbox[0] and box[1] <= bbox[1] and bbox[2] <= box[2] and bbox[3] <= box[3] for _, box in existing):
+                existing.append((word_index.text_of(first, last), bbox))
+                added += 1
+        if existing:
+            by_page[page_num] = existing
+    PROPAGATED_HITS.inc(added)
+    return sorted(by_page.items())
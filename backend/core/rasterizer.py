@@ -0,0 +1,293 @@
+import io
+import os
+from statistics import median
+from typing import List, Optional, Sequence, Tuple
+
+import fitz
+from PIL import Image
+
+from .document import DocumentSession
+from .metrics import timed
+
+LLM_IMAGE_FORMAT = os.environ.get("LLM_IMAGE_FORMAT", "jpeg")
+LLM_IMAGE_QUALITY = int(os.environ.get("LLM_IMAGE_QUALITY", "80"))
+DEFAULT_DPI = 200
+MIN_DPI = 100
+MAX_DPI = 300
+# Pixel budget for the longer side of a rendered page; larger images only add upload and tokens.
+MAX_LONG_SIDE_PX = int(os.environ.get("LLM_MAX_LONG_SIDE_PX", "2400"))
+# Rendered height we want for a typical line of text.
+TARGET_TEXT_HEIGHT_PX = 24
+
+# Text-bearing regions instead of whole pages. Word boxes closer than LLM_REGION_GAP_LINES
+# typical text heights are one region; a page whose regions cover more than
+# LLM_CROP_MAX_COVERAGE of it, or has no words, is sent whole, and one with more than
+# LLM_MAX_REGIONS_PER_PAGE regions as the single crop around all of its words.
+LLM_CROP_REGIONS = os.environ.get("LLM_CROP_REGIONS", "1") == "1"
+LLM_REGION_GAP_LINES = float(os.environ.get("LLM_REGION_GAP_LINES", "2.0"))
+LLM_CROP_MAX_COVERAGE = float(os.environ.get("LLM_CROP_MAX_COVERAGE", "0.6"))
+LLM_MAX_REGIONS_PER_PAGE = int(os.environ.get("LLM_MAX_REGIONS_PER_PAGE", "6"))
+
+MIME_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+PASSTHROUGH_MIME_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".webp": "image/webp"}
+
+
+class PageImage:
+    def __init__(self, data: bytes, mime_type: str):
+        self.data = data
+        self.mime_type = mime_type
+
+    def as_part(self) -> dict:
+        """Inline image part accepted by genai.GenerativeModel.generate_content."""
+        return {"mime_type": self.mime_type, "data": self.data}
+
+
+def _text_height(words: Sequence[Sequence]) -> Optional[float]:
+    heights = [word[3] - word[1] for word in words or () if word[3] > word[1]]
+    return median(heights) if heights else None
+
+
+def text_regions(words: Sequence[Sequence], gap: float) -> List[fitz.Rect]:
+    """
+    Groups word boxes into text blocks: boxes (and blocks) closer than `gap` to each
+    other are merged, until every pair of blocks is further apart than that.
+    """
+    regions: List[fitz.Rect] = []
+    for word in sorted(words, key=lambda word: (word[1], word[0])):
+        merged = fitz.Rect(word[:4])
+        if merged.is_empty:
+            continue
+        # Absorbing one block can bring the grown block within reach of others.
+        while True:
+            reach = merged + (-gap, -gap, gap, gap)
+            touching = [region for region in regions if reach.intersects(region)]
+            if not touching:
+                break
+            for region in touching:
+                merged |= region
+            regions = [region for region in regions if not any(region is other for other in touching)]
+        regions.append(merged)
+    return regions
+
+
+def page_regions(bounds: fitz.Rect, words: Optional[Sequence[Sequence]]) -> List[Optional[fitz.Rect]]:
+    """
+    The clips, in the coordinates of `words`, worth sending for a page: its text regions
+    padded by half a line, or [None] for the whole page (see LLM_CROP_REGIONS). Only
+    text present in `words` can be aligned and redacted, so nothing outside them is lost.
+    """
+    height = _text_height(words)
+    if not LLM_CROP_REGIONS or height is None:
+        return [None]
+    regions = text_regions(words, LLM_REGION_GAP_LINES * height)
+    if len(regions) > LLM_MAX_REGIONS_PER_PAGE:
+        union = fitz.Rect(regions[0])
+        for region in regions[1:]:
+            union |= region
+        regions = [union]
+    pad = max(height / 2, 2)
+    clips = [(region + (-pad, -pad, pad, pad)) & bounds for region in regions]
+    if sum(clip.get_area() for clip in clips) > LLM_CROP_MAX_COVERAGE * bounds.get_area():
+        return [None]
+    return clips
+
+
+def adaptive_dpi(page_rect: fitz.Rect, words: Optional[Sequence[Sequence]] = None) -> int:
+    """
+    Picks a DPI from the text size on the page: small print gets more pixels, large
+    print fewer. Pages without a text layer use DEFAULT_DPI. The result is clamped to
+    [MIN_DPI, MAX_DPI] and to the MAX_LONG_SIDE_PX budget.
+    """
+    dpi = DEFAULT_DPI
+    height = _text_height(words)
+    if height:
+        dpi = TARGET_TEXT_HEIGHT_PX * 72 / height
+    dpi = max(MIN_DPI, min(MAX_DPI, dpi))
+    long_side_inches = max(page_rect.width, page_rect.height) / 72
+    if long_side_inches > 0:
+        dpi = min(dpi, MAX_LONG_SIDE_PX / long_side_inches)
+    return max(1, int(dpi))
+
+
+def encode_pixmap(pix: fitz.Pixmap, image_format: str = LLM_IMAGE_FORMAT, quality: int = LLM_IMAGE_QUALITY) -> PageImage:
+    if image_format == "jpeg":
+        return PageImage(pix.tobytes("jpeg", jpg_quality=quality), MIME_TYPES["jpeg"])
+    if image_format == "webp":
+        return encode_image(Image.frombytes("RGB", (pix.width, pix.height), pix.samples), "webp", quality)
+    return PageImage(pix.tobytes("png"), MIME_TYPES["png"])
+
+
+def encode_image(image: Image.Image, image_format: str = LLM_IMAGE_FORMAT, quality: int = LLM_IMAGE_QUALITY) -> PageImage:
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, "PNG")
+    else:
+        image.convert("RGB").save(buffer, image_format.upper(), quality=quality)
+    return PageImage(buffer.getvalue(), MIME_TYPES[image_format])
+
+
+# White space between stacked regions, so the model does not read one into the next.
+REGION_SPACING_PX = 16
+
+
+def stacked_size(sizes: Sequence[Tuple[float, float]]) -> Tuple[int, int]:
+    return int(max(width for width, _ in sizes)), int(sum(height for _, height in sizes) + REGION_SPACING_PX * (len(sizes) - 1))
+
+
+def stack_regions(crops: Sequence[Image.Image]) -> Image.Image:
+    """
+    The crops one under another on white, left-aligned: a page's text regions as one
+    compact image. One image per page keeps the per-image token minimum and the image
+    count down, and lets a multi-page call attribute what it finds by image number.
+    """
+    stacked = Image.new("RGB", stacked_size([crop.size for crop in crops]), "white")
+    y = 0
+    for crop in crops:
+        stacked.paste(crop, (0, y))
+        y += crop.height + REGION_SPACING_PX
+    return stacked
+
+
+class PageSource:
+    """
+    A page whose image is only produced when render() is called. clips() and pixels()
+    tell, without rendering, which regions of it render_regions() will send and how big
+    that image will be.
+    """
+    label = "page"
+
+    def render(self) -> PageImage:
+        raise NotImplementedError
+
+    def clips(self) -> List[Optional[fitz.Rect]]:
+        return [None]
+
+    def pixels(self) -> int:
+        return 0
+
+    def render_regions(self) -> PageImage:
+        """The page's text regions stacked into one image (see page_regions), or the whole page."""
+        return self.render()
+
+
+class PdfPageSource(PageSource):
+    def __init__(self, rasterizer: "PdfRasterizer", page_num: int, words: Optional[Sequence[Sequence]] = None):
+        self.rasterizer = rasterizer
+        self.page_num = page_num
+        self.words = words
+        self.label = f"page {page_num + 1}"
+        self._clips = None
+
+    def render(self) -> PageImage:
+        return self.rasterizer.render(self.page_num, self.words)
+
+    def clips(self) -> List[Optional[fitz.Rect]]:
+        if self._clips is None:
+            rect, rotation = self.rasterizer.page_geometry(self.page_num)
+            # Clips are in unrotated page space, words are not; rotated pages go whole.
+            self._clips = page_regions(rect, self.words) if not rotation else [None]
+        return self._clips
+
+    def pixels(self) -> int:
+        rect, _ = self.rasterizer.page_geometry(self.page_num)
+        scale = adaptive_dpi(rect, self.words) / 72
+        width, height = stacked_size([((clip or rect).width * scale, (clip or rect).height * scale) for clip in self.clips()])
+        return width * height
+
+    def render_regions(self) -> PageImage:
+        clips = self.clips()
+        if clips == [None]:
+            return self.render()
+        return self.rasterizer.render_regions(self.page_num, self.words, clips)
+
+
+class ImageFileSource(PageSource):
+    """
+    A frame of an uploaded image. Single-frame PNG/JPEG/WebP files are sent as-is;
+    other formats and frames of multi-page TIFFs are re-encoded to JPEG.
+    """
+
+    def __init__(self, file_path: str, frame: int = 0, words: Optional[Sequence[Sequence]] = None):
+        self.file_path = file_path
+        self.frame = frame
+        # OCR words, in pixels of the frame.
+        self.words = words
+        self.label = f"{os.path.basename(file_path)} frame {frame + 1}"
+        self._size = self._clips = None
+
+    @timed("rasterization")
+    def render(self) -> PageImage:
+        mime_type = PASSTHROUGH_MIME_TYPES.get(os.path.splitext(self.file_path)[1].lower())
+        if mime_type and self.frame == 0:
+            with open(self.file_path, "rb") as f:
+                return PageImage(f.read(), mime_type)
+        buffer = io.BytesIO()
+        with Image.open(self.file_path) as image:
+            image.seek(self.frame)
+            image.convert("RGB").save(buffer, "JPEG", quality=LLM_IMAGE_QUALITY)
+        return PageImage(buffer.getvalue(), MIME_TYPES["jpeg"])
+
+    def _frame_rect(self) -> fitz.Rect:
+        if self._size is None:
+            with Image.open(self.file_path) as image:
+                image.seek(self.frame)
+                self._size = image.size
+        return fitz.Rect(0, 0, *self._size)
+
+    def clips(self) -> List[Optional[fitz.Rect]]:
+        if self._clips is None:
+            self._clips = page_regions(self._frame_rect(), self.words)
+        return self._clips
+
+    def pixels(self) -> int:
+        rect = self._frame_rect()
+        width, height = stacked_size([((clip or rect).width, (clip or rect).height) for clip in self.clips()])
+        return width * height
+
+    @timed("rasterization")
+    def render_regions(self) -> PageImage:
+        clips = self.clips()
+        if clips == [None]:
+            return self.render()
+        with Image.open(self.file_path) as image:
+            image.seek(self.frame)
+            return encode_image(stack_regions([image.crop(tuple(clip.irect)) for clip in clips]), "jpeg")
+
+
+class PdfRasterizer:
+    """
+    Renders pages of a DocumentSession straight to compressed in-memory buffers, nothing
+    touches disk. PyMuPDF is not thread-safe, so renders hold the session lock while
+    the model calls they feed run concurrently.
+    """
+
+    def __init__(self, session: DocumentSession):
+        self.session = session
+
+    def page_geometry(self, page_num: int) -> Tuple[fitz.Rect, int]:
+        with self.session.lock:
+            page = self.session.doc[page_num]
+            return page.rect, page.rotation
+
+    @timed("rasterization")
+    def render(self, page_num: int, words: Optional[Sequence[Sequence]] = None) -> PageImage:
+        with self.session.lock:
+            page = self.session.doc[page_num]
+            pix = page.get_pixmap(dpi=adaptive_dpi(page.rect, words))
+            return encode_pixmap(pix)
+
+    @timed("rasterization")
+    def render_regions(self, page_num: int, words: Sequence[Sequence], clips: Sequence[fitz.Rect]) -> PageImage:
+        """Only the clips of the page, rendered at its adaptive DPI and stacked into one image."""
+        with self.session.lock:
+            page = self.session.doc[page_num]
+            dpi = adaptive_dpi(page.rect, words)
+            pixmaps = [page.get_pixmap(dpi=dpi, clip=clip) for clip in clips]
+        return encode_image(stack_regions([Image.frombytes("RGB", (pix.width, pix.height), pix.samples) for pix in pixmaps]))
+
+    def sources(self, pages_words: Optional[List[Sequence[Sequence]]] = None) -> List[PdfPageSource]:
+        """One source per page; DPI is chosen from pages_words, or the session's cached words."""
+        return [
+            PdfPageSource(self, page_num, pages_words[page_num] if pages_words else self.session.words(page_num))
+            for page_num in range(self.session.page_count)
+        ]
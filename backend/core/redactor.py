@@ -1,123 +1,472 @@
 import os
+import mmap
+import shutil
 import fitz  
-from PIL import Image, ImageDraw
-from typing import List, Tuple
+import numpy as np
+from collections import defaultdict
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+from typing import Callable, List, Optional, Tuple
 
-def redact_pdf(file_path: str, redaction_boxes: List[Tuple[int, fitz.Rect]], output_path: str):
+from .metrics import timed
+
+COMPACT_PDF_OUTPUT = os.environ.get("REDACT_COMPACT_PDF", "1") == "1"
+# PyMuPDF scans every existing annotation id when adding one, so adding hundreds of
+# redact annotations before a single apply is itself quadratic. Applying in chunks of
+# this size keeps both that scan and the number of content-stream rewrites small.
+REDACTION_BATCH_SIZE = 32
+
+def redact_pdf(file_path: str, redaction_boxes: List[Tuple[int, fitz.Rect]], output_path: str, compact: bool = COMPACT_PDF_OUTPUT):
     """
     Applies solid, opaque, black redaction boxes to a PDF.
     This method guarantees 100% coverage of the redacted area.
+    Boxes are grouped by page and applied in batches of REDACTION_BATCH_SIZE,
+    instead of rewriting the page content stream once per box.
+    With compact=False the expensive stream deduplication and cleaning are skipped;
+    unreferenced objects (the pre-redaction content) are still dropped from the output.
     """
-    doc = fitz.open(file_path)
+    with fitz.open(file_path) as doc:
+        redact_pdf_document(doc, redaction_boxes, output_path, compact)
+
+
+def redact_pdf_document(doc: fitz.Document, redaction_boxes: List[Tuple[int, fitz.Rect]], output_path: str, compact: bool = COMPACT_PDF_OUTPUT):
+    """redact_pdf on an already open document, which is modified in place and saved to output_path."""
+    boxes_by_page = defaultdict(list)
     for page_num, bbox in redaction_boxes:
-        page = doc[page_num]
+        boxes_by_page[page_num].append(bbox)
+
+    with timed("redaction"):
+        for page_num, bboxes in boxes_by_page.items():
+            page = doc[page_num]
+            for start in range(0, len(bboxes), REDACTION_BATCH_SIZE):
+                for bbox in bboxes[start:start + REDACTION_BATCH_SIZE]:
+                    page.add_redact_annot(
+                        bbox,
+                        fill=(0, 0, 0)  
+                    )
+                page.apply_redactions()
+    with timed("save"):
+        if compact:
+            doc.save(output_path, garbage=4, clean=True)
+        else:
+            doc.save(output_path, garbage=1)
+
+def _frame_count(file_path: str) -> int:
+    with Image.open(file_path) as image:
+        return getattr(image, "n_frames", 1)
+
+
+BLACK, WHITE = 0, 1
+# Black and white in each mode's own pixel values. Frames are edited as NumPy arrays in
+# their own mode, so a grayscale or 16-bit scan stays one; other modes are converted to
+# RGB, and palette images use their darkest and lightest palette entries.
+INK = {
+    "1": (False, True),
+    "L": (0, 255),
+    "LA": ((0, 255), (255, 255)),
+    "RGB": ((0, 0, 0), (255, 255, 255)),
+    "RGBA": ((0, 0, 0, 255), (255, 255, 255, 255)),
+    "CMYK": ((0, 0, 0, 255), (0, 0, 0, 0)),
+    "I;16": (0, 65535),
+    "I;16B": (0, 65535),
+}
+# Modes whose uncompressed TIFF strips are stored exactly as the arrays below
+# (dtype, samples per pixel), so they can be edited in a memory-mapped copy.
+RAW_LAYOUTS = {
+    "L": (np.uint8, 1),
+    "LA": (np.uint8, 2),
+    "RGB": (np.uint8, 3),
+    "RGBA": (np.uint8, 4),
+    "CMYK": (np.uint8, 4),
+    "I;16": (np.dtype("<u2"), 1),
+    "I;16B": (np.dtype(">u2"), 1),
+}
+# Compressions Pillow can write back; any other falls back to an uncompressed TIFF.
+TIFF_COMPRESSIONS = {"raw", "packbits", "tiff_lzw", "tiff_deflate", "tiff_adobe_deflate", "group3", "group4"}
+# The only TIFF tags an in-place copy may carry: layout, colour and resolution. Anything else
+# (EXIF, GPS, XMP, IPTC, ImageDescription, SubIFDs holding thumbnails) could repeat what is
+# redacted, so such files are re-encoded, which drops it.
+RAW_COPY_TAGS = {
+    254,  # NewSubfileType, checked to be a full-resolution page
+    256, 257, 258, 259, 262, 266, 273, 274, 277, 278, 279, 282, 283, 284, 296, 317, 320, 338, 339,
+    34675,  # ICC profile
+}
+
+def _pixel_boxes(bboxes, width: int, height: int) -> np.ndarray:
+    """
+    Integer [x0, x1) x [y0, y1) boxes covering every pixel a float bbox touches, both
+    edges included as ImageDraw.rectangle does, clipped to the frame; empty ones dropped.
+    """
+    boxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+    boxes = np.floor(boxes) + (0, 0, 1, 1)
+    boxes = np.clip(boxes, 0, (width, height, width, height)).astype(np.int64)
+    return boxes[(boxes[:, 0] < boxes[:, 2]) & (boxes[:, 1] < boxes[:, 3])]
+
+
+class PixelRows:
+    """
+    A frame's pixels as blocks of whole rows, each (first row, array): a single array for
+    a frame held in memory, or one memory-mapped block per run of contiguous strips of an
+    uncompressed TIFF, so a box only pages in the rows it covers.
+    """
+
+    def __init__(self, mode: str, width: int, height: int, blocks: List[Tuple[int, np.ndarray]], palette: Optional[list] = None):
+        self.mode = mode
+        self.width = width
+        self.height = height
+        self.blocks = blocks
+        self.palette = palette
+
+    def ink(self, color: int):
+        if self.mode == "P":
+            return _palette_index(self.palette, INK["RGB"][color])
+        return INK[self.mode][color]
+
+    def _parts(self, x0: int, y0: int, x1: int, y1: int):
+        for top, block in self.blocks:
+            first, last = max(y0, top), min(y1, top + block.shape[0])
+            if first < last:
+                yield block[first - top:last - top, x0:x1], slice(first - y0, last - y0)
+
+    def fill(self, boxes: np.ndarray, value):
+        """Sets every pixel of the [x0, y0, x1, y1) boxes to value: one slice assignment per box and block."""
+        for x0, y0, x1, y1 in boxes.tolist():
+            for view, _ in self._parts(x0, y0, x1, y1):
+                view[...] = value
+
+    def read(self, x0: int, y0: int, x1: int, y1: int) -> np.ndarray:
+        out = None
+        for view, rows in self._parts(x0, y0, x1, y1):
+            if out is None:
+                out = np.empty((y1 - y0,) + view.shape[1:], dtype=view.dtype)
+            out[rows] = view
+        return out
+
+    def write(self, x0: int, y0: int, pixels: np.ndarray):
+        for view, rows in self._parts(x0, y0, x0 + pixels.shape[1], y0 + pixels.shape[0]):
+            view[...] = pixels[rows]
+
+
+def _palette_index(palette: list, rgb: Tuple[int, int, int]) -> Optional[int]:
+    for i in range(0, len(palette) - 2, 3):
+        if tuple(palette[i:i + 3]) == rgb:
+            return i // 3
+    return None
+
+
+def _load_frame(image: Image.Image) -> PixelRows:
+    """
+    The current frame as an in-memory PixelRows, in its own mode when INK knows it. A
+    palette image gets pure black and white added to its palette, or, if it is full,
+    is converted to RGB: the nearest palette colour might not hide anything.
+    """
+    palette = None
+    if image.mode == "P":
+        # Entries past the highest index in use are free, however long getpalette() is.
+        palette = image.getpalette("RGB")[:3 * (image.getextrema()[1] + 1)]
+        missing = [rgb for rgb in INK["RGB"] if _palette_index(palette, rgb) is None]
+        if len(palette) // 3 + len(missing) <= 256:
+            for rgb in missing:
+                palette.extend(rgb)
+        else:
+            image = image.convert("RGB")
+    if image.mode not in INK and image.mode != "P":
+        image = image.convert("RGB")
+    return PixelRows(image.mode, image.width, image.height, [(0, np.array(image))], palette)
+
+
+def _to_image(frame: PixelRows) -> Image.Image:
+    pixels = frame.blocks[0][1]
+    if frame.mode == "CMYK":
+        # A 4-channel uint8 array would be taken for RGBA.
+        return Image.frombuffer("CMYK", (frame.width, frame.height), pixels, "raw", "CMYK", 0, 1)
+    image = Image.fromarray(pixels)
+    if frame.mode == "P":
+        image.putpalette(frame.palette)
+    return image
+
+
+def _open_frames(file_path: str, selected: Optional[List[int]] = None) -> Tuple[List[PixelRows], dict]:
+    """
+    Loads every frame, or the `selected` ones, of an image (only multi-page TIFFs have
+    more than one) along with the save options that keep its compression and dpi.
+    """
+    with Image.open(file_path) as image:
+        options = {"dpi": image.info["dpi"]} if "dpi" in image.info else {}
+        frames = []
+        for frame in range(getattr(image, "n_frames", 1)) if selected is None else selected:
+            image.seek(frame)
+            frames.append(_load_frame(image))
+        compression = image.info.get("compression")
+        if image.format == "TIFF" and compression in TIFF_COMPRESSIONS:
+            # CCITT compressions are bilevel only; they survive only if every frame still is.
+            if not compression.startswith("group") or all(frame.mode == "1" for frame in frames):
+                options["compression"] = None if compression == "raw" else compression
+        return frames, options
+
+
+@timed("save")
+def _save_frames(frames: List[PixelRows], options: dict, output_path: str):
+    images = [_to_image(frame) for frame in frames]
+    if len(images) > 1:
+        images[0].save(output_path, save_all=True, append_images=images[1:], **options)
+    else:
+        images[0].save(output_path, **options)
+
+
+def _raw_strips(image: Image.Image) -> Optional[List[Tuple[int, int, int]]]:
+    """
+    (first row, rows, file offset) of each strip of the current frame if it is an
+    uncompressed, strip-organised, top-down TIFF frame laid out as RAW_LAYOUTS says; else None.
+    """
+    if image.format != "TIFF" or image.mode not in RAW_LAYOUTS:
+        return None
+    strips = []
+    for tile in image.tile:
+        codec, (x0, y0, x1, y1), offset, args = tile
+        if codec != "raw" or x0 != 0 or x1 != image.width or args[0] != image.mode or tuple(args[1:]) != (0, 1):
+            return None
+        strips.append((y0, y1 - y0, offset))
+    return strips
+
+
+def _map_frame(mapped: mmap.mmap, mode: str, width: int, height: int, strips: List[Tuple[int, int, int]]) -> PixelRows:
+    dtype, samples = RAW_LAYOUTS[mode]
+    row_bytes = width * samples * np.dtype(dtype).itemsize
+    # Strips written back to back (the usual case) become a single block.
+    runs: List[List[int]] = []
+    for top, rows, offset in sorted(strips):
+        if runs and runs[-1][0] + runs[-1][1] == top and runs[-1][2] + runs[-1][1] * row_bytes == offset:
+            runs[-1][1] += rows
+        else:
+            runs.append([top, rows, offset])
+    shape = (width, samples) if samples > 1 else (width,)
+    blocks = [(top, np.ndarray((rows,) + shape, dtype=dtype, buffer=mapped, offset=offset)) for top, rows, offset in runs]
+    return PixelRows(mode, width, height, blocks)
+
+
+def _copyable(image: Image.Image) -> bool:
+    """Whether every IFD of a TIFF is a full-resolution page with only RAW_COPY_TAGS, so a byte copy carries nothing else."""
+    for frame in range(getattr(image, "n_frames", 1)):
+        image.seek(frame)
+        tags = image.tag_v2
+        if not set(tags.keys()) <= RAW_COPY_TAGS or tags.get(254, 0) & 0b101:
+            return False
+    return True
 
-        page.add_redact_annot(
-            bbox,
-            fill=(0, 0, 0)  
-        )
-        page.apply_redactions()
-    doc.save(output_path, garbage=4, clean=True)
-    doc.close()
 
-def redact_image(file_path: str, redaction_boxes: List[fitz.Rect], output_path: str):
+def _raw_layouts(file_path: str, frames: List[int]) -> Optional[dict]:
     """
-    Draws solid, opaque, black boxes over specified areas in an image.
+    frame -> (mode, width, height, strips) for each listed frame if all are mappable raw
+    TIFF frames and the file holds nothing but its pages (_copyable); else None.
+    """
+    with Image.open(file_path) as image:
+        if image.format != "TIFF" or not _copyable(image):
+            return None
+        layouts = {}
+        for frame in frames:
+            image.seek(frame)
+            strips = _raw_strips(image)
+            if strips is None:
+                return None
+            layouts[frame] = (image.mode, image.width, image.height, strips)
+        return layouts
+
+
+def _edit_in_place(file_path: str, output_path: str, layouts: dict, edit: Callable[[int, PixelRows], None]):
+    """
+    Copies an uncompressed TIFF to output_path and runs edit(frame, pixels) on each frame
+    of _raw_layouts on the copy through a memory map, so the image is never decoded or
+    held in memory as a whole, and a box only pages in the rows it covers.
+    """
+    shutil.copyfile(file_path, output_path)
+    with open(output_path, "r+b") as handle:
+        mapped = mmap.mmap(handle.fileno(), 0)
+        try:
+            for frame, layout in layouts.items():
+                pixels = _map_frame(mapped, *layout)
+                edit(frame, pixels)
+                # The arrays export the map's buffer, which has to be released before it closes.
+                del pixels
+            mapped.flush()
+        finally:
+            mapped.close()
+
+
+def redact_image(file_path: str, redaction_boxes: List[Tuple[int, fitz.Rect]], output_path: str):
+    """
+    Fills solid, opaque, black boxes over specified areas in an image.
     This method guarantees 100% coverage of the redacted area.
+    redaction_boxes holds (frame, bbox) pairs; every frame of a multi-page TIFF is kept.
+    Each frame keeps its mode and bit depth; uncompressed TIFFs are edited in place in
+    a memory-mapped copy, anything else is decoded one frame at a time.
     """
-    image = Image.open(file_path).convert("RGB")
-    draw = ImageDraw.Draw(image)
+    boxes_by_frame = defaultdict(list)
+    for frame, bbox in redaction_boxes:
+        boxes_by_frame[frame].append(tuple(bbox))
+
+    def fill(frame: int, pixels: PixelRows):
+        pixels.fill(_pixel_boxes(boxes_by_frame[frame], pixels.width, pixels.height), pixels.ink(BLACK))
+
+    layouts = _raw_layouts(file_path, sorted(boxes_by_frame))
+    if layouts is not None:
+        with timed("redaction"):
+            _edit_in_place(file_path, output_path, layouts, fill)
+        return
+    frames, options = _open_frames(file_path)
+    with timed("redaction"):
+        for frame in boxes_by_frame:
+            fill(frame, frames[frame])
+    _save_frames(frames, options, output_path)
+
 
-    for bbox in redaction_boxes:
-        box_coords = (bbox.x0, bbox.y0, bbox.x1, bbox.y1)
-        draw.rectangle(box_coords, fill="black")
-            
-    image.save(output_path)
+FONT_PATHS = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/System/Library/Fonts/SFNSDisplay.ttf",
+    "C:/Windows/Fonts/Arial.ttf"
+]
+FONT_CACHE_SIZE = 64
 
 
-def write_on_pdf(file_path: str, restored_data: list, output_path: str, password: str = None):
+@lru_cache(maxsize=1)
+def _pdf_font() -> fitz.Font:
+    return fitz.Font("helv")
+
+
+@lru_cache(maxsize=1)
+def _font_path() -> Optional[str]:
+    return next((path for path in FONT_PATHS if os.path.exists(path)), None)
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def _image_font(size: int):
+    """TrueType font at `size`, loaded once per size rather than once per box."""
+    font_path = _font_path()
+    try:
+        if font_path:
+            return ImageFont.truetype(font_path, size)
+    except OSError:
+        pass
+    return ImageFont.load_default()
+
+
+def _select_pages(restored_data: list, pages: Optional[List[int]], page_count: int) -> Tuple[list, Optional[List[int]]]:
+    """Renumbers restored_data onto the kept pages, in document order."""
+    if pages is None:
+        return restored_data, None
+    kept = sorted(page for page in set(pages) if 0 <= page < page_count)
+    new_index = {page: i for i, page in enumerate(kept)}
+    return [(new_index[page], bbox, text) for page, bbox, text in restored_data if page in new_index], kept
+
+
+@timed("unredaction")
+def write_on_pdf(file_path: str, restored_data: list, output_path: str, password: str = None, pages: Optional[List[int]] = None):
     """
     Writes decrypted text back onto a redacted PDF.
     restored_data is a list of tuples: (page_num, bbox, text).
+    If `pages` is given, only those pages are kept in the output.
+    Each page gets one shape for all its white boxes and one TextWriter for all its text,
+    instead of a content-stream append per box.
     """
     doc = fitz.open(file_path)
-    
+    restored_data, kept = _select_pages(restored_data, pages, doc.page_count)
+    if kept is not None:
+        doc.select(kept)
+
+    items_by_page = defaultdict(list)
     for page_num, bbox_coords, text in restored_data:
+        items_by_page[page_num].append((fitz.Rect(bbox_coords), text))
+
+    font = _pdf_font()
+    for page_num, items in items_by_page.items():
         page = doc[page_num]
-        bbox = fitz.Rect(bbox_coords)
-        page.draw_rect(bbox, color=(1, 1, 1), fill=(1, 1, 1))
-        bbox_height = bbox.height
-        font_size = int(bbox_height * 0.6)
-        font_size = max(font_size, 6)
-        page.insert_text(
-            bbox.bl + (2, -2),
-            text,
-            fontsize=font_size,
-            fontname="helv",
-            color=(0, 0, 0),
-        )
-    
+        shape = page.new_shape()
+        writer = fitz.TextWriter(page.rect)
+        for bbox, text in items:
+            shape.draw_rect(bbox)
+            font_size = max(int(bbox.height * 0.6), 6)
+            writer.append(bbox.bl + (2, -2), text, font=font, fontsize=font_size)
+        shape.finish(color=(1, 1, 1), fill=(1, 1, 1))
+        shape.commit()
+        writer.write_text(page, color=(0, 0, 0))
+
+    # Dropping pages leaves their objects unreferenced; garbage=1 keeps them out of the file.
+    garbage = 1 if kept is not None else 0
     if password:
-        doc.save(output_path, encryption=fitz.PDF_ENCRYPT_AES_256, owner_pw=password, user_pw=password, permissions=fitz.PDF_PERM_ACCESSIBILITY)
+        doc.save(output_path, garbage=garbage, encryption=fitz.PDF_ENCRYPT_AES_256, owner_pw=password, user_pw=password, permissions=fitz.PDF_PERM_ACCESSIBILITY)
     else:
-        doc.save(output_path)
+        doc.save(output_path, garbage=garbage)
         
     doc.close()
 
-def write_on_image(file_path: str, restored_data: list, output_path: str):
+def _text_coverage(text: str, font, width: int, height: int, origin: Tuple[float, float]) -> np.ndarray:
+    """Anti-aliased coverage (0..1) of text drawn at origin on a width x height canvas."""
+    canvas = Image.new("L", (width, height), 0)
+    ImageDraw.Draw(canvas).text(origin, text, fill=255, font=font)
+    return np.asarray(canvas, dtype=np.float32) / 255
+
+
+def _blend(pixels: np.ndarray, coverage: np.ndarray, mode: str, ink) -> np.ndarray:
+    """Text in ink over pixels. Bilevel and palette pixels cannot be mixed; they take the ink where coverage passes one half."""
+    if mode in ("1", "P"):
+        return np.where(coverage > 0.5, ink, pixels).astype(pixels.dtype)
+    if pixels.ndim == 3:
+        coverage = coverage[..., None]
+    blended = pixels * (1 - coverage) + np.asarray(ink, dtype=np.float32) * coverage
+    return np.rint(blended).astype(pixels.dtype)
+
+
+def _restore_box(pixels: PixelRows, bbox_coords, text: str):
     """
-    Writes decrypted text back onto a redacted image.
-    restored_data is a list of tuples: (bbox, text).
+    White box over bbox with text centred in it. Text wider than the box runs over its
+    neighbours, as before; only the pixels under box and text are read and written back.
     """
-    image = Image.open(file_path).convert("RGB")
-    draw = ImageDraw.Draw(image)
-    
+    box = _pixel_boxes([bbox_coords], pixels.width, pixels.height)
+    if not len(box):
+        return
+    pixels.fill(box, pixels.ink(WHITE))
+
+    x0, y0, x1, y1 = bbox_coords
+    font_size = max(int((y1 - y0) * 0.6), 8)
+    font = _image_font(font_size)
     try:
-        font_paths = [
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  
-            "/System/Library/Fonts/SFNSDisplay.ttf",  
-            "C:/Windows/Fonts/Arial.ttf"  
-        ]
-        
-        font = None
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                font = ImageFont.truetype(font_path, 12)
-                break
-        
-        if font is None:
-            font = ImageFont.load_default()
-    except:
-        font = ImageFont.load_default()
-
-    for bbox_coords, text in restored_data:
-        x0, y0, x1, y1 = bbox_coords
-        box_width = x1 - x0
-        box_height = y1 - y0
-        
-        draw.rectangle(bbox_coords, fill="white")
-        
-        font_size = int(box_height * 0.6)
-        font_size = max(font_size, 8)  
-        
-        try:
-            if hasattr(font, 'path'):
-                current_font = ImageFont.truetype(font.path, font_size)
-            else:
-                current_font = ImageFont.load_default()
-        except:
-            current_font = ImageFont.load_default()
-        
-        try:
-            text_bbox = draw.textbbox((0, 0), text, font=current_font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
-            
-            x_pos = x0 + (box_width - text_width) / 2
-            y_pos = y0 + (box_height - text_height) / 2
-            
-            draw.text((x_pos, y_pos), text, fill="black", font=current_font)
-        except:
-            draw.text((x0 + 2, y0 + 2), text, fill="black", font=current_font)
-    
-    image.save(output_path)
\ No newline at end of file
+        left, top, right, bottom = font.getbbox(text)
+        x_pos = x0 + (x1 - x0 - (right - left)) / 2
+        y_pos = y0 + (y1 - y0 - (bottom - top)) / 2
+    except Exception:
+        left, top, right, bottom = 0, 0, font_size * len(text), font_size
+        x_pos, y_pos = x0 + 2, y0 + 2
+
+    area = _pixel_boxes([(min(x0, x_pos + left), min(y0, y_pos + top), max(x1, x_pos + right), max(y1, y_pos + bottom))],
+                        pixels.width, pixels.height)
+    ax0, ay0, ax1, ay1 = area[0].tolist()
+    coverage = _text_coverage(text, font, ax1 - ax0, ay1 - ay0, (x_pos - ax0, y_pos - ay0))
+    pixels.write(ax0, ay0, _blend(pixels.read(ax0, ay0, ax1, ay1), coverage, pixels.mode, pixels.ink(BLACK)))
+
+
+@timed("unredaction")
+def write_on_image(file_path: str, restored_data: list, output_path: str, pages: Optional[List[int]] = None):
+    """
+    Writes decrypted text back onto a redacted image.
+    restored_data is a list of tuples: (frame, bbox, text).
+    If `pages` is given, only those frames are kept in the output.
+    Frames keep their mode and bit depth, and, with every frame kept, an uncompressed
+    TIFF is restored in place in a memory-mapped copy like redact_image does.
+    """
+    restored_data, kept = _select_pages(restored_data, pages, _frame_count(file_path))
+    items_by_frame = defaultdict(list)
+    for frame, bbox_coords, text in restored_data:
+        items_by_frame[frame].append((bbox_coords, text))
+
+    def restore(frame: int, pixels: PixelRows):
+        for bbox_coords, text in items_by_frame[frame]:
+            _restore_box(pixels, bbox_coords, text)
+
+    layouts = _raw_layouts(file_path, sorted(items_by_frame)) if kept is None else None
+    if layouts is not None:
+        _edit_in_place(file_path, output_path, layouts, restore)
+        return
+    frames, options = _open_frames(file_path, kept)
+    for frame in items_by_frame:
+        restore(frame, frames[frame])
+    _save_frames(frames, options, output_path)
@@ -1,10 +1,17 @@
 
 import os
+import struct
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
 from base64 import urlsafe_b64encode, urlsafe_b64decode
 
 
 NONCE_SIZE = 12
+GCM_TAG_SIZE = 16
+FILE_SEGMENT_SIZE = 1024 * 1024
+FILE_MAGIC = b"RDF1"
+# magic, nonce prefix, plaintext bytes per segment
+_FILE_HEADER = struct.Struct(f"<4s{NONCE_SIZE - 5}sI")
 
 def generate_key() -> bytes:
     """Generates a cryptographically secure 32-byte key."""
@@ -39,4 +46,63 @@ def decrypt_text(key: bytes, encrypted_payload_b64: bytes) -> str:
         return decrypted_bytes.decode('utf-8')
     except Exception as e:
         print(f"Decryption failed: {e}")
-        raise ValueError("Decryption failed. Invalid key or corrupted data.")
\ No newline at end of file
+        raise ValueError("Decryption failed. Invalid key or corrupted data.")
+
+def encrypt_bytes(key: bytes, data: bytes, associated_data: bytes = None) -> bytes:
+    """AES-GCM for binary payloads: returns raw nonce + ciphertext + tag, without base64."""
+    nonce = os.urandom(NONCE_SIZE)
+    return nonce + AESGCM(key).encrypt(nonce, data, associated_data)
+
+def decrypt_bytes(key: bytes, payload: bytes, associated_data: bytes = None) -> bytes:
+    try:
+        return AESGCM(key).decrypt(payload[:NONCE_SIZE], payload[NONCE_SIZE:], associated_data)
+    except Exception:
+        raise ValueError("Decryption failed. Invalid key or corrupted data.")
+
+def _segment_nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    # The last segment is sealed under its own flag, so a truncated file fails to decrypt.
+    return prefix + struct.pack("<I?", index, last)
+
+def encrypt_file(key: bytes, source_path: str, target_path: str, associated_data: bytes = b"",
+                 segment_size: int = FILE_SEGMENT_SIZE):
+    """
+    Encrypts a file segment by segment, as pack_pages does pages, so memory use does not
+    grow with the file: header (magic, nonce prefix, segment size), then one AES-GCM
+    ciphertext per `segment_size` bytes, nonce = prefix + index + last flag, AAD = header
+    + `associated_data`.
+    """
+    aesgcm = AESGCM(key)
+    header = _FILE_HEADER.pack(FILE_MAGIC, os.urandom(NONCE_SIZE - 5), segment_size)
+    prefix = header[4:NONCE_SIZE - 1]
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        target.write(header)
+        segment, index = source.read(segment_size), 0
+        while True:
+            following = source.read(segment_size)
+            target.write(aesgcm.encrypt(_segment_nonce(prefix, index, not following), segment, header + associated_data))
+            if not following:
+                break
+            segment, index = following, index + 1
+
+def decrypt_file(key: bytes, source_path: str, target_path: str, associated_data: bytes = b""):
+    """Reverses encrypt_file; raises ValueError for a wrong key or altered, truncated or extended data."""
+    aesgcm = AESGCM(key)
+    with open(source_path, "rb") as source, open(target_path, "wb") as target:
+        header = source.read(_FILE_HEADER.size)
+        try:
+            magic, prefix, segment_size = _FILE_HEADER.unpack(header)
+        except struct.error:
+            raise ValueError("Decryption failed. Invalid key or corrupted data.")
+        if magic != FILE_MAGIC:
+            raise ValueError("Decryption failed. Invalid key or corrupted data.")
+        sealed_size = segment_size + GCM_TAG_SIZE
+        segment, index = source.read(sealed_size), 0
+        while True:
+            following = source.read(sealed_size)
+            try:
+                target.write(aesgcm.decrypt(_segment_nonce(prefix, index, not following), segment, header + associated_data))
+            except InvalidTag:
+                raise ValueError("Decryption failed. Invalid key or corrupted data.")
+            if not following:
+                break
+            segment, index = following, index + 1
@@ -0,0 +1,55 @@
+import numpy as np
+from typing import List, Sequence, Tuple
+
+
+class WordIndex:
+    """
+    Character-offset index over a page's words, as joined by " ".join(word texts).
+    Word start/end offsets are kept as sorted arrays, so a character span resolves
+    to its overlapping words with two binary searches, and the bounding boxes of
+    many spans are unioned in one vectorized pass.
+    """
+
+    def __init__(self, words: Sequence[Sequence]):
+        self.words = words
+        self.texts = [word[4] for word in words]
+        self.text = " ".join(self.texts)
+        lengths = np.fromiter((len(text) for text in self.texts), dtype=np.int64, count=len(self.texts))
+        self.ends = np.cumsum(lengths + 1) - 1
+        self.starts = self.ends - lengths
+        # One padding row so reduceat can be given an end index equal to len(words).
+        self.boxes = np.zeros((len(words) + 1, 4), dtype=np.float64)
+        if len(words):
+            self.boxes[:-1] = np.array([word[:4] for word in words], dtype=np.float64)
+
+    def word_ranges(self, spans: Sequence[Tuple[int, int]]) -> np.ndarray:
+        """Returns an (n, 2) array of [first, last) word indices overlapping each (start, end) span."""
+        spans = np.asarray(spans, dtype=np.int64).reshape(-1, 2)
+        first = np.searchsorted(self.ends, spans[:, 0], side="right")
+        last = np.searchsorted(self.starts, spans[:, 1], side="left")
+        return np.stack([first, np.maximum(first, last)], axis=1)
+
+    def union_boxes(self, ranges: np.ndarray) -> np.ndarray:
+        """Returns the (n, 4) union bbox of each non-empty [first, last) word range."""
+        if len(ranges) == 0:
+            return np.zeros((0, 4), dtype=np.float64)
+        bounds = ranges.reshape(-1)
+        mins = np.minimum.reduceat(self.boxes[:, :2], bounds, axis=0)[::2]
+        maxs = np.maximum.reduceat(self.boxes[:, 2:], bounds, axis=0)[::2]
+        return np.hstack([mins, maxs])
+
+    def resolve(self, spans: Sequence[Tuple[int, int]]) -> List[Tuple[int, int, List[float]]]:
+        """
+        Maps character spans to (first, last, bbox) word ranges; spans that touch no word are dropped.
+        """
+        return self.resolve_ranges(self.word_ranges(spans))
+
+    def resolve_ranges(self, ranges: Sequence[Tuple[int, int]]) -> List[Tuple[int, int, List[float]]]:
+        """Attaches the union bbox to each non-empty [first, last) word range."""
+        ranges = np.asarray(ranges, dtype=np.int64).reshape(-1, 2)
+        ranges = ranges[ranges[:, 0] < ranges[:, 1]]
+        boxes = self.union_boxes(ranges)
+        return [(int(first), int(last), box) for (first, last), box in zip(ranges.tolist(), boxes.tolist())]
+
+    def text_of(self, first: int, last: int) -> str:
+        return " ".join(self.texts[first:last])
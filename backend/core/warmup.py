@@ -0,0 +1,89 @@
+import os
+import time
+import threading
+from typing import Dict, Iterable
+
+from . import pool
+from .identifier_classic import get_nlp, nlp_installed
+from .identifier_llm import get_model
+
+# What warm_up() loads before the service reports ready, in order. Anything left out is
+# still loaded, lazily, by the first request that needs it.
+WARMUP_STEPS = [step for step in os.environ.get("WARMUP_STEPS", "ner,llm,ocr,page_pool").split(",") if step]
+# Run warm_up() in the background when the app starts; serve.py runs it before forking instead.
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "1") == "1"
+
+
+def _load_ner():
+    # Never download at startup: readiness must not depend on the network. A missing
+    # model is still fetched by the first request that needs NER, as before.
+    if nlp_installed():
+        get_nlp()
+
+
+def _load_ocr():
+    import pytesseract
+    pytesseract.get_tesseract_version()
+
+
+def _warm_worker() -> int:
+    warm_up(["ner"])
+    return os.getpid()
+
+
+def _start_page_pool():
+    """Starts every page pool process now, each with NER loaded, rather than on the first pages submitted."""
+    if pool.pool_available():
+        futures = [pool.submit(_warm_worker) for _ in range(pool.PAGE_WORKERS)]
+        for future in futures:
+            pool.result(future)
+
+
+STEPS = {
+    "ner": _load_ner,
+    "llm": get_model,
+    "ocr": _load_ocr,
+    "page_pool": _start_page_pool,
+}
+
+_lock = threading.Lock()
+# step -> seconds it took, and step -> error, for steps this process has run.
+_done: Dict[str, float] = {}
+_failed: Dict[str, str] = {}
+
+
+def warm_up(steps: Iterable[str] = None) -> Dict[str, float]:
+    """
+    Runs the given STEPS (default WARMUP_STEPS) this process has not run yet. A failing
+    step is recorded and skipped: its component is then loaded, or fails, per request as
+    it would without warm-up. Returns the seconds each step took.
+    """
+    with _lock:
+        for step in WARMUP_STEPS if steps is None else steps:
+            if step in _done or step in _failed:
+                continue
+            start = time.perf_counter()
+            try:
+                STEPS[step]()
+            except Exception as e:
+                _failed[step] = f"{type(e).__name__}: {e}"
+                print(f"Warm-up step '{step}' failed: {_failed[step]}")
+            else:
+                _done[step] = time.perf_counter() - start
+        return dict(_done)
+
+
+def start_warm_up() -> threading.Thread:
+    """warm_up() on a daemon thread, so the server accepts connections (and answers /ready) meanwhile."""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def is_ready() -> bool:
+    """True once every WARMUP_STEPS step has run here, or straight away if startup warm-up is off."""
+    return not WARMUP_ON_STARTUP or all(step in _done or step in _failed for step in WARMUP_STEPS)
+
+
+def status() -> Dict:
+    return {"ready": is_ready(), "steps": dict(_done), "failed": dict(_failed)}
@@ -1,20 +1,34 @@
 import os
-import shutil
 import uuid
+import shutil
+import zipfile
 import json
+import mimetypes
+import asyncio
+import fitz
 from base64 import urlsafe_b64encode, urlsafe_b64decode
-from typing import Dict, Any, Literal, List 
+from typing import Dict, Any, Literal, List, Optional, Tuple
+from urllib.parse import quote
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Request, Query
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
 from dotenv import load_dotenv
 load_dotenv()
 
-from core.engine import process_document_llm, process_document_classic, unredact_document
+from core.engine import PROCESSORS, unredact_document, rescope_document
+from core.detection_index import DetectionIndex, NotIndexedError, UnknownDocumentError, index_store
 from core.security import generate_key, decrypt_text
+from core.ocr import image_frame_count
+from core.jobs import JobManager, QueueFullError, JOBS_ENABLED, STATUS_DONE, STATUS_FAILED
+from core.cache import pii_cache
+from core.pool import shutdown_page_pool
+from core.metadata import MetadataFormat, METADATA_FORMAT
+from core.metrics import REGISTRY, BYTES_IN, BYTES_OUT
+from core.batch import ArchiveTooLargeError, check_archive_size, file_digest, pack_outputs, purge_expired_batches, run_zip_batch
+from core import warmup
 
 app = FastAPI(title="Dual-Engine Document Redaction Service")
 
@@ -29,6 +43,12 @@ app.add_middleware(
 
 TEMP_UPLOADS_DIR = "temp_uploads"
 os.makedirs(TEMP_UPLOADS_DIR, exist_ok=True)
+BATCH_DIR = "batches"
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+ResponseFormat = Literal['json', 'multipart']
+# hybrid: classic on every page, the LLM only on pages the classic pass is unsure about.
+Engine = Literal['classic', 'llm', 'hybrid']
 
 class DecryptionRequest(BaseModel):
     document_id: str
@@ -51,40 +71,436 @@ def cleanup_files(files: list):
             except OSError as e:
                 print(f"Error cleaning up file {file_path}: {e}")
 
+
+def cleanup_job(job):
+    result_paths = [job.result["redactedFilePath"]] if job.result else []
+    cleanup_files(job.cleanup_paths + result_paths)
+    if job.result and job.result.get("batchDir"):
+        shutil.rmtree(job.result["batchDir"], ignore_errors=True)
+
+
+job_manager = JobManager(on_expire=cleanup_job)
+
+@app.on_event("startup")
+def start_warm_up():
+    # Steps already run (by serve.py, before forking) are skipped.
+    if warmup.WARMUP_ON_STARTUP:
+        warmup.start_warm_up()
+    if index_store.enabled:
+        index_store.purge_expired()
+    purge_expired_batches(BATCH_DIR)
+
+
+@app.on_event("shutdown")
+def shutdown_job_manager():
+    job_manager.shutdown()
+    shutdown_page_pool()
+
+
+def run_engine(input_path: str, severity: int, engine: str, content_type: str,
+               metadata_format: MetadataFormat = METADATA_FORMAT, progress_callback=None, file_name: Optional[str] = None,
+               retain: bool = False) -> Dict[str, Any]:
+    """With `retain`, the original, the output and the detection index are kept (IndexStore) under a new rescopeId."""
+    key = generate_key()
+    process = PROCESSORS[engine]
+    index = DetectionIndex(engine, os.path.splitext(input_path)[1].lower(), severity) if retain else None
+    redacted_file_path, encrypted_metadata = process(input_path, severity, key, progress_callback, metadata_format=metadata_format, index=index)
+    result = {"key": key, "redactedFilePath": redacted_file_path, "encryptedMetadata": encrypted_metadata, "contentType": content_type,
+              "fileName": f"redacted_{file_name}" if file_name else None}
+    if index is not None:
+        rescope_id = uuid.uuid4().hex
+        try:
+            index_store.save(rescope_id, key, index, redacted_file_path, source_path=input_path)
+            result["rescopeId"] = rescope_id
+        except OSError as e:
+            print(f"Could not store the detection index of {input_path}: {e}")
+    return result
+
+
+def run_rescope(rescope_id: str, key: bytes, severity: int, metadata_format: MetadataFormat = METADATA_FORMAT) -> Dict[str, Any]:
+    """
+    Re-redacts a retained document at `severity` and saves the result as its current version,
+    under the record's lock, so concurrent changes to one document apply one after another.
+    """
+    work_dir = os.path.join(TEMP_UPLOADS_DIR, uuid.uuid4().hex)
+    os.makedirs(work_dir)
+    output_path = None
+    try:
+        with index_store.locked(rescope_id):
+            version = index_store.open(rescope_id, key, work_dir)
+            output_path = os.path.join(TEMP_UPLOADS_DIR, f"{uuid.uuid4()}_redacted{version.index.extension}")
+            redacted_file_path, encrypted_metadata = rescope_document(version, severity, key, output_path, metadata_format)
+            if redacted_file_path != output_path:
+                shutil.copyfile(redacted_file_path, output_path)
+            index_store.save(rescope_id, key, version.index, output_path)
+    except Exception:
+        if output_path:
+            cleanup_files([output_path])
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    content_type = mimetypes.guess_type(output_path)[0] or "application/octet-stream"
+    return {"key": key, "redactedFilePath": output_path, "encryptedMetadata": encrypted_metadata, "contentType": content_type, "rescopeId": rescope_id}
+
+
+def run_batch(zip_path: str, batch_dir: str, severity: int, engine: str,
+              metadata_format: MetadataFormat = METADATA_FORMAT, progress_callback=None) -> Dict[str, Any]:
+    purge_expired_batches(BATCH_DIR)
+    archive_path = f"{batch_dir}.zip"
+    try:
+        summary = run_zip_batch(zip_path, batch_dir, severity, engine, metadata_format=metadata_format, progress_callback=progress_callback)
+        pack_outputs(batch_dir, archive_path)
+    except Exception:
+        # Nobody will fetch a failed batch: its manifest holds decryption keys.
+        shutil.rmtree(batch_dir, ignore_errors=True)
+        cleanup_files([archive_path])
+        raise
+    return {"redactedFilePath": archive_path, "contentType": "application/zip", "batchDir": batch_dir, "summary": summary}
+
+
+def build_process_response(result: Dict[str, Any], response_format: ResponseFormat = 'json'):
+    BYTES_OUT.inc(os.path.getsize(result["redactedFilePath"]), endpoint="process")
+    if response_format == 'multipart':
+        return build_multipart_response(result)
+
+    with open(result["redactedFilePath"], "rb") as f:
+        redacted_file_bytes = f.read()
+
+    return JSONResponse(content={
+        "decryptionKey": urlsafe_b64encode(result["key"]).decode('utf-8'),
+        "encryptedMetadata": result["encryptedMetadata"],
+        "redactedFile": urlsafe_b64encode(redacted_file_bytes).decode('utf-8'),
+        "contentType": result["contentType"],
+        "rescopeId": result.get("rescopeId"),
+    })
+
+
+def content_disposition(file_name: str) -> str:
+    """An attachment header for any file name: an ASCII fallback, and the exact name RFC 5987-encoded."""
+    fallback = "".join(ch if 32 <= ord(ch) < 127 and ch not in '"\\' else "_" for ch in file_name)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name, safe='')}"
+
+
+def build_multipart_response(result: Dict[str, Any]) -> StreamingResponse:
+    """
+    multipart/mixed body: a JSON part with the key and metadata, then the redacted file
+    streamed from disk in STREAM_CHUNK_SIZE pieces, so memory use does not grow with the file.
+    """
+    boundary = uuid.uuid4().hex
+    file_path = result["redactedFilePath"]
+    file_name = result.get("fileName") or f"redacted{os.path.splitext(file_path)[1]}"
+    content_type = result["contentType"] or "application/octet-stream"
+    metadata = json.dumps({
+        "decryptionKey": urlsafe_b64encode(result["key"]).decode('utf-8'),
+        "encryptedMetadata": result["encryptedMetadata"],
+        "contentType": content_type,
+        "rescopeId": result.get("rescopeId"),
+    }).encode('utf-8')
+
+    def iter_parts():
+        yield (f"--{boundary}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(metadata)}\r\n\r\n").encode('utf-8') + metadata + b"\r\n"
+        yield (f"--{boundary}\r\nContent-Type: {content_type}\r\n"
+               f"Content-Disposition: {content_disposition(file_name)}\r\n"
+               f"Content-Length: {os.path.getsize(file_path)}\r\n\r\n").encode('utf-8')
+        with open(file_path, "rb") as f:
+            while chunk := f.read(STREAM_CHUNK_SIZE):
+                yield chunk
+        yield f"\r\n--{boundary}--\r\n".encode('utf-8')
+
+    return StreamingResponse(iter_parts(), media_type=f"multipart/mixed; boundary={boundary}")
+
+
+def require_retention(retain_for_rescope: bool):
+    if retain_for_rescope and not index_store.enabled:
+        raise HTTPException(status_code=400, detail="Retaining documents is disabled on this server (DETECTION_INDEX_ENABLED=0).")
+
+
+def require_jobs(mode: str = 'job'):
+    if mode == 'job' and not JOBS_ENABLED:
+        raise HTTPException(status_code=400, detail="Jobs are disabled on this server (REDACT_JOBS_ENABLED=0); use mode='sync'.")
+
+
+async def save_upload(file: UploadFile, path: str, endpoint: str = "process"):
+    size = 0
+    with open(path, "wb") as buffer:
+        while chunk := await file.read(STREAM_CHUNK_SIZE):
+            buffer.write(chunk)
+            size += len(chunk)
+    BYTES_IN.inc(size, endpoint=endpoint)
+
+
+async def save_request_body(request: Request, path: str, endpoint: str = "process"):
+    """Writes a raw request body to disk as it arrives, without spooling it first."""
+    size = 0
+    with open(path, "wb") as buffer:
+        async for chunk in request.stream():
+            buffer.write(chunk)
+            size += len(chunk)
+    BYTES_IN.inc(size, endpoint=endpoint)
+
+
+async def submit_and_respond(background_tasks: BackgroundTasks, input_path: str, severity: int, engine: str,
+                             content_type: str, mode: str, response_format: ResponseFormat, metadata_format: MetadataFormat,
+                             file_name: Optional[str] = None, retain: bool = False):
+    try:
+        job = job_manager.submit(run_engine, input_path, severity, engine, content_type, metadata_format,
+                                 cleanup_paths=[input_path], file_name=file_name, retain=retain)
+    except QueueFullError as e:
+        background_tasks.add_task(cleanup_files, [input_path])
+        raise HTTPException(status_code=429, detail=f"Server busy: {str(e)}", headers={"Retry-After": "10"})
+
+    if mode == 'job':
+        return JSONResponse(status_code=202, content=job.to_dict())
+
+    await asyncio.wrap_future(job.future)
+    job_manager.pop(job.id)
+    if job.status == STATUS_FAILED:
+        background_tasks.add_task(cleanup_job, job)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {job.error}")
+
+    try:
+        response = build_process_response(job.result, response_format)
+    finally:
+        background_tasks.add_task(cleanup_job, job)
+    return response
+
+
 @app.post("/process/", summary="Process a document with chosen engine", tags=["Processing"])
 async def process_endpoint(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     severity: int = Form(...),
-    engine: Literal['classic', 'llm'] = Form(...)
+    engine: Engine = Form(...),
+    mode: Literal['sync', 'job'] = Form('sync'),
+    response_format: ResponseFormat = Form('json'),
+    metadata_format: MetadataFormat = Form(METADATA_FORMAT),
+    retain_for_rescope: bool = Form(False)
 ):
+    """
+    In 'sync' mode the response carries the redacted document, as before.
+    In 'job' mode it returns a job id straight away; poll /jobs/{job_id} and
+    fetch the document from /jobs/{job_id}/result once it is done.
+    response_format='multipart' streams the file instead of base64-encoding it into JSON.
+    metadata_format='compact' returns encryptedMetadata as {"format", "blob"}: one
+    authenticated binary envelope instead of a JSON entry per PII item.
+    retain_for_rescope=true (servers with DETECTION_INDEX_ENABLED=1) keeps the original,
+    encrypted with the returned key, and returns a rescopeId for /rescope/{rescope_id};
+    otherwise nothing of the document outlives the request.
+    """
+    require_jobs(mode)
+    require_retention(retain_for_rescope)
     unique_filename = f"{uuid.uuid4()}_{file.filename}"
     input_path = os.path.join(TEMP_UPLOADS_DIR, unique_filename)
-    with open(input_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    key = generate_key()
-    
+    await save_upload(file, input_path)
+    return await submit_and_respond(background_tasks, input_path, severity, engine, file.content_type, mode, response_format, metadata_format,
+                                    file_name=file.filename, retain=retain_for_rescope)
+
+
+@app.post("/process/stream", summary="Process a document sent as the raw request body", tags=["Processing"])
+async def process_stream_endpoint(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    filename: str = Query(...),
+    severity: int = Query(...),
+    engine: Engine = Query(...),
+    mode: Literal['sync', 'job'] = Query('sync'),
+    response_format: ResponseFormat = Query('multipart'),
+    metadata_format: MetadataFormat = Query(METADATA_FORMAT),
+    retain_for_rescope: bool = Query(False)
+):
+    """
+    Same as /process/, but the body is the file itself (e.g. Content-Type: application/pdf),
+    written to disk chunk by chunk as it arrives instead of going through form parsing.
+    """
+    require_jobs(mode)
+    require_retention(retain_for_rescope)
+    unique_filename = f"{uuid.uuid4()}_{os.path.basename(filename)}"
+    input_path = os.path.join(TEMP_UPLOADS_DIR, unique_filename)
+    await save_request_body(request, input_path)
+    content_type = request.headers.get("content-type", "application/octet-stream")
+    return await submit_and_respond(background_tasks, input_path, severity, engine, content_type, mode, response_format, metadata_format,
+                                    file_name=os.path.basename(filename), retain=retain_for_rescope)
+
+
+@app.post("/process/batch", summary="Redact every document in a ZIP archive", tags=["Processing"])
+async def process_batch_endpoint(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    severity: int = Form(...),
+    engine: Engine = Form(...),
+    metadata_format: MetadataFormat = Form(METADATA_FORMAT)
+):
+    """
+    Always runs as a job: poll /jobs/{job_id} (pagesDone/pagesTotal count documents here)
+    and fetch a ZIP of the redacted documents, manifest.jsonl and summary.json from
+    /jobs/{job_id}/result. The working directory is derived from the archive contents,
+    so uploading the same archive again after a crash resumes where it stopped, for up to
+    BATCH_TTL_SECONDS; a batch that fails is deleted. Archives whose documents expand past
+    BATCH_MAX_UNCOMPRESSED_BYTES are refused with 413.
+    """
+    require_jobs()
+    zip_path = os.path.join(TEMP_UPLOADS_DIR, f"{uuid.uuid4()}_{os.path.basename(file.filename or 'batch.zip')}")
+    await save_upload(file, zip_path, endpoint="batch")
+    if not zipfile.is_zipfile(zip_path):
+        cleanup_files([zip_path])
+        raise HTTPException(status_code=400, detail="Batch upload must be a ZIP archive.")
     try:
-        if engine == 'llm':
-            redacted_file_path, encrypted_metadata = process_document_llm(input_path, severity, key)
-        else:
-            redacted_file_path, encrypted_metadata = process_document_classic(input_path, severity, key)
-        
-        with open(redacted_file_path, "rb") as f:
-            redacted_file_bytes = f.read()
-            
-        background_tasks.add_task(cleanup_files, [input_path, redacted_file_path])
-        
-        return JSONResponse(content={
-            "decryptionKey": urlsafe_b64encode(key).decode('utf-8'),
-            "encryptedMetadata": encrypted_metadata,
-            "redactedFile": urlsafe_b64encode(redacted_file_bytes).decode('utf-8'),
-            "contentType": file.content_type,
-        })
+        with zipfile.ZipFile(zip_path) as archive:
+            check_archive_size(archive)
+    except ArchiveTooLargeError as e:
+        cleanup_files([zip_path])
+        raise HTTPException(status_code=413, detail=str(e))
+
+    digest = await asyncio.to_thread(file_digest, zip_path)
+    batch_dir = os.path.join(BATCH_DIR, f"{digest[:32]}_{engine}_{severity}")
+    try:
+        job = job_manager.submit(run_batch, zip_path, batch_dir, severity, engine, metadata_format, cleanup_paths=[zip_path])
+    except QueueFullError as e:
+        background_tasks.add_task(cleanup_files, [zip_path])
+        raise HTTPException(status_code=429, detail=f"Server busy: {str(e)}", headers={"Retry-After": "10"})
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+
+@app.post("/rescope/{rescope_id}", summary="Redact a retained document again at another severity", tags=["Processing"])
+async def rescope_endpoint(
+    rescope_id: str,
+    background_tasks: BackgroundTasks,
+    decryption_key: str = Form(...),
+    severity: int = Form(...),
+    response_format: ResponseFormat = Form('json'),
+    metadata_format: MetadataFormat = Form(METADATA_FORMAT)
+):
+    """
+    `rescope_id` and `decryption_key` come from a /process/ response with
+    retain_for_rescope=true. Nothing is
+    uploaded, extracted or detected again: the new redactions are filtered from the
+    document's stored detection index, and only pages whose redactions change are
+    redacted again. The response is that of /process/, with the same key, and the new
+    version becomes the one later severity changes start from.
+    """
+    try:
+        key = urlsafe_b64decode(decryption_key)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid key format.")
+    try:
+        result = await asyncio.to_thread(run_rescope, rescope_id, key, severity, metadata_format)
+    except UnknownDocumentError:
+        raise HTTPException(status_code=404, detail="Unknown or expired document.")
+    except NotIndexedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        # Also a wrong decryption_key: decrypting the record fails with a ValueError.
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        background_tasks.add_task(cleanup_files, [input_path])
-        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+        print(f"Error re-redacting {rescope_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+    try:
+        return build_process_response(result, response_format)
+    finally:
+        background_tasks.add_task(cleanup_files, [result["redactedFilePath"]])
+
+
+@app.get("/jobs/{job_id}", summary="Poll the status of a processing job", tags=["Processing"])
+async def job_status_endpoint(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    return JSONResponse(content=job.to_dict())
+
+
+@app.get("/jobs/{job_id}/result", summary="Fetch the output of a finished job", tags=["Processing"])
+async def job_result_endpoint(job_id: str, background_tasks: BackgroundTasks, response_format: ResponseFormat = Query('json')):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    if job.status == STATUS_FAILED:
+        job_manager.pop(job_id)
+        cleanup_job(job)
+        raise HTTPException(status_code=500, detail=f"An error occurred: {job.error}")
+    if job.status != STATUS_DONE:
+        raise HTTPException(status_code=409, detail=f"Job is still {job.status}.")
+
+    job_manager.pop(job_id)
+    if "summary" in job.result:
+        BYTES_OUT.inc(os.path.getsize(job.result["redactedFilePath"]), endpoint="batch")
+        background_tasks.add_task(cleanup_job, job)
+        return FileResponse(
+            path=job.result["redactedFilePath"],
+            media_type=job.result["contentType"],
+            filename="redacted_batch.zip",
+            headers={"X-Batch-Summary": json.dumps(job.result["summary"])},
+        )
+    try:
+        response = build_process_response(job.result, response_format)
+    finally:
+        background_tasks.add_task(cleanup_job, job)
+    return response
+
+
+@app.get("/metrics", summary="Pipeline metrics in the Prometheus text format", tags=["Monitoring"])
+async def metrics_endpoint():
+    cache = pii_cache.stats()
+    gauges = [
+        "# TYPE redact_jobs_pending gauge",
+        f"redact_jobs_pending {job_manager.pending_count()}",
+        "# TYPE redact_pii_cache_entries gauge",
+        f"redact_pii_cache_entries {cache['entries']}",
+        "# TYPE redact_pii_cache_bytes gauge",
+        f"redact_pii_cache_bytes {cache['bytes']}",
+        "# TYPE redact_pii_cache_lookups_total counter",
+        f'redact_pii_cache_lookups_total{{result="hit"}} {cache["hits"]}',
+        f'redact_pii_cache_lookups_total{{result="miss"}} {cache["misses"]}',
+        "# TYPE redact_ready gauge",
+        f"redact_ready {int(warmup.is_ready())}",
+        "# TYPE redact_warmup_seconds gauge",
+        *(f'redact_warmup_seconds{{step="{step}"}} {seconds}' for step, seconds in warmup.status()["steps"].items()),
+    ]
+    return PlainTextResponse(REGISTRY.render(gauges), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ready", summary="Readiness: 200 once models are loaded, 503 before", tags=["Monitoring"])
+async def ready_endpoint():
+    """Requests sent before this returns 200 are still served, but pay for loading what they need."""
+    status = warmup.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+
+@app.get("/cache/stats", summary="Hit/miss counters of the PII detection cache", tags=["Monitoring"])
+async def cache_stats_endpoint():
+    return JSONResponse(content=pii_cache.stats())
+
+
+def parse_page_ranges(value: str) -> List[Tuple[int, int]]:
+    """(first, last) pairs, both included; nothing is expanded until the page count is known."""
+    page_ranges = []
+    for part in value.split(","):
+        first, _, last = part.strip().partition("-")
+        first, last = int(first), int(last or first)
+        if first < 0 or last < first:
+            raise ValueError(f"Invalid page range: {part.strip()!r}")
+        page_ranges.append((first, last))
+    return page_ranges
+
+
+def expand_page_ranges(page_ranges: List[Tuple[int, int]], page_count: int) -> List[int]:
+    """The pages of `page_ranges` that exist in a document of `page_count` pages."""
+    return sorted({page_num for first, last in page_ranges for page_num in range(first, min(last, page_count - 1) + 1)})
+
+
+def document_page_count(file_path: str) -> int:
+    if os.path.splitext(file_path)[1].lower() == ".pdf":
+        with fitz.open(file_path) as doc:
+            return doc.page_count
+    return image_frame_count(file_path)
+
+
+def parse_item_ids(value: str) -> List[Tuple[int, int]]:
+    item_ids = []
+    for part in value.split(","):
+        page, _, index = part.strip().partition(":")
+        item_ids.append((int(page), int(index)))
+    return item_ids
 
 
 @app.post("/unredact/", summary="Restore a redacted document", tags=["Processing"])
@@ -93,22 +509,45 @@ async def unredact_endpoint(
     file: UploadFile = File(...),
     decryption_key: str = Form(...),
     encrypted_metadata_json: str = Form(...),
-    password: str = Form(None)
+    password: str = Form(None),
+    pages: str = Form(None),
+    items: str = Form(None)
 ) -> FileResponse:
+    """
+    By default every page is restored. `pages` takes 0-based pages and ranges ("2,5-7"),
+    `items` takes "page:index" ids ("3:0,3:4", index = position in that page's metadata).
+    With either, only the selection is decrypted and the returned file holds just those pages.
+    """
     encrypted_metadata = json.loads(encrypted_metadata_json)
+    try:
+        page_ranges = parse_page_ranges(pages) if pages else None
+        item_ids = parse_item_ids(items) if items else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid page range or item id.")
     try:
         key = urlsafe_b64decode(decryption_key)
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid key format.")
 
     temp_redacted_path = os.path.join(TEMP_UPLOADS_DIR, f"{uuid.uuid4()}_{file.filename}")
-    with open(temp_redacted_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await save_upload(file, temp_redacted_path, endpoint="unredact")
+    page_numbers = None
+    if page_ranges is not None:
+        try:
+            page_numbers = expand_page_ranges(page_ranges, await asyncio.to_thread(document_page_count, temp_redacted_path))
+        except Exception:
+            page_numbers = []
+        if not page_numbers:
+            cleanup_files([temp_redacted_path])
+            raise HTTPException(status_code=400, detail="No selected page exists in the document.")
 
     try:
-        restored_file_path = unredact_document(temp_redacted_path, key, encrypted_metadata, password)
+        restored_file_path = await asyncio.to_thread(
+            unredact_document, temp_redacted_path, key, encrypted_metadata, password, page_numbers, item_ids
+        )
         
         background_tasks.add_task(cleanup_files, [temp_redacted_path, restored_file_path])
+        BYTES_OUT.inc(os.path.getsize(restored_file_path), endpoint="unredact")
         
         return FileResponse(
             path=restored_file_path,
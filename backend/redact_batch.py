@@ -0,0 +1,57 @@
+"""
+Redacts a whole directory tree or ZIP archive without going through the HTTP API.
+
+    python redact_batch.py INPUT OUTPUT_DIR --engine classic --severity 40
+
+INPUT is a directory (searched recursively) or a .zip file. Redacted documents go to
+OUTPUT_DIR/documents, keys and encrypted metadata to OUTPUT_DIR/manifest.jsonl.
+Rerunning the same command after a crash picks up where the last run stopped.
+"""
+import argparse
+import os
+import sys
+import zipfile
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from core.batch import BATCH_WORKERS, BATCH_MAX_IN_FLIGHT, run_directory_batch, run_zip_batch
+from core.metadata import METADATA_FORMAT
+from core.pool import shutdown_page_pool
+
+
+def print_progress(done: int, total: int):
+    print(f"\r{done}/{total} documents", end="", file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input")
+    parser.add_argument("output_dir")
+    parser.add_argument("--engine", choices=["classic", "llm", "hybrid"], default="classic")
+    parser.add_argument("--severity", type=int, default=40)
+    parser.add_argument("--metadata-format", choices=["json", "compact"], default=METADATA_FORMAT)
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="threads for the llm and hybrid engines")
+    parser.add_argument("--max-in-flight", type=int, default=BATCH_MAX_IN_FLIGHT)
+    args = parser.parse_args()
+
+    options = dict(metadata_format=args.metadata_format, max_workers=args.workers, max_in_flight=args.max_in_flight, progress_callback=print_progress)
+    try:
+        if os.path.isdir(args.input):
+            summary = run_directory_batch(args.input, args.output_dir, args.severity, args.engine, **options)
+        elif zipfile.is_zipfile(args.input):
+            summary = run_zip_batch(args.input, args.output_dir, args.severity, args.engine, **options)
+        else:
+            parser.error(f"{args.input} is neither a directory nor a ZIP archive")
+    finally:
+        shutdown_page_pool()
+
+    print(file=sys.stderr)
+    print(f"{summary['processed']} processed ({summary['redacted']} redacted, {summary['clean']} clean, "
+          f"{summary['failed']} failed), {summary['skipped']} already done")
+    print(f"{summary['seconds']:.1f}s, {summary['docsPerSecond']:.2f} docs/sec")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
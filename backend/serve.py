@@ -0,0 +1,130 @@
+"""
+Pre-forking server: loads the models once, then forks workers that share them.
+
+    python serve.py --workers 4 --host 0.0.0.0 --port 8000
+
+The parent binds the socket, imports the app and runs the warm-up steps (spaCy, the
+Gemini client, Tesseract) before forking, so every worker starts ready and the model
+pages are shared copy-on-write instead of loaded once per worker, as with
+`uvicorn --workers`. Each worker then starts its own page pool (the page_pool warm-up
+step), since its threads and processes cannot be inherited across fork(). Workers that
+die are replaced; SIGTERM or SIGINT stops them all.
+
+The Gemini rate limiter is moved into shared memory before forking, so
+GEMINI_REQUESTS_PER_MINUTE is the budget of the whole server, not of each worker
+(`uvicorn --workers` spawns its workers and cannot share it).
+
+Jobs live in the worker that accepted them, so /jobs/{id} polling would reach the wrong
+worker: more than one worker is refused unless REDACT_JOBS_ENABLED=0, which leaves
+mode='sync' only.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import uvicorn
+
+# Restarting a worker that keeps dying straight away would spin.
+MIN_WORKER_LIFETIME_SECONDS = 1.0
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, log_level: str):
+    # The parent's handlers would otherwise stay in place until uvicorn installs its own.
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    config = uvicorn.Config(app, log_level=log_level, timeout_graceful_shutdown=30)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--no-preload", action="store_true", help="fork first and let each worker load its own models")
+    args = parser.parse_args()
+
+    from core.jobs import JOBS_ENABLED
+    if args.workers > 1 and JOBS_ENABLED:
+        parser.error("jobs are kept per worker; set REDACT_JOBS_ENABLED=0 to run more than one worker")
+
+    # Bound first: connections made during warm-up wait in the backlog instead of being refused.
+    sock = bind(args.host, args.port, args.backlog)
+
+    from main import app
+    from core import identifier_llm, warmup
+    identifier_llm.rate_limiter.share_across_fork()
+    if not args.no_preload:
+        start = time.perf_counter()
+        # The page pool runs threads and child processes, which have to be started after fork().
+        warmup.warm_up([step for step in warmup.WARMUP_STEPS if step != "page_pool"])
+        print(f"Preloaded {warmup.status()['steps']} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    # Objects created so far are never collected, so the collector does not write to
+    # (and un-share) the pages holding them in every worker.
+    gc.collect()
+    gc.freeze()
+
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(app, sock, args.log_level)
+            finally:
+                os._exit(0)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+    print(f"Serving on {args.host}:{args.port} with {args.workers} workers", file=sys.stderr)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting", file=sys.stderr)
+        if time.monotonic() - started < MIN_WORKER_LIFETIME_SECONDS:
+            time.sleep(MIN_WORKER_LIFETIME_SECONDS)
+        spawn()
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()